@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Micro-batching scheduler for the inference service.
+Concurrent /predict calls are coalesced into a single model call, flushed
+when `max_rows` rows are pending or `max_delay_ms` has passed since the
+first one arrived; each caller gets back its own slice of the scores.
+Requests waiting for a flush are bounded by `max_queue`; past it submit()
+raises QueueFullError, as InferencePool does for direct calls.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from inference_pool import QueueFullError
+
+
+Columns = Dict[str, np.ndarray]
+ScoreFn = Callable[[Columns], Tuple[np.ndarray, np.ndarray]]
+Runner = Callable[..., Awaitable[Any]]
+
+
+@dataclass
+class _Pending:
+    cols: Columns
+    rows: int
+    future: asyncio.Future = field(repr=False)
+
+
+class MicroBatcher:
+    """Coalesces column batches from concurrent requests into one `score_fn` call.
+
+    `runner(score_fn, cols)` executes a flush (default: the loop's default
+    executor); up to `concurrency` flushes may be in flight at once, and up
+    to `max_queue` requests may wait for one (None: no limit).
+    """
+
+    def __init__(self, score_fn: ScoreFn, max_rows: int = 256, max_delay_ms: float = 5.0,
+                 runner: Optional[Runner] = None, concurrency: int = 1, max_queue: Optional[int] = None):
+        self.score_fn = score_fn
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000.0
+        self.runner = runner or self._run_in_default_executor
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.stats = {'requests': 0, 'rows': 0, 'batches': 0, 'rejected': 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._flushes = set()
+
+    @staticmethod
+    async def _run_in_default_executor(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def start(self):
+        """Start the flush loop on the running event loop."""
+        self._queue = asyncio.Queue(self.max_queue or 0)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def submit(self, cols: Columns) -> Tuple[np.ndarray, np.ndarray]:
+        """Queue one request's columns and wait for its (scores, confidence).
+
+        Raises QueueFullError if `max_queue` requests are already waiting.
+        """
+        rows = len(cols['tourist_id'])
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(_Pending(cols, rows, future))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            raise QueueFullError(f"{self._queue.qsize()} requests waiting for a micro-batch") from None
+        return await future
+
+    async def _collect(self) -> List[_Pending]:
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        batch, rows = [first], first.rows
+        deadline = loop.time() + self.max_delay
+        while rows < self.max_rows:
+            # Drain whatever is already queued before waiting on the clock
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self._queue.get_nowait()
+            batch.append(item)
+            rows += item.rows
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Hold a slot before collecting so requests keep accumulating
+            # while all flushes are busy
+            await self._slots.acquire()
+            batch = await self._collect()
+            flush = loop.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[_Pending]):
+        try:
+            try:
+                if len(batch) == 1:
+                    cols = batch[0].cols
+                else:
+                    cols = {name: np.concatenate([p.cols[name] for p in batch]) for name in batch[0].cols}
+                scores, conf = await self.runner(self.score_fn, cols)
+            except Exception as e:
+                for p in batch:
+                    if not p.future.done():
+                        p.future.set_exception(e)
+                return
+            self._deliver(batch, scores, conf)
+        finally:
+            self._slots.release()
+
+    def _deliver(self, batch: List[_Pending], scores: np.ndarray, conf: np.ndarray):
+        self.stats['batches'] += 1
+        self.stats['requests'] += len(batch)
+        offset = 0
+        for p in batch:
+            end = offset + p.rows
+            if not p.future.done():
+                p.future.set_result((scores[offset:end], conf[offset:end]))
+            offset = end
+        self.stats['rows'] += offset
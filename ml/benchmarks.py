@@ -0,0 +1,1166 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the Tourist Safety ML service.
+Each subcommand prints a small table; run from the ml/ directory, e.g.
+
+    python benchmarks.py predict --models-dir models
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+
+def _percentile_ms(samples: List[float], q: float) -> float:
+    return float(np.percentile(np.asarray(samples) * 1000.0, q))
+
+
+def _report(title: str, rows: List[Tuple[Any, ...]], header: Tuple[str, ...]):
+    print(f"\n{title}")
+    print("  ".join(f"{h:>14}" for h in header))
+    for row in rows:
+        print("  ".join(f"{v:>14.3f}" if isinstance(v, float) else f"{v:>14}" for v in row))
+
+
+def _time_calls(fn: Callable[[], Any], iterations: int, warmup: int = 3) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def synthetic_ticks(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Location ticks shaped like the backend's /api/ml/predict payloads."""
+    rng = np.random.default_rng(seed)
+    buckets = np.array(['morning', 'afternoon', 'evening', 'night'])
+    lat = 12.30 + rng.normal(0, 0.05, n)
+    lng = 76.65 + rng.normal(0, 0.05, n)
+    hours = rng.integers(0, 24, n)
+    return [
+        {
+            'tourist_id': f"tourist-{i % 500}",
+            'timestamp': f"2025-01-01T{hours[i]:02d}:00:00Z",
+            'latitude': float(lat[i]),
+            'longitude': float(lng[i]),
+            'speed_m_s': float(rng.uniform(0, 15)),
+            'time_of_day_bucket': str(buckets[i % 4]),
+            'distance_from_itinerary': float(rng.exponential(200)),
+            'time_since_last_fix': float(rng.uniform(0, 1800)),
+            'avg_speed_last_15min': float(rng.uniform(0, 10)),
+            'area_risk_score': float(rng.uniform(0, 1)),
+            'prior_incidents_count': int(rng.poisson(0.1)),
+            'days_into_trip': int(rng.integers(0, 10)),
+            'is_in_restricted_zone': bool(rng.random() < 0.05),
+            'sos_flag': bool(rng.random() < 0.001),
+            'age': int(rng.integers(18, 70)),
+            'sex_encoded': int(rng.integers(0, 3)),
+            'days_trip_duration': int(rng.integers(1, 15)),
+        }
+        for i in range(n)
+    ]
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"",
+                       content_type: str = "application/json") -> Tuple[int, bytes]:
+    """Drive one request through the ASGI app in-process (routing, validation,
+    handler and response rendering included; no sockets)."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '', 'client': ('bench', 0), 'server': ('bench', 80),
+        'headers': [(b'content-type', content_type.encode()),
+                    (b'content-length', str(len(body)).encode())],
+    }
+    received = False
+    status = 0
+    chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return status, b''.join(chunks)
+
+
+async def asgi_upload(app, path: str, chunks: List[bytes],
+                      content_type: str = "application/x-ndjson") -> Tuple[int, float, float, int]:
+    """POST `chunks` as separate body messages, as a chunked upload arrives.
+
+    Returns (status, seconds to the first response body byte, total seconds,
+    response bytes); the response body is counted, not kept.
+    """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'POST', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '', 'client': ('bench', 0), 'server': ('bench', 80),
+        'headers': [(b'content-type', content_type.encode()), (b'transfer-encoding', b'chunked')],
+    }
+    pending = iter(chunks)
+    done = False
+    status = 0
+    first = None
+    size = 0
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal done
+        if done:
+            await asyncio.sleep(3600)
+        chunk = next(pending, None)
+        if chunk is None:
+            done = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.sleep(0)  # let the app run between body messages
+        return {'type': 'http.request', 'body': chunk, 'more_body': True}
+
+    async def send(message):
+        nonlocal status, first, size
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and message.get('body'):
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(message['body'])
+
+    await app(scope, receive, send)
+    return status, first or 0.0, time.perf_counter() - start, size
+
+
+def _load_service(args, start_inference: bool = True):
+    import service
+    service.MODELS_DIR = Path(args.models_dir)
+    service.DATA_DIR = Path(args.data_dir)
+    service.bundle = service.ModelBundle()
+    if not service.bundle.load_artifacts():
+        raise SystemExit(f"No model artifacts in {args.models_dir}; train them first")
+    if start_inference:
+        service._bind_worker_stages(getattr(args, 'executor', 'thread'))
+        service.inference_pool = service.InferencePool(
+            getattr(args, 'executor', 'thread'), getattr(args, 'workers', None),
+            observer=service._observe_pool_call)
+    return service
+
+
+def stationary_ticks(n: int, tourists: int = 200, seed: int = 0) -> List[Dict[str, Any]]:
+    """Ticks of tourists standing still: each tourist's synthetic tick repeated
+    with GPS jitter (a few metres of distance, near-zero speed, a fix every few seconds)."""
+    rng = np.random.default_rng(seed)
+    base = synthetic_ticks(tourists, seed)
+    ticks = []
+    for i in range(n):
+        tick = dict(base[i % tourists])
+        tick['distance_from_itinerary'] = max(0.0, tick['distance_from_itinerary'] + float(rng.normal(0, 3)))
+        tick['time_since_last_fix'] = float(rng.uniform(3, 8))
+        tick['avg_speed_last_15min'] = float(rng.uniform(0, 0.04))
+        tick['speed_m_s'] = 0.0
+        ticks.append(tick)
+    return ticks
+
+
+def bench_predictcache(args):
+    """POST /predict on stationary tourists' ticks with the prediction cache
+    off and on: latency, hit ratio, and how far quantization moves the score."""
+    from prediction_cache import PredictionCache
+
+    service = _load_service(args)
+    service.TICK_STATE_ENABLED = False  # the ticks carry their movement features
+    loop = asyncio.new_event_loop()
+    ticks = stationary_ticks(4000)
+    rows, scores = [], {}
+    for batch_size in (1, 100):
+        bodies = [json.dumps({'records': ticks[i:i + batch_size]}).encode()
+                  for i in range(0, len(ticks), batch_size)]
+        for label, cache in (('off', None), ('on', PredictionCache())):
+            service.prediction_cache = cache
+            samples, results = [], []
+            for body in bodies:
+                start = time.perf_counter()
+                status, response = loop.run_until_complete(asgi_request(service.app, 'POST', '/predict', body))
+                samples.append(time.perf_counter() - start)
+                assert status == 200, status
+                results.extend(r['predicted_safety'] for r in json.loads(response)['results'])
+            scores[label] = np.asarray(results)
+            hit_ratio = cache.snapshot()['hit_ratio'] * 100 if cache is not None else 0.0
+            rows.append((batch_size, label, len(samples) / sum(samples), _percentile_ms(samples, 50),
+                         _percentile_ms(samples, 99), hit_ratio))
+    service.prediction_cache = None
+    _report(f"POST /predict, {len(ticks)} ticks from 200 stationary tourists", rows,
+            ('batch', 'cache', 'req/s', 'p50 ms', 'p99 ms', 'hit %'))
+    error = np.abs(scores['on'] - scores['off'])
+    print(f"score change from quantization: mean {error.mean():.3f}, p99 {np.percentile(error, 99):.3f}, "
+          f"max {error.max():.3f} points (0-100 scale)")
+
+
+def bench_predict(args):
+    """POST /predict end to end: requests/s and latency per batch size."""
+    service = _load_service(args)
+    loop = asyncio.new_event_loop()
+    rows = []
+    for batch_size, iterations in ((1, 500), (100, 200), (10_000, 20)):
+        body = json.dumps({'records': synthetic_ticks(batch_size)}).encode()
+
+        def call():
+            status, _ = loop.run_until_complete(asgi_request(service.app, 'POST', '/predict', body))
+            assert status == 200, status
+
+        samples = _time_calls(call, iterations)
+        rows.append((batch_size, len(samples) / sum(samples),
+                     _percentile_ms(samples, 50), _percentile_ms(samples, 99)))
+    _report("POST /predict", rows, ('batch', 'req/s', 'p50 ms', 'p99 ms'))
+
+
+def bench_metrics(args):
+    """Cost of the /metrics instrumentation: one timed stage (two clock reads
+    and an observe) alone and from several threads, POST /predict with the
+    timers on and off, and a /metrics scrape."""
+    import threading
+    from metrics import Registry
+
+    child = Registry().histogram('bench_seconds', 'bench').labels()
+    clock = time.perf_counter
+    n = 1_000_000
+
+    def timed_stages():
+        for _ in range(n):
+            start = clock()
+            child.observe(clock() - start)
+
+    def bare_loop():
+        for _ in range(n):
+            pass
+
+    rows = []
+    loop_s = min(_time_calls(bare_loop, 3, warmup=0))
+    for threads in (1, 4):
+        workers = [threading.Thread(target=timed_stages) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start - loop_s * threads
+        rows.append((threads, elapsed / (n * threads) * 1e9))
+    _report(f"Timed stage: 2x perf_counter + Histogram.observe, {n} per thread", rows,
+            ('threads', 'ns/stage'))
+
+    class _Off:
+        def observe(self, value):
+            pass
+
+    service = _load_service(args)
+    loop = asyncio.new_event_loop()
+    body = json.dumps({'records': synthetic_ticks(1)}).encode()
+    stages, observe_scored = dict(service.STAGES), service._observe_scored
+
+    def call():
+        status, _ = loop.run_until_complete(asgi_request(service.app, 'POST', '/predict', body))
+        assert status == 200, status
+
+    rows = []
+    for label in ('off', 'on', 'off', 'on'):
+        if label == 'off':
+            service.STAGES.update((name, _Off()) for name in stages)
+            service._observe_scored = lambda *a: None
+        else:
+            service.STAGES.update(stages)
+            service._observe_scored = observe_scored
+        samples = _time_calls(call, 2000)
+        rows.append((label, _percentile_ms(samples, 50), _percentile_ms(samples, 99)))
+    _report("POST /predict, batch 1, stage timers off/on (two rounds)", rows, ('timers', 'p50 ms', 'p99 ms'))
+
+    samples = _time_calls(lambda: loop.run_until_complete(asgi_request(service.app, 'GET', '/metrics')), 200)
+    print(f"GET /metrics: p50 {_percentile_ms(samples, 50):.3f} ms")
+
+
+def bench_profile(args):
+    """POST /predict with the request profiler off, sampling 1% and sampling
+    every request in each mode: what profiling costs the requests it sees."""
+    import shutil
+    import tempfile
+
+    service = _load_service(args)
+    profiler = service.profiler
+    loop = asyncio.new_event_loop()
+    directory = Path(tempfile.mkdtemp(prefix='bench-profiles-'))
+    profiler.directory = directory
+    rows = []
+    for batch_size, iterations in ((1, 2000), (100, 500)):
+        body = json.dumps({'records': synthetic_ticks(batch_size)}).encode()
+
+        def call():
+            status, _ = loop.run_until_complete(asgi_request(service.app, 'POST', '/predict', body))
+            assert status == 200, status
+
+        for label, enabled, rate, mode in (('off', False, 0.0, 'stack'), ('1% stack', True, 0.01, 'stack'),
+                                           ('all stack', True, 1.0, 'stack'),
+                                           ('all cprofile', True, 1.0, 'cprofile')):
+            profiler.configure(enabled=enabled, sample_rate=rate, mode=mode)
+            samples = _time_calls(call, iterations)
+            rows.append((batch_size, label, _percentile_ms(samples, 50), _percentile_ms(samples, 99)))
+    profiler.configure(enabled=False)
+    _report("POST /predict with request profiling", rows, ('batch', 'profiling', 'p50 ms', 'p99 ms'))
+    print(f"{profiler.stats['written']} profiles written, {len(list(directory.iterdir()))} kept in {directory}")
+    shutil.rmtree(directory)
+
+
+def bench_datasetcache(args):
+    """Preparing the safety model's LightGBM Datasets: parse the train/val CSV
+    and bin (first run) vs hash the files and load the cached binaries (rerun)."""
+    import shutil
+    import tempfile
+    import dataset_store
+    import model_training
+
+    source = dataset_store.read_table(args.data_dir, 'train')
+    rows = []
+    for n in sorted({len(source), args.rows}):
+        output_dir = tempfile.mkdtemp(prefix='datasetcache-')
+        try:
+            _write_resampled_splits(source, output_dir, n)
+            model = model_training.SafetyScoreModel()
+            start = time.perf_counter()
+            frames = [dataset_store.read_table(output_dir, split, model_training.TRAINING_COLUMNS)
+                      for split in ('train', 'val')]
+            datasets = model.build_datasets(*frames)
+            build_s = time.perf_counter() - start
+            del frames
+            cache_dir = Path(output_dir) / 'lgb_cache'
+            model.save_datasets(cache_dir, *datasets)
+            del datasets
+
+            start = time.perf_counter()
+            model_training.dataset_cache_key(Path(output_dir), model.params)
+            hash_s = time.perf_counter() - start
+            model.load_datasets(cache_dir)
+            cached_s = time.perf_counter() - start
+            rows.append((n, build_s, hash_s, cached_s, build_s / cached_s))
+        finally:
+            shutil.rmtree(output_dir)
+    _report("safety model Datasets, train + val/5 rows", rows,
+            ('train rows', 'parse+bin s', 'hash s', 'hash+load s', 'speedup'))
+
+
+def bench_encoder(args):
+    """SafetyFeatureEncoder vs prepare_features on test.csv rows."""
+    import joblib
+    import pandas as pd
+
+    model = joblib.load(Path(args.models_dir) / 'safety_score_model.joblib')
+    test_df = pd.read_csv(Path(args.data_dir) / 'test.csv')
+    rows = []
+    for batch_size, iterations in ((1, 2000), (100, 500), (10_000, 20)):
+        df = test_df.head(batch_size)
+        cols = {c: df[c].to_numpy() for c in df.columns}
+        expected = np.asarray(model.prepare_features(df)[0], dtype=np.float32)
+        assert np.array_equal(model.encode(cols), expected), "encoder output differs"
+
+        legacy = _time_calls(lambda: model.prepare_features(df), max(iterations // 10, 5))
+        frozen = _time_calls(lambda: model.encode(cols), iterations)
+        rows.append((batch_size, _percentile_ms(legacy, 50) * 1000, _percentile_ms(frozen, 50) * 1000,
+                     _percentile_ms(frozen, 99) * 1000))
+    _report("Feature encoding (µs)", rows, ('batch', 'prepare p50', 'encoder p50', 'encoder p99'))
+
+
+async def _run_clients(app, bodies: List[bytes], clients: int,
+                       requests_per_client: int) -> Tuple[float, List[float], int]:
+    """Returns elapsed seconds, latencies of successful calls and the number shed with 503."""
+    latencies: List[float] = []
+    shed = 0
+
+    async def client(k: int):
+        nonlocal shed
+        for i in range(requests_per_client):
+            body = bodies[(k * requests_per_client + i) % len(bodies)]
+            start = time.perf_counter()
+            status, _ = await asgi_request(app, 'POST', '/predict', body)
+            if status == 503:
+                shed += 1
+                continue
+            assert status == 200, status
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(k) for k in range(clients)))
+    return time.perf_counter() - start, latencies, shed
+
+
+def bench_loadtest(args):
+    """Many concurrent single-tick clients against /predict, micro-batching off vs on."""
+    service = _load_service(args, start_inference=False)
+    service.MICROBATCH_MAX_ROWS = args.max_rows
+    service.MICROBATCH_MAX_DELAY_MS = args.max_delay_ms
+    bodies = [json.dumps({'records': [tick]}).encode() for tick in synthetic_ticks(1000)]
+    rows = []
+    for mode in ('off', 'on'):
+        async def run():
+            service._start_inference(args.executor, args.workers, args.max_queue, microbatch=(mode == 'on'))
+            try:
+                result = await _run_clients(service.app, bodies, args.clients, args.requests_per_client)
+                stats = dict(service.batcher.stats) if service.batcher is not None else None
+                return result, stats
+            finally:
+                await service._stop_inference()
+
+        (elapsed, latencies, shed), stats = asyncio.run(run())
+        avg_batch = stats['rows'] / max(stats['batches'], 1) if stats else 1.0
+        rows.append((mode, len(latencies) / elapsed, _percentile_ms(latencies, 50),
+                     _percentile_ms(latencies, 99), avg_batch, shed))
+    _report(f"POST /predict, {args.clients} concurrent single-tick clients "
+            f"({args.executor} pool, max queue {args.max_queue})", rows,
+            ('microbatch', 'ok req/s', 'p50 ms', 'p99 ms', 'rows/batch', 'shed (503)'))
+
+
+def random_zone_polygons(n: int, seed: int = 0, span: float = 2.0) -> List[List[Tuple[float, float]]]:
+    """Star-shaped polygons (5-12 vertices, ~50m-1km radius) scattered over a span-degree square."""
+    rng = np.random.default_rng(seed)
+    polygons = []
+    for _ in range(n):
+        k = int(rng.integers(5, 13))
+        angles = np.sort(rng.uniform(0, 2 * np.pi, k))
+        radii = rng.uniform(0.0005, 0.01) * rng.uniform(0.5, 1.0, k)
+        clat, clng = 12.0 + rng.uniform(0, span), 76.0 + rng.uniform(0, span)
+        polygons.append(list(zip((clat + radii * np.sin(angles)).tolist(),
+                                 (clng + radii * np.cos(angles)).tolist())))
+    return polygons
+
+
+def bench_trees(args):
+    """Safety model raw scores: Booster.predict vs the compiled tree predictor
+    (CompiledTrees) across batch sizes, on encoded test-split rows."""
+    from dataset_store import read_table
+    from runtime import CompiledTrees, load_safety_model
+
+    runtime_dir = Path(args.models_dir) / 'runtime'
+    model = load_safety_model(runtime_dir)
+    booster = model.model
+    start = time.perf_counter()
+    trees = CompiledTrees.from_booster(booster)
+    print(f"compiled {booster.num_trees()} trees ({len(trees.arrays['feature'])} nodes) "
+          f"in {time.perf_counter() - start:.2f}s; kernel available: {trees.available}")
+    X = model.encode(read_table(args.data_dir, 'test'))
+    X = np.concatenate([X] * (10_000 // len(X) + 1))[:10_000]
+    rows = []
+    for batch_size, iterations in ((1, 2000), (10, 1000), (100, 300), (256, 200), (1000, 50), (10_000, 10)):
+        batch = np.ascontiguousarray(X[:batch_size])
+        identical = np.array_equal(booster.predict(batch), trees.predict(batch))
+        lgb_s = _time_calls(lambda: booster.predict(batch), iterations)
+        compiled_s = _time_calls(lambda: trees.predict(batch), iterations)
+        rows.append((batch_size, _percentile_ms(lgb_s, 50) * 1000, _percentile_ms(compiled_s, 50) * 1000,
+                     _percentile_ms(lgb_s, 50) / _percentile_ms(compiled_s, 50), str(identical)))
+    _report("Raw safety scores, p50 µs per call", rows,
+            ('batch', 'Booster', 'compiled', 'speedup', 'bit-identical'))
+
+    # What /predict pays per single tick: encode + score + clip
+    tick = {name: np.asarray([value]) for name, value in synthetic_ticks(1)[0].items()}
+    model.trees = None
+    booster_s = _time_calls(lambda: model.predict(tick), 2000)
+    model.trees = trees
+    compiled_s = _time_calls(lambda: model.predict(tick), 2000)
+    print(f"RuntimeSafetyModel.predict, one tick: {_percentile_ms(booster_s, 50) * 1000:.1f} µs with the booster, "
+          f"{_percentile_ms(compiled_s, 50) * 1000:.1f} µs compiled")
+
+
+def bench_zones(args):
+    """ZoneIndex batch query vs the linear per-polygon ray cast."""
+    from zones import ZONE_BITS, ZoneIndex, point_in_polygon
+
+    polygons = random_zone_polygons(args.zones)
+    restricted, high_risk = polygons[::2], polygons[1::2]
+    rng = np.random.default_rng(1)
+    lats = 12.0 + rng.uniform(0, 2.0, args.points)
+    lngs = 76.0 + rng.uniform(0, 2.0, args.points)
+
+    start = time.perf_counter()
+    index = ZoneIndex.from_polygons(restricted, high_risk)
+    build_s = time.perf_counter() - start
+    query = _time_calls(lambda: index.query(lats, lngs), 5, warmup=1)
+    kinds = index.query(lats, lngs)
+
+    # The linear scan is far too slow for every point; time a sample and extrapolate
+    sample = rng.choice(args.points, size=min(200, args.points), replace=False)
+    start = time.perf_counter()
+    for i in sample:
+        in_restricted = any(point_in_polygon(lats[i], lngs[i], p) for p in restricted)
+        in_high_risk = any(point_in_polygon(lats[i], lngs[i], p) for p in high_risk)
+        assert in_restricted == bool(kinds[i] & ZONE_BITS['restricted'])
+        assert in_high_risk == bool(kinds[i] & ZONE_BITS['high_risk'])
+    linear_s = (time.perf_counter() - start) / len(sample) * args.points
+
+    _report(f"Zone lookup, {args.zones} polygons x {args.points} points", [
+        ('linear scan', linear_s, linear_s / args.points * 1e6),
+        ('grid index', float(np.median(query)), float(np.median(query)) / args.points * 1e6),
+    ], ('method', 'total s', 'µs/point'))
+    print(f"index build: {build_s:.3f}s, {len(index.cell_keys)} cells, "
+          f"{int((kinds > 0).sum())} points inside a zone")
+
+
+_LOAD_CHILD = r"""
+import sys, time
+start = time.perf_counter()
+from pathlib import Path
+models_dir, fmt = Path(sys.argv[1]), sys.argv[2]
+if fmt == 'joblib':
+    import joblib
+    import model_training
+    safety = joblib.load(models_dir / 'safety_score_model.joblib')
+    anomaly = joblib.load(models_dir / 'anomaly_detection_model.joblib')
+else:
+    from runtime import load_anomaly_model, load_safety_model
+    safety = load_safety_model(models_dir / 'runtime')
+    # The service loads the anomaly detector lazily; 'runtime+anomaly' loads it too
+    anomaly = load_anomaly_model(models_dir / 'runtime') if fmt == 'runtime+anomaly' else None
+if anomaly is not None:
+    X = anomaly.scaler.transform([[0.0] * len(anomaly.feature_names)])
+    anomaly.one_class_svm.decision_function(X)  # touch the support vectors
+    anomaly.isolation_forest.decision_function(X)
+print(time.perf_counter() - start, flush=True)
+sys.stdin.read()  # stay alive until every worker has loaded
+mem = {}
+for line in open('/proc/self/smaps_rollup'):
+    key, _, value = line.partition(':')
+    if key in ('Rss', 'Pss'):
+        mem[key] = int(value.split()[0]) / 1024
+print(mem['Rss'], mem['Pss'], flush=True)
+"""
+
+
+def bench_approxsvm(args):
+    """Anomaly model One-Class SVM: exact RBF vs NystroemOneClassSVM at 100,
+    300 and 1000 landmarks. Fit time as the training rows grow, agreement
+    with the exact model on the test set, and scoring latency."""
+    import model_training
+    from dataset_store import read_table
+    from runtime import ArrayOneClassSVM
+    from tourist_state import SpeedStats
+
+    train_df = read_table(args.data_dir, 'train', model_training.ANOMALY_TRAINING_COLUMNS)
+    test_df = read_table(args.data_dir, 'test')
+    base = model_training.AnomalyDetectionModel()
+    X, _ = base.prepare_features(train_df, fit_scaler=True)
+    base.isolation_forest.fit(X)
+    X_test, _ = base.prepare_features(test_df)
+
+    modes = [('exact', 0), ('nystroem', 100), ('nystroem', 300), ('nystroem', 1000)]
+    fit_rows, models = [], {}
+    for svm, components in modes:
+        fit_s = []
+        for n in (len(X) // 4, len(X) // 2, len(X)):
+            model = model_training.AnomalyDetectionModel(svm=svm, svm_components=components or 300)
+            start = time.perf_counter()
+            model.one_class_svm.fit(X[:n])
+            fit_s.append(time.perf_counter() - start)
+        model.scaler, model.feature_names = base.scaler, base.feature_names
+        model.isolation_forest = base.isolation_forest
+        models[svm, components] = model
+        fit_rows.append((f"{svm} {components or ''}".strip(), *fit_s))
+    _report(f"One-Class SVM fit seconds by training rows (of {len(X)})", fit_rows,
+            ('model', f'{len(X) // 4} rows', f'{len(X) // 2} rows', f'{len(X)} rows'))
+
+    exact = models['exact', 0]
+    reference_flags = exact.one_class_svm.predict(X_test)
+    reference = exact.detect_anomalies(test_df, speed_stats=SpeedStats())
+    rows = []
+    for (svm, components), model in models.items():
+        svm_model = model.one_class_svm
+        flags = svm_model.predict(X_test)
+        results = model.detect_anomalies(test_df, speed_stats=SpeedStats())
+        single = _time_calls(lambda: svm_model.decision_function(X_test[:1]), 500)
+        batch = _time_calls(lambda: svm_model.decision_function(X_test), 5)
+        rows.append((f"{svm} {components or ''}".strip(), len(svm_model.support_vectors_),
+                     float(np.mean(flags == reference_flags) * 100),
+                     float(np.mean([a['anomaly'] == b['anomaly'] for a, b in zip(results, reference)]) * 100),
+                     float(np.mean([a['severity'] == b['severity'] for a, b in zip(results, reference)]) * 100),
+                     _percentile_ms(single, 50) * 1000, float(np.median(batch)) / len(X_test) * 1e6))
+    # The exact model as runtime artifacts score it
+    svm = exact.one_class_svm
+    arrays = ArrayOneClassSVM(svm.support_vectors_, svm.dual_coef_.ravel(), svm.intercept_[0], svm._gamma)
+    single = _time_calls(lambda: arrays.decision_function(X_test[:1]), 500)
+    batch = _time_calls(lambda: arrays.decision_function(X_test), 5)
+    rows.insert(1, ('exact runtime', len(svm.support_vectors_),
+                    float(np.mean(arrays.predict(X_test) == reference_flags) * 100), 100.0, 100.0,
+                    _percentile_ms(single, 50) * 1000, float(np.median(batch)) / len(X_test) * 1e6))
+    _report(f"Agreement with the exact SVM on {len(X_test)} test rows (%) and decision_function latency", rows,
+            ('model', 'kernel rows', 'svm flag', 'anomaly', 'severity', '1-row µs', 'µs/row batch'))
+
+
+def bench_artifacts(args):
+    """Startup time and per-worker memory: joblib pickles vs runtime artifacts."""
+    import subprocess
+    import sys
+
+    rows = []
+    for fmt in ('joblib', 'runtime', 'runtime+anomaly'):
+        procs = [subprocess.Popen([sys.executable, '-c', _LOAD_CHILD, args.models_dir, fmt],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                  cwd=str(Path(__file__).parent))
+                 for _ in range(args.workers or 4)]
+        load_s = [float(p.stdout.readline()) for p in procs]
+        mem = [tuple(map(float, p.communicate('')[0].split())) for p in procs]
+        rows.append((fmt, float(np.mean(load_s)), float(np.mean([m[0] for m in mem])),
+                     float(np.mean([m[1] for m in mem]))))
+    _report(f"Model loading, {args.workers or 4} concurrent workers (import + load)", rows,
+            ('format', 'startup s', 'RSS MiB', 'PSS MiB'))
+    print("PSS splits shared pages (memory-mapped arrays, shared libraries) across the workers.")
+
+
+def bench_anomalies(args):
+    """AnomalyDetectionModel.detect_anomalies on test.csv: one row per call
+    (the old per-row cost) vs the whole frame in one call."""
+    import joblib
+    import pandas as pd
+    from runtime import load_anomaly_model
+    from tourist_state import SpeedStats
+
+    test_df = pd.read_csv(Path(args.data_dir) / 'test.csv')
+    models_dir = Path(args.models_dir)
+    rows = []
+    for fmt, model in (('joblib', joblib.load(models_dir / 'anomaly_detection_model.joblib')),
+                       ('runtime', load_anomaly_model(models_dir / 'runtime'))):
+        sample = test_df.head(200)
+        stats = SpeedStats()
+        start = time.perf_counter()
+        per_row = [model.detect_anomalies(sample.iloc[i:i + 1], stats)[0] for i in range(len(sample))]
+        per_row_s = (time.perf_counter() - start) / len(sample) * len(test_df)
+        alert = lambda a: (a['anomaly'], a['severity'], a['reasons'])
+        assert list(map(alert, per_row)) == list(map(alert, model.detect_anomalies(sample))), \
+            "batch alerts differ from per-row alerts"
+
+        batch = _time_calls(lambda: model.detect_anomalies(test_df), 3, warmup=1)
+        rows.append((fmt, len(test_df), per_row_s, float(np.median(batch))))
+    _report("detect_anomalies, full test set (s)", rows,
+            ('format', 'rows', 'per-row est.', 'batch'))
+
+
+def _scalar_haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # The per-scalar version calculate_features used before geometry.py, kept as the baseline
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371000 * 2 * np.arcsin(np.sqrt(a))
+
+
+def bench_geometry(args):
+    """distance_from_itinerary for every event in events.csv: scalar haversine
+    loop vs geometry.min_haversine per tourist vs one min_haversine_ragged call."""
+    import ast
+    from dataset_store import read_table
+    from geometry import min_haversine, min_haversine_ragged
+
+    events = read_table(args.data_dir, 'events', ['tourist_id', 'latitude', 'longitude'])
+    profiles = read_table(args.data_dir, 'profiles', ['tourist_id', 'itinerary'])
+    itineraries = {tid: ast.literal_eval(it) for tid, it in zip(profiles['tourist_id'], profiles['itinerary'])}
+    groups = [(itineraries[tid], frame['latitude'].to_numpy(), frame['longitude'].to_numpy())
+              for tid, frame in events.groupby('tourist_id', sort=False)]
+
+    def scalar():
+        out = []
+        for itinerary, lats, lngs in groups:
+            for lat, lng in zip(lats.tolist(), lngs.tolist()):
+                out.append(min(_scalar_haversine(lat, lng, w['lat'], w['lng']) for w in itinerary))
+        return np.array(out)
+
+    def per_tourist():
+        return np.concatenate([min_haversine(lats, lngs, [w['lat'] for w in it], [w['lng'] for w in it])
+                               for it, lats, lngs in groups])
+
+    wp_lat = np.concatenate([[w['lat'] for w in it] for it, _, _ in groups])
+    wp_lng = np.concatenate([[w['lng'] for w in it] for it, _, _ in groups])
+    sizes = np.array([len(it) for it, _, _ in groups])
+    counts = np.repeat(sizes, [len(lats) for _, lats, _ in groups])
+    starts = np.repeat(np.cumsum(sizes) - sizes, [len(lats) for _, lats, _ in groups])
+    lats = np.concatenate([g[1] for g in groups])
+    lngs = np.concatenate([g[2] for g in groups])
+
+    def ragged():
+        return min_haversine_ragged(lats, lngs, wp_lat, wp_lng, starts, counts)
+
+    reference = scalar()
+    rows = []
+    for name, fn, iterations in (('scalar loop', scalar, 1), ('per tourist', per_tourist, 5),
+                                 ('ragged', ragged, 5)):
+        assert np.allclose(fn(), reference, rtol=0, atol=1e-6), name
+        samples = _time_calls(fn, iterations, warmup=1)
+        rows.append((name, len(events), float(np.median(samples)) * 1000.0,
+                     len(events) / float(np.median(samples))))
+    _report(f"distance_from_itinerary over events.csv ({int(sizes.mean())} waypoints per tourist on average)",
+            rows, ('kernel', 'events', 'ms', 'events/s'))
+
+
+def long_trajectory(generator, n: int, interval_s: float = 60.0):
+    """A profile plus `n` fixes `interval_s` apart, for stress-testing feature code."""
+    from datetime import datetime, timedelta
+    from data_generator import LocationEvent
+
+    profile = generator.generate_tourist_profile()
+    start = datetime.fromisoformat(profile.trip_start)
+    rng = np.random.default_rng(0)
+    wp = profile.itinerary[0]
+    events = [
+        LocationEvent(
+            tourist_id=profile.tourist_id,
+            timestamp=(start + timedelta(seconds=i * interval_s)).isoformat(),
+            latitude=wp['lat'] + float(rng.normal(0, 0.01)),
+            longitude=wp['lng'] + float(rng.normal(0, 0.01)),
+            speed_m_s=float(rng.uniform(0, 15)),
+            accuracy_m=10.0, provider='gps', battery_pct=80, device_status='active',
+        )
+        for i in range(n)
+    ]
+    return profile, events
+
+
+def bench_explain(args):
+    """POST /explain at batch sizes 1 and 1000, shap vs fast (pred_contrib)
+    mode, against SafetyScoreModel.explain_prediction's old cost of a new
+    TreeExplainer and a prepare_features pass per explained row."""
+    import pandas as pd
+    import shap
+
+    service = _load_service(args)
+    service.bundle.explainer.warm()
+    loop = asyncio.new_event_loop()
+    model = service.bundle.safety
+    rows = []
+    for batch_size, iterations in ((1, 200), (1000, 10)):
+        ticks = synthetic_ticks(batch_size)
+        frame = pd.DataFrame(ticks)
+
+        def per_row_explainer():
+            # The previous explain_prediction, one call per row
+            for i in range(min(batch_size, 20)):
+                X = model.encode(frame)
+                shap.TreeExplainer(model.model).shap_values(X[i:i + 1])
+
+        old = _time_calls(per_row_explainer, 5, warmup=1)
+        scale = batch_size / min(batch_size, 20)
+        rows.append((batch_size, 'per-row explainer', _percentile_ms(old, 50) * scale,
+                     _percentile_ms(old, 99) * scale))
+        for fast in (False, True):
+            body = json.dumps({'records': ticks, 'fast': fast}).encode()
+
+            def call():
+                status, _ = loop.run_until_complete(asgi_request(service.app, 'POST', '/explain', body))
+                assert status == 200, status
+
+            samples = _time_calls(call, iterations)
+            rows.append((batch_size, 'POST /explain fast' if fast else 'POST /explain shap',
+                         _percentile_ms(samples, 50), _percentile_ms(samples, 99)))
+    _report("Safety score attributions (per-row explainer for 1000 rows scaled from 20)", rows,
+            ('batch', 'method', 'p50 ms', 'p99 ms'))
+
+
+def bench_features(args):
+    """TouristDataGenerator.calculate_features on single long trips (one fix a minute)."""
+    from data_generator import TouristDataGenerator
+
+    generator = TouristDataGenerator(seed=42)
+    rows = []
+    for n in (1_000, 10_000, 50_000):
+        profile, events = long_trajectory(generator, n)
+        start = time.perf_counter()
+        generator.calculate_features(events, profile)
+        elapsed = time.perf_counter() - start
+        rows.append((n, elapsed * 1000.0, elapsed / n * 1e6))
+    _report("calculate_features per trip", rows, ('fixes', 'total ms', 'µs per fix'))
+
+
+def bench_generate(args):
+    """Sharded dataset generation throughput by worker count (same seed, same shards)."""
+    import os
+    import shutil
+    import tempfile
+    from datetime import datetime
+    from data_generator import generate_sharded_dataset
+
+    tourists, shard_size = 400, 50
+    reference_time = datetime(2026, 1, 1)
+    counts = sorted({1, 2, os.cpu_count() or 1, args.workers or 1})
+    rows = []
+    for workers in counts:
+        output_dir = tempfile.mkdtemp(prefix='generate-')
+        try:
+            start = time.perf_counter()
+            manifest = generate_sharded_dataset(tourists, output_dir, seed=42, workers=workers,
+                                                shard_size=shard_size, reference_time=reference_time)
+            elapsed = time.perf_counter() - start
+        finally:
+            shutil.rmtree(output_dir)
+        rows.append((workers, elapsed, tourists / elapsed, manifest['num_events'] / elapsed))
+    _report(f"generate_sharded_dataset ({tourists} tourists, {shard_size} per shard, {os.cpu_count()} CPUs)",
+            rows, ('workers', 'seconds', 'tourists/s', 'events/s'))
+
+
+_TRAIN_CHILD = r"""
+import resource, sys, time
+import model_training
+from dataset_store import read_table
+data_dir, chunk_rows = sys.argv[1], int(sys.argv[2])
+model = model_training.SafetyScoreModel()
+model.params = dict(model.params, num_iterations=20)  # memory, not accuracy, is measured
+start = time.perf_counter()
+if chunk_rows:
+    model.train_out_of_core(data_dir, chunk_rows)
+else:
+    model.train(read_table(data_dir, 'train', model_training.TRAINING_COLUMNS),
+                read_table(data_dir, 'val', model_training.TRAINING_COLUMNS))
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+
+
+def _write_resampled_splits(source, output_dir: str, n: int):
+    """train.csv with n rows and val.csv with n/5 rows drawn from `source`, written 1M rows at a time."""
+    rng = np.random.default_rng(0)
+    for split, size in (('train', n), ('val', n // 5)):
+        for start in range(0, size, 1_000_000):
+            picks = rng.integers(0, len(source), min(1_000_000, size - start))
+            source.iloc[picks].to_csv(Path(output_dir) / f'{split}.csv', index=False,
+                                      mode='a' if start else 'w', header=not start)
+
+
+def bench_outofcore(args):
+    """SafetyScoreModel.train on loaded frames vs train_out_of_core streaming
+    the same CSV splits: peak RSS and time (20 boosting rounds) at growing row
+    counts, each run in a fresh process."""
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import dataset_store
+
+    source = dataset_store.read_table(args.data_dir, 'train')
+    rows = []
+    for n in sorted({1_000_000, args.rows}):
+        output_dir = tempfile.mkdtemp(prefix='outofcore-')
+        try:
+            _write_resampled_splits(source, output_dir, n)
+            for label, chunk_rows in (('in memory', 0), ('out of core', 100_000)):
+                proc = subprocess.run([sys.executable, '-c', _TRAIN_CHILD, output_dir, str(chunk_rows)],
+                                      capture_output=True, text=True, cwd=str(Path(__file__).parent))
+                if proc.returncode != 0:
+                    rows.append((n, label, float('nan'), float('nan')))
+                    continue
+                seconds, peak_mib = map(float, proc.stdout.split()[-2:])
+                rows.append((n, label, seconds, peak_mib))
+        finally:
+            shutil.rmtree(output_dir)
+    _report("SafetyScoreModel training, train + val/5 rows from CSV (nan: process failed)", rows,
+            ('train rows', 'mode', 'seconds', 'peak RSS MiB'))
+
+
+def bench_coldstart(args):
+    """Cold start with no saved models: startup hook time, /health and rules-only
+    /predict latency while training runs in the background, and time to ready."""
+    import shutil
+    import tempfile
+    import service
+
+    models_dir = Path(tempfile.mkdtemp(prefix='coldstart-models-'))
+    service.MODELS_DIR = models_dir
+    service.DATA_DIR = Path(args.data_dir)
+    loop = asyncio.new_event_loop()
+    body = json.dumps({'records': synthetic_ticks(1)}).encode()
+    try:
+        start = time.perf_counter()
+        loop.run_until_complete(service._startup())
+        startup_s = time.perf_counter() - start
+
+        health, predict, stages = [], [], []
+        while not service.bundle.ready and service.bundle.state != 'failed':
+            t0 = time.perf_counter()
+            status, payload = loop.run_until_complete(asgi_request(service.app, 'GET', '/health'))
+            health.append(time.perf_counter() - t0)
+            stage = json.loads(payload)['model_state']['stage']
+            if stage and (not stages or stages[-1] != stage):
+                stages.append(stage)
+            t0 = time.perf_counter()
+            status, payload = loop.run_until_complete(asgi_request(service.app, 'POST', '/predict', body))
+            predict.append(time.perf_counter() - t0)
+            assert status == 200 and json.loads(payload)['scorer'] == 'rules', status
+            time.sleep(0.25)
+        ready_s = time.perf_counter() - start
+        loop.run_until_complete(service._shutdown())
+    finally:
+        shutil.rmtree(models_dir, ignore_errors=True)
+
+    print(f"state: {service.bundle.state}  stages: {' -> '.join(stages)}")
+    _report("Cold start without saved models", [
+        ('startup hook returns', startup_s * 1000.0),
+        ('models ready', ready_s * 1000.0),
+        ('/health p99 while training', _percentile_ms(health, 99)),
+        ('/predict (rules) p50 while training', _percentile_ms(predict, 50)),
+        ('/predict (rules) p99 while training', _percentile_ms(predict, 99)),
+    ], ('measure', 'ms'))
+
+
+def bench_storage(args):
+    """Feature-table disk footprint and load time: the old CSV + JSONL pair read
+    with untyped read_csv vs dataset_store CSV and Parquet, all columns and
+    only the training columns, on the train split and a resampled --rows set."""
+    import os
+    import shutil
+    import tempfile
+    import pandas as pd
+    import dataset_store
+    from model_training import TRAINING_COLUMNS
+
+    source = dataset_store.read_table(args.data_dir, 'train')
+    formats = ['csv'] + (['parquet'] if dataset_store.pq is not None else [])
+    rows = []
+    for n in sorted({len(source), args.rows}):
+        picks = np.random.default_rng(0).integers(0, len(source), n) if n != len(source) else np.arange(n)
+        frame = source.iloc[picks].reset_index(drop=True)
+        output_dir = tempfile.mkdtemp(prefix='storage-')
+        try:
+            # Old layout: every table as CSV and JSONL
+            csv_path = os.path.join(output_dir, 'train.csv')
+            frame.to_csv(csv_path, index=False)
+            with open(os.path.join(output_dir, 'train.jsonl'), 'w') as f:
+                for start in range(0, n, 500_000):
+                    f.write(frame.iloc[start:start + 500_000].to_json(orient='records', lines=True, date_format='iso'))
+            legacy_mb = sum(os.path.getsize(os.path.join(output_dir, f)) for f in os.listdir(output_dir)) / 1e6
+            start = time.perf_counter()
+            pd.read_csv(csv_path)
+            rows.append((n, 'old csv+jsonl', legacy_mb, time.perf_counter() - start, float('nan')))
+            os.remove(os.path.join(output_dir, 'train.jsonl'))
+
+            for fmt in formats:
+                if fmt == 'parquet':
+                    os.remove(csv_path)
+                rel = dataset_store.write_table(output_dir, 'train', frame, fmt)
+                size_mb = os.path.getsize(os.path.join(output_dir, rel)) / 1e6
+                start = time.perf_counter()
+                dataset_store.read_table(output_dir, 'train')
+                full_s = time.perf_counter() - start
+                start = time.perf_counter()
+                dataset_store.read_table(output_dir, 'train', TRAINING_COLUMNS)
+                rows.append((n, fmt, size_mb, full_s, time.perf_counter() - start))
+        finally:
+            shutil.rmtree(output_dir)
+        del frame
+    _report("train split on disk and load time" + ("" if 'parquet' in formats else " (pyarrow not installed)"),
+            rows, ('rows', 'format', 'MB on disk', 'load all s', 'load training cols s'))
+
+
+def bench_sweep(args):
+    """ModelTrainingPipeline.sweep over 12 sampled configurations: serial runs
+    to early stopping vs --workers processes, without and with pruning."""
+    import os
+    import shutil
+    import tempfile
+    import model_training
+
+    configs = model_training.sample_sweep_configs(12)
+    workers = args.workers or os.cpu_count() or 1
+    models_dir = tempfile.mkdtemp(prefix='sweep-models-')
+    rows = []
+    try:
+        pipeline = model_training.ModelTrainingPipeline(args.data_dir, models_dir,
+                                                        dataset_cache_dir=Path(models_dir) / 'lgb_cache')
+        for label, n, eta in (('serial', 1, None), ('parallel', workers, None), ('parallel+prune', workers, 3)):
+            start = time.perf_counter()
+            leaderboard = pipeline.sweep(configs, workers=n, eta=eta)
+            rows.append((label, n, time.perf_counter() - start, int(leaderboard['rounds'].sum()),
+                         float(leaderboard.loc[0, 'val_rmse'])))
+    finally:
+        shutil.rmtree(models_dir)
+    _report(f"Safety model sweep, {len(configs)} configurations, {os.cpu_count()} CPUs", rows,
+            ('mode', 'workers', 'seconds', 'boosting rounds', 'best val RMSE'))
+
+
+def bench_speedstats(args):
+    """speed_variance for a 100-tick batch: groupby std over history + batch
+    vs folding the batch into a SpeedStats store."""
+    import pandas as pd
+    from dataset_store import read_table
+    from tourist_state import SpeedStats
+
+    train_df = read_table(args.data_dir, 'train', ['tourist_id', 'avg_speed_last_15min'])
+    batch = train_df.tail(100)
+    rows = []
+    for history in (1_000, 10_000, len(train_df) - len(batch)):
+        frame = pd.concat([train_df.head(history), batch])
+        groupby = _time_calls(
+            lambda: frame.groupby('tourist_id')['avg_speed_last_15min'].transform('std').fillna(0), 20)
+        stats = SpeedStats()
+        stats.update(train_df['tourist_id'].to_numpy()[:history],
+                     train_df['avg_speed_last_15min'].to_numpy()[:history])
+        ids, speeds = batch['tourist_id'].to_numpy(), batch['avg_speed_last_15min'].to_numpy()
+        update = _time_calls(lambda: stats.update(ids, speeds), 200)
+        lookup = _time_calls(lambda: stats.std(ids), 200)
+        rows.append((history, _percentile_ms(groupby, 50), _percentile_ms(update, 50),
+                     _percentile_ms(lookup, 50)))
+    _report("speed_variance for a 100-tick batch (ms)", rows,
+            ('history rows', 'groupby p50', 'update p50', 'lookup p50'))
+
+
+def bench_stream(args):
+    """/predict vs /predict/stream on one large upload: time to first result,
+    total time and peak Python heap (tracemalloc)."""
+    import tracemalloc
+
+    service = _load_service(args)
+    loop = asyncio.new_event_loop()
+    ticks = synthetic_ticks(args.points)
+    body = json.dumps({'records': ticks}).encode()
+    ndjson = [line.encode() + b'\n' for line in map(json.dumps, ticks)]
+    # Body messages of ~64 KiB, like a server reading a chunked upload
+    per_message = max(1, 65536 // len(ndjson[0]))
+    messages = [b''.join(ndjson[i:i + per_message]) for i in range(0, len(ndjson), per_message)]
+    del ticks, ndjson
+
+    def buffered():
+        start = time.perf_counter()
+        status, payload = loop.run_until_complete(asgi_request(service.app, 'POST', '/predict', body))
+        elapsed = time.perf_counter() - start
+        return status, elapsed, elapsed, len(payload)
+
+    def streamed():
+        return loop.run_until_complete(asgi_upload(service.app, '/predict/stream', messages))
+
+    rows = []
+    for name, call in (('/predict', buffered), ('/predict/stream', streamed)):
+        status, first, total, size = call()
+        assert status == 200, status
+        tracemalloc.start()
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append((name, first * 1000.0, total * 1000.0, peak / 2 ** 20, size / 2 ** 20))
+    _report(f"{args.points} ticks in one upload", rows,
+            ('endpoint', 'first byte ms', 'total ms', 'peak heap MiB', 'response MiB'))
+
+
+def bench_ticks(args):
+    """Raw GPS pings from events.csv with server-side movement features vs the
+    same ticks with precomputed features; derived values are checked against
+    the generator's features."""
+    import ast
+    import pandas as pd
+    from dataset_store import read_table
+
+    service = _load_service(args)
+    data_dir = Path(args.data_dir)
+    events = read_table(data_dir, 'events').head(args.points)
+    features = pd.concat([read_table(data_dir, split) for split in ('train', 'val', 'test')])
+    features = events[['tourist_id', 'timestamp']].merge(features, on=['tourist_id', 'timestamp'], how='left')
+    # Ticks carry ISO timestamps on the wire
+    events['timestamp'] = events['timestamp'].map(lambda ts: ts.isoformat())
+    features['timestamp'] = events['timestamp'].to_numpy()
+    profiles = read_table(data_dir, 'profiles', ['tourist_id', 'itinerary'])
+    itineraries = [(tid, json.dumps({'waypoints': ast.literal_eval(itinerary)}).encode())
+                   for tid, itinerary in zip(profiles['tourist_id'], profiles['itinerary'])]
+    loop = asyncio.new_event_loop()
+
+    def reset_state():
+        service.tick_state = service.TickFeatureState()
+        for tid, body in itineraries:
+            status, _ = loop.run_until_complete(
+                asgi_request(service.app, 'PUT', f'/tourists/{tid}/itinerary', body, 'application/json'))
+            assert status == 200, status
+
+    raw_cols = ['tourist_id', 'timestamp', 'latitude', 'longitude', 'speed_m_s']
+    movement = ['time_since_last_fix', 'avg_speed_last_15min', 'distance_from_itinerary']
+    raw = events[raw_cols].to_dict('records')
+    precomputed = [dict(r, **f) for r, f in zip(raw, features[movement].to_dict('records'))]
+
+    # Derived features vs the generator's
+    reset_state()
+    cols = service._records_to_columns([service.LocationTick(**r) for r in raw])
+    diffs = {name: float(np.nanmax(np.abs(cols[name] - features[name].to_numpy()))) for name in movement}
+    print("max |derived - generator| " + ", ".join(f"{k}: {v:.2e}" for k, v in diffs.items()))
+
+    rows = []
+    batch = 100
+    for label, records, enabled in (('precomputed', precomputed, False),
+                                    ('precomputed+state', precomputed, True),
+                                    ('raw ticks', raw, True)):
+        service.TICK_STATE_ENABLED = enabled
+        reset_state()
+        bodies = [json.dumps({'records': records[i:i + batch]}).encode() for i in range(0, len(records), batch)]
+        samples = []
+        for body in bodies:
+            start = time.perf_counter()
+            status, _ = loop.run_until_complete(asgi_request(service.app, 'POST', '/predict', body))
+            samples.append(time.perf_counter() - start)
+            assert status == 200, status
+        rows.append((label, len(records) / sum(samples), _percentile_ms(samples, 50), _percentile_ms(samples, 99)))
+    _report(f"POST /predict, {len(raw)} events.csv ticks in batches of {batch}", rows,
+            ('input', 'ticks/s', 'p50 ms', 'p99 ms'))
+
+
+BENCHMARKS = {
+    'anomalies': bench_anomalies,
+    'approxsvm': bench_approxsvm,
+    'artifacts': bench_artifacts,
+    'coldstart': bench_coldstart,
+    'datasetcache': bench_datasetcache,
+    'encoder': bench_encoder,
+    'explain': bench_explain,
+    'features': bench_features,
+    'generate': bench_generate,
+    'geometry': bench_geometry,
+    'loadtest': bench_loadtest,
+    'metrics': bench_metrics,
+    'outofcore': bench_outofcore,
+    'predict': bench_predict,
+    'predictcache': bench_predictcache,
+    'profile': bench_profile,
+    'speedstats': bench_speedstats,
+    'storage': bench_storage,
+    'stream': bench_stream,
+    'sweep': bench_sweep,
+    'ticks': bench_ticks,
+    'trees': bench_trees,
+    'zones': bench_zones,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tourist safety ML components")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    parser.add_argument("--models-dir", type=str, default="models",
+                        help="Directory containing trained models")
+    parser.add_argument("--data-dir", type=str, default="data",
+                        help="Directory containing datasets")
+    parser.add_argument("--clients", type=int, default=500,
+                        help="Concurrent clients for the load test")
+    parser.add_argument("--requests-per-client", type=int, default=10,
+                        help="Sequential requests per load-test client")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread",
+                        help="Inference pool kind")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Inference pool workers (default: CPU count); also the generate/sweep benchmark workers")
+    parser.add_argument("--max-queue", type=int, default=1024,
+                        help="Inference pool queue bound for the load test")
+    parser.add_argument("--zones", type=int, default=10_000,
+                        help="Polygons for the zone benchmark")
+    parser.add_argument("--rows", type=int, default=10_000_000,
+                        help="Resampled feature rows for the storage, outofcore and datasetcache benchmarks")
+    parser.add_argument("--points", type=int, default=100_000,
+                        help="Query points for the zone benchmark")
+    parser.add_argument("--max-rows", type=int, default=256,
+                        help="Micro-batch size deadline")
+    parser.add_argument("--max-delay-ms", type=float, default=5.0,
+                        help="Micro-batch time deadline")
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -8,12 +8,15 @@ import json
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 import random
 from dataclasses import dataclass, asdict
 import argparse
 
+from dataset_store import default_format, write_table
+from geometry import min_haversine
+
 @dataclass
 class TouristProfile:
     tourist_id: str
@@ -63,20 +66,27 @@ class SafetyLabel:
     incident_within_24h: bool
 
 class TouristDataGenerator:
-    def __init__(self, seed: int = 42):
-        """Initialize the data generator with configurable parameters."""
+    # Configuration parameters
+    DEFAULT_CONFIG = {
+        'route_deviation_pct': 0.15,  # 15% of tourists deviate from route
+        'sudden_dropout_pct': 0.05,   # 5% have sudden GPS dropouts
+        'prolonged_inactivity_pct': 0.08,  # 8% have prolonged inactivity
+        'gps_noise_std': 0.0001,      # GPS noise standard deviation
+        'high_risk_area_pct': 0.1,    # 10% of areas are high risk
+        'medium_risk_area_pct': 0.2,  # 20% medium risk
+    }
+
+    def __init__(self, seed: int = 42, reference_time: Optional[datetime] = None):
+        """Initialize the data generator with configurable parameters.
+
+        Trips start up to 30 days before `reference_time` (default: now); with
+        a fixed reference time the output depends only on `seed`.
+        """
         np.random.seed(seed)
         random.seed(seed)
+        self.reference_time = reference_time or datetime.now()
         
-        # Configuration parameters
-        self.config = {
-            'route_deviation_pct': 0.15,  # 15% of tourists deviate from route
-            'sudden_dropout_pct': 0.05,   # 5% have sudden GPS dropouts
-            'prolonged_inactivity_pct': 0.08,  # 8% have prolonged inactivity
-            'gps_noise_std': 0.0001,      # GPS noise standard deviation
-            'high_risk_area_pct': 0.1,    # 10% of areas are high risk
-            'medium_risk_area_pct': 0.2,  # 20% medium risk
-        }
+        self.config = dict(self.DEFAULT_CONFIG)
         
         # Popular tourist destinations (lat, lng)
         self.destinations = [
@@ -100,14 +110,14 @@ class TouristDataGenerator:
 
     def generate_tourist_profile(self) -> TouristProfile:
         """Generate a single tourist profile."""
-        tourist_id = str(uuid.uuid4())
+        tourist_id = str(uuid.UUID(int=random.getrandbits(128), version=4))
         age = np.random.randint(18, 70)
         sex = np.random.choice(['M', 'F', 'Other'], p=[0.45, 0.45, 0.1])
         nationality = np.random.choice(self.nationalities)
         
         # Trip duration between 1-14 days
         trip_duration = np.random.randint(1, 15)
-        trip_start = datetime.now() - timedelta(days=np.random.randint(0, 30))
+        trip_start = self.reference_time - timedelta(days=np.random.randint(0, 30))
         trip_end = trip_start + timedelta(days=trip_duration)
         
         # Generate itinerary (3-8 destinations)
@@ -141,7 +151,7 @@ class TouristDataGenerator:
             trip_start=trip_start.isoformat(),
             trip_end=trip_end.isoformat(),
             itinerary=itinerary,
-            emergency_contact_hash=f"hash_{uuid.uuid4().hex[:16]}"
+            emergency_contact_hash=f"hash_{random.getrandbits(64):016x}"
         )
 
     def calculate_area_risk(self, lat: float, lng: float) -> float:
@@ -257,8 +267,23 @@ class TouristDataGenerator:
         
         sex_encoding = {'M': 0, 'F': 1, 'Other': 2}
         
+        # Distance from itinerary (closest planned location), for all events at once
+        min_distances = min_haversine(
+            [e.latitude for e in events], [e.longitude for e in events],
+            [w["lat"] for w in profile.itinerary], [w["lng"] for w in profile.itinerary]
+        ).tolist()
+        
+        # Parse each timestamp once; events are in time order, as
+        # generate_location_trajectory emits them
+        event_times = [datetime.fromisoformat(e.timestamp) for e in events]
+        elapsed_us = [(t - event_times[0]) // timedelta(microseconds=1) for t in event_times]
+        window_us = 900 * 1_000_000
+        window_start = 0
+        window_speed_sum = 0.0
+        window_moving = 0
+        
         for i, event in enumerate(events):
-            event_time = datetime.fromisoformat(event.timestamp)
+            event_time = event_times[i]
             
             # Time of day bucket
             hour = event_time.hour
@@ -271,28 +296,21 @@ class TouristDataGenerator:
             else:
                 time_bucket = 'night'
                 
-            # Distance from itinerary (find closest planned location)
-            min_distance = float('inf')
-            for waypoint in profile.itinerary:
-                dist = self._haversine_distance(
-                    event.latitude, event.longitude,
-                    waypoint["lat"], waypoint["lng"]
-                )
-                min_distance = min(min_distance, dist)
-                
             # Time since last fix
             time_since_last = 0.0
             if i > 0:
-                last_time = datetime.fromisoformat(events[i-1].timestamp)
-                time_since_last = (event_time - last_time).total_seconds()
+                time_since_last = (event_time - event_times[i-1]).total_seconds()
                 
-            # Average speed last 15 minutes
-            avg_speed = event.speed_m_s
-            if i > 0:
-                recent_events = [e for e in events[:i+1] 
-                               if (event_time - datetime.fromisoformat(e.timestamp)).total_seconds() <= 900]
-                if recent_events:
-                    avg_speed = np.mean([e.speed_m_s for e in recent_events])
+            # Average speed last 15 minutes: sliding window with a running sum
+            window_speed_sum += event.speed_m_s
+            window_moving += event.speed_m_s != 0
+            while elapsed_us[i] - elapsed_us[window_start] > window_us:
+                window_speed_sum -= events[window_start].speed_m_s
+                window_moving -= events[window_start].speed_m_s != 0
+                window_start += 1
+            if not window_moving:
+                window_speed_sum = 0.0  # keep "inactive" exactly 0 despite rounding
+            avg_speed = window_speed_sum / (i + 1 - window_start)
                     
             # Area risk score
             area_risk = self.calculate_area_risk(event.latitude, event.longitude)
@@ -313,7 +331,7 @@ class TouristDataGenerator:
                 tourist_id=profile.tourist_id,
                 timestamp=event.timestamp,
                 time_of_day_bucket=time_bucket,
-                distance_from_itinerary=min_distance,
+                distance_from_itinerary=min_distances[i],
                 time_since_last_fix=time_since_last,
                 avg_speed_last_15min=avg_speed,
                 area_risk_score=area_risk,
@@ -388,34 +406,15 @@ class TouristDataGenerator:
             
         return labels
 
-    def _haversine_distance(self, lat1: float, lon1: float, 
-                           lat2: float, lon2: float) -> float:
-        """Calculate haversine distance between two points in meters."""
-        R = 6371000  # Earth radius in meters
-        
-        lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
-        c = 2 * np.arcsin(np.sqrt(a))
-        
-        return R * c
-
-    def generate_dataset(self, num_tourists: int, output_dir: str = "data") -> Dict[str, Any]:
-        """Generate complete dataset with specified number of tourists."""
-        import os
-        os.makedirs(output_dir, exist_ok=True)
-        
+    def generate_tourists(self, num_tourists: int, log_every: int = 100) -> Dict[str, pd.DataFrame]:
+        """Generate `num_tourists` tourists: profiles, events and labelled features."""
         all_profiles = []
         all_events = []
         all_features = []
         all_labels = []
         
-        print(f"Generating data for {num_tourists} tourists...")
-        
         for i in range(num_tourists):
-            if i % 100 == 0:
+            if log_every and i % log_every == 0:
                 print(f"Progress: {i}/{num_tourists}")
                 
             # Generate tourist profile
@@ -442,8 +441,10 @@ class TouristDataGenerator:
         
         # Merge features and labels
         training_data = features_df.merge(labels_df, on=['tourist_id', 'timestamp'])
-        
-        # Split into train/val/test
+        return {'profiles': profiles_df, 'events': events_df, 'training': training_data}
+
+    def split_by_tourist(self, training_data: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """Split into train/val/test (70/15/15) by tourist."""
         unique_tourists = training_data['tourist_id'].unique()
         np.random.shuffle(unique_tourists)
         
@@ -457,27 +458,45 @@ class TouristDataGenerator:
         train_data = training_data[training_data['tourist_id'].isin(train_tourists)]
         val_data = training_data[training_data['tourist_id'].isin(val_tourists)]
         test_data = training_data[training_data['tourist_id'].isin(test_tourists)]
+        return train_data, val_data, test_data
+
+    def generate_dataset(self, num_tourists: int, output_dir: str = "data",
+                         fmt: Optional[str] = None) -> Dict[str, Any]:
+        """Generate complete dataset with specified number of tourists.
+
+        Tables are written once, as Parquet when pyarrow is installed and as
+        CSV otherwise (see dataset_store); `fmt` forces one of the two.
+        """
+        import os
+        os.makedirs(output_dir, exist_ok=True)
+        
+        print(f"Generating data for {num_tourists} tourists...")
+        generated = self.generate_tourists(num_tourists)
+        all_events = generated['events']
+        
+        # Split into train/val/test
+        train_data, val_data, test_data = self.split_by_tourist(generated['training'])
         
         # Save datasets
         datasets = {
-            'profiles': profiles_df,
-            'events': events_df,
+            'profiles': generated['profiles'],
+            'events': all_events,
             'train': train_data,
             'val': val_data,
             'test': test_data
         }
         
-        # Save as JSON Lines and CSV
+        fmt = fmt or default_format()
         for name, df in datasets.items():
-            df.to_json(f"{output_dir}/{name}.jsonl", orient='records', lines=True)
-            df.to_csv(f"{output_dir}/{name}.csv", index=False)
+            write_table(output_dir, name, df, fmt)
             
         # Save metadata
         metadata = {
             'generated_at': datetime.now().isoformat(),
+            'format': fmt,
             'num_tourists': num_tourists,
             'num_events': len(all_events),
-            'num_features': len(all_features),
+            'num_features': len(generated['training']),
             'config': self.config,
             'train_size': len(train_data),
             'val_size': len(val_data),
@@ -497,6 +516,106 @@ class TouristDataGenerator:
         
         return metadata
 
+
+SHARD_DATASETS = ('profiles', 'events', 'train', 'val', 'test')
+
+
+def _generate_shard(task: Tuple[int, int, int, str, str, str]) -> Dict[str, Any]:
+    """Worker: generate one shard from its own seed and write it to disk."""
+    index, num_tourists, seed, reference_time, output_dir, fmt = task
+    generator = TouristDataGenerator(seed=seed, reference_time=datetime.fromisoformat(reference_time))
+    generated = generator.generate_tourists(num_tourists, log_every=0)
+    train_data, val_data, test_data = generator.split_by_tourist(generated['training'])
+    datasets = {
+        'profiles': generated['profiles'],
+        'events': generated['events'],
+        'train': train_data,
+        'val': val_data,
+        'test': test_data
+    }
+
+    files, rows = {}, {}
+    for name, df in datasets.items():
+        files[name] = write_table(output_dir, name, df, fmt, part=index)
+        rows[name] = len(df)
+    return {'index': index, 'seed': seed, 'num_tourists': num_tourists, 'files': files, 'rows': rows}
+
+
+def generate_sharded_dataset(num_tourists: int, output_dir: str = "data", seed: int = 42,
+                             workers: Optional[int] = None, shard_size: int = 1000,
+                             reference_time: Optional[datetime] = None,
+                             fmt: Optional[str] = None) -> Dict[str, Any]:
+    """Generate the dataset in shards of `shard_size` tourists across `workers` processes.
+
+    Shard k is generated from child k of np.random.SeedSequence(seed) and
+    split 70/15/15 by tourist on its own, so the files depend only on seed,
+    shard_size and reference_time -- not on the worker count. Each worker
+    writes its shard straight to disk as one part per table (see
+    dataset_store); manifest.json, written last, lists the shards in order.
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    import multiprocessing
+
+    os.makedirs(output_dir, exist_ok=True)
+    fmt = fmt or default_format()
+    reference_time = reference_time or datetime.now().replace(microsecond=0)
+    workers = workers or os.cpu_count() or 1
+
+    num_shards = -(-num_tourists // shard_size)
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(num_shards)]
+    tasks = [
+        (k, min(shard_size, num_tourists - k * shard_size), seeds[k], reference_time.isoformat(), output_dir, fmt)
+        for k in range(num_shards)
+    ]
+
+    print(f"Generating data for {num_tourists} tourists in {num_shards} shards on {workers} workers...")
+    shards = [None] * num_shards
+    if workers == 1:
+        for task in tasks:
+            shards[task[0]] = _generate_shard(task)
+            print(f"Progress: {task[0] + 1}/{num_shards} shards")
+    else:
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [pool.submit(_generate_shard, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                shard = future.result()
+                shards[shard['index']] = shard
+                print(f"Progress: {done}/{num_shards} shards")
+
+    totals = {name: sum(shard['rows'][name] for shard in shards) for name in SHARD_DATASETS}
+    manifest = {
+        'generated_at': datetime.now().isoformat(),
+        'format': fmt,
+        'seed': seed,
+        'shard_size': shard_size,
+        'reference_time': reference_time.isoformat(),
+        'num_tourists': num_tourists,
+        'num_events': totals['events'],
+        # Read from the class: building a generator would reseed the global RNGs
+        'config': dict(TouristDataGenerator.DEFAULT_CONFIG),
+        'train_size': totals['train'],
+        'val_size': totals['val'],
+        'test_size': totals['test'],
+        'shards': shards
+    }
+    tmp_path = os.path.join(output_dir, 'manifest.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, 'manifest.json'))
+
+    print(f"\nDataset generation complete!")
+    print(f"Total tourists: {num_tourists}")
+    print(f"Total events: {totals['events']}")
+    print(f"Train samples: {totals['train']}")
+    print(f"Val samples: {totals['val']}")
+    print(f"Test samples: {totals['test']}")
+    print(f"Shards saved to: {output_dir}/")
+
+    return manifest
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate tourist safety dataset")
     parser.add_argument("--num-tourists", type=int, default=1000, 
@@ -505,10 +624,25 @@ if __name__ == "__main__":
                        help="Output directory for dataset")
     parser.add_argument("--seed", type=int, default=42,
                        help="Random seed for reproducibility")
+    parser.add_argument("--workers", type=int, default=None,
+                       help="Generate sharded output on this many processes (0 = all cores)")
+    parser.add_argument("--shard-size", type=int, default=1000,
+                       help="Tourists per shard for sharded output")
+    parser.add_argument("--format", choices=["parquet", "csv"], default=None,
+                       help="Storage format (default: parquet if pyarrow is installed, else csv)")
+    parser.add_argument("--reference-time", type=str, default=None,
+                       help="ISO timestamp trips are placed before (default: now)")
     
     args = parser.parse_args()
+    reference_time = datetime.fromisoformat(args.reference_time) if args.reference_time else None
     
-    generator = TouristDataGenerator(seed=args.seed)
-    metadata = generator.generate_dataset(args.num_tourists, args.output_dir)
-    
-    print(f"\nDataset metadata saved to: {args.output_dir}/metadata.json")
+    if args.workers is not None:
+        generate_sharded_dataset(args.num_tourists, args.output_dir, seed=args.seed,
+                                 workers=args.workers or None, shard_size=args.shard_size,
+                                 reference_time=reference_time, fmt=args.format)
+        print(f"\nDataset manifest saved to: {args.output_dir}/manifest.json")
+    else:
+        generator = TouristDataGenerator(seed=args.seed, reference_time=reference_time)
+        metadata = generator.generate_dataset(args.num_tourists, args.output_dir, fmt=args.format)
+        
+        print(f"\nDataset metadata saved to: {args.output_dir}/metadata.json")
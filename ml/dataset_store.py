@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+On-disk storage for the generated datasets.
+
+With pyarrow installed every table is written once as Parquet with typed
+columns: timestamps as timestamps, flags as booleans, and low-cardinality
+strings (tourist_id, time_of_day_bucket, ...) dictionary-encoded. The feature
+table is partitioned by split:
+
+    profiles/part-00000.parquet
+    events/part-00000.parquet
+    features/split=train/part-00000.parquet  (and split=val, split=test)
+
+Sharded generation writes one part per shard. Without pyarrow the tables are
+written as a single CSV copy each (name.csv, or shards/name-NNNNN.csv listed
+in manifest.json) and read back with the same schema, so both formats load
+into identical DataFrames. read_table() reads only the requested columns;
+iter_chunks() streams a table in bounded chunks for out-of-core training.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV only
+    pa = None
+    pq = None
+
+
+SPLITS = ('train', 'val', 'test')
+
+# Column -> pandas dtype; 'category' columns are dictionary-encoded in Parquet
+# and 'datetime' columns hold ISO timestamps in CSV.
+FEATURE_SCHEMA = {
+    'tourist_id': 'category',
+    'timestamp': 'datetime',
+    'time_of_day_bucket': 'category',
+    'distance_from_itinerary': 'float64',
+    'time_since_last_fix': 'float64',
+    'avg_speed_last_15min': 'float64',
+    'area_risk_score': 'float64',
+    'prior_incidents_count': 'int64',
+    'days_into_trip': 'int64',
+    'is_in_restricted_zone': 'bool',
+    'sos_flag': 'bool',
+    'age': 'int64',
+    'sex_encoded': 'int64',
+    'days_trip_duration': 'int64',
+    'safety_label': 'int64',
+    'incident_within_24h': 'bool',
+}
+EVENT_SCHEMA = {
+    'tourist_id': 'category',
+    'timestamp': 'datetime',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'speed_m_s': 'float64',
+    'accuracy_m': 'float64',
+    'provider': 'category',
+    'battery_pct': 'int64',
+    'device_status': 'category',
+}
+# The itinerary stays in its CSV form, the repr of a list of waypoint dicts
+PROFILE_SCHEMA = {
+    'tourist_id': 'str',
+    'age': 'int64',
+    'sex': 'category',
+    'nationality': 'category',
+    'trip_start': 'datetime',
+    'trip_end': 'datetime',
+    'itinerary': 'str',
+    'emergency_contact_hash': 'str',
+}
+SCHEMAS = {'profiles': PROFILE_SCHEMA, 'events': EVENT_SCHEMA,
+           **{split: FEATURE_SCHEMA for split in SPLITS}}
+
+
+def default_format() -> str:
+    """'parquet' when pyarrow is importable, else 'csv'."""
+    return 'parquet' if pq is not None else 'csv'
+
+
+def _table_dir(name: str) -> str:
+    return f"features/split={name}" if name in SPLITS else name
+
+
+def _apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """Cast generator output (or raw CSV columns) to the storage schema."""
+    out = {}
+    for col in df.columns:
+        dtype = schema.get(col)
+        values = df[col]
+        if dtype == 'datetime':
+            values = pd.to_datetime(values, format='ISO8601')
+        elif dtype == 'str':
+            values = values.map(lambda v: v if isinstance(v, str) else repr(v))
+        elif dtype is not None:
+            values = values.astype(dtype)
+        out[col] = values
+    return pd.DataFrame(out, index=df.index)
+
+
+def write_table(output_dir: str, name: str, df: pd.DataFrame, fmt: Optional[str] = None,
+                part: Optional[int] = None) -> str:
+    """Write one table (profiles, events, train, val or test); returns its path relative to output_dir.
+
+    `part` is the shard index; unsharded output is written as part 0
+    (Parquet) or name.csv (CSV).
+    """
+    fmt = fmt or default_format()
+    if fmt == 'parquet':
+        if pq is None:
+            raise ImportError("Parquet output requires pyarrow")
+        rel = f"{_table_dir(name)}/part-{part or 0:05d}.parquet"
+        os.makedirs(os.path.join(output_dir, os.path.dirname(rel)), exist_ok=True)
+        typed = _apply_schema(df, SCHEMAS[name])
+        if name in SPLITS:
+            # Partition value lives in the directory name
+            typed = typed.drop(columns=['split'], errors='ignore')
+        table = pa.Table.from_pandas(typed, preserve_index=False)
+        pq.write_table(table, os.path.join(output_dir, rel), compression='zstd')
+        return rel
+    if fmt != 'csv':
+        raise ValueError(f"Unknown dataset format: {fmt}")
+    rel = f"{name}.csv" if part is None else f"shards/{name}-{part:05d}.csv"
+    os.makedirs(os.path.join(output_dir, os.path.dirname(rel) or '.'), exist_ok=True)
+    df.to_csv(os.path.join(output_dir, rel), index=False)
+    return rel
+
+
+def dataset_format(data_dir: str) -> Optional[str]:
+    """Format of the dataset in data_dir: 'parquet', 'csv', or None if there is none."""
+    data_dir = Path(data_dir)
+    if (data_dir / 'features').is_dir():
+        return 'parquet'
+    if (data_dir / 'train.csv').exists() or (data_dir / 'manifest.json').exists():
+        return 'csv'
+    return None
+
+
+def _csv_dtypes(schema: Dict[str, str], columns: Optional[Sequence[str]]) -> Dict[str, str]:
+    # Numbers and flags are parsed straight into their dtype; datetimes after the read
+    return {col: dtype for col, dtype in schema.items()
+            if dtype != 'datetime' and (columns is None or col in columns)}
+
+
+def _parse_datetimes(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    for col, dtype in schema.items():
+        if dtype == 'datetime' and col in df.columns:
+            df[col] = pd.to_datetime(df[col], format='ISO8601')
+    return df
+
+
+def _read_csv(path: Path, schema: Dict[str, str], columns: Optional[Sequence[str]]) -> pd.DataFrame:
+    df = pd.read_csv(path, usecols=list(columns) if columns is not None else None,
+                     dtype=_csv_dtypes(schema, columns))
+    return _parse_datetimes(df, schema)
+
+
+def _csv_paths(data_dir: Path, name: str) -> List[Path]:
+    """name.csv, or the shard files listed in manifest.json, in row order."""
+    manifest_path = data_dir / 'manifest.json'
+    if not (data_dir / f'{name}.csv').exists() and manifest_path.exists():
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        return [data_dir / shard['files'][name] for shard in manifest['shards']]
+    return [data_dir / f'{name}.csv']
+
+
+def table_files(data_dir: str, name: str) -> List[Path]:
+    """The files holding one table, in row order."""
+    data_dir = Path(data_dir)
+    if dataset_format(data_dir) == 'parquet':
+        return sorted((data_dir / _table_dir(name)).glob('*.parquet'))
+    return _csv_paths(data_dir, name)
+
+
+def read_table(data_dir: str, name: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Load one table (profiles, events, train, val or test), optionally only some columns."""
+    data_dir = Path(data_dir)
+    schema = SCHEMAS[name]
+    if columns is not None:
+        columns = [col for col in schema if col in columns]
+
+    if dataset_format(data_dir) == 'parquet':
+        if pq is None:
+            raise ImportError(f"{data_dir} holds a Parquet dataset; install pyarrow to read it")
+        table = pq.read_table(data_dir / _table_dir(name), columns=columns)
+        df = table.to_pandas()
+        for col, dtype in schema.items():
+            # Dictionary-encoded strings arrive as categoricals; plain ones as str
+            if dtype == 'str' and col in df.columns:
+                df[col] = df[col].astype(str)
+        return df
+
+    paths = _csv_paths(data_dir, name)
+    if len(paths) == 1:
+        return _read_csv(paths[0], schema, columns)
+    df = pd.concat([_read_csv(path, schema, columns) for path in paths], ignore_index=True)
+    # Categories can differ per shard; concat falls back to object
+    for col, dtype in schema.items():
+        if dtype == 'category' and col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def iter_chunks(data_dir: str, name: str, columns: Optional[Sequence[str]] = None,
+                chunk_rows: int = 100_000) -> Iterator[pd.DataFrame]:
+    """Stream one table in row order (the order read_table returns), at most
+    `chunk_rows` rows per chunk; chunks do not span parts or shards.
+
+    Categorical columns are typed per chunk, so their categories may differ
+    between chunks.
+    """
+    data_dir = Path(data_dir)
+    schema = SCHEMAS[name]
+    if columns is not None:
+        columns = [col for col in schema if col in columns]
+
+    if dataset_format(data_dir) == 'parquet':
+        if pq is None:
+            raise ImportError(f"{data_dir} holds a Parquet dataset; install pyarrow to read it")
+        for path in table_files(data_dir, name):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+                yield batch.to_pandas()
+        return
+
+    for path in _csv_paths(data_dir, name):
+        reader = pd.read_csv(path, usecols=list(columns) if columns is not None else None,
+                             dtype=_csv_dtypes(schema, columns), chunksize=chunk_rows)
+        with reader:
+            for chunk in reader:
+                yield _parse_datetimes(chunk, schema)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Vectorized great-circle distances shared by the data generator and the
+inference service. All functions take degrees and return metres.
+"""
+
+import numpy as np
+
+
+EARTH_RADIUS_M = 6371000
+
+# Largest points x waypoints block evaluated at once by min_haversine
+_BLOCK_ELEMENTS = 1 << 20
+
+
+def haversine(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Haversine distance between broadcastable arrays of points."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arcsin(np.sqrt(a))
+
+
+def min_haversine(lats, lngs, wp_lats, wp_lngs) -> np.ndarray:
+    """Distance from each of N points to the nearest of M shared waypoints (inf if M == 0)."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    wp_lats = np.asarray(wp_lats, dtype=np.float64)
+    wp_lngs = np.asarray(wp_lngs, dtype=np.float64)
+    out = np.full(len(lats), np.inf)
+    if len(wp_lats) == 0:
+        return out
+    rows = max(1, _BLOCK_ELEMENTS // len(wp_lats))
+    for start in range(0, len(lats), rows):
+        block = slice(start, start + rows)
+        out[block] = haversine(lats[block, None], lngs[block, None], wp_lats[None, :], wp_lngs[None, :]).min(axis=1)
+    return out
+
+
+def min_haversine_ragged(lats, lngs, wp_lats, wp_lngs, starts, counts) -> np.ndarray:
+    """Distance from point i to the nearest of its own waypoints
+    ``wp[starts[i]:starts[i] + counts[i]]`` (inf where counts[i] == 0)."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    out = np.full(len(lats), np.inf)
+    total = int(counts.sum())
+    if total == 0:
+        return out
+
+    # One (point, waypoint) pair per element, grouped by point
+    rows = np.repeat(np.arange(len(lats)), counts)
+    first = np.cumsum(counts) - counts
+    pos = np.arange(total) - np.repeat(first, counts) + np.repeat(starts, counts)
+    dist = haversine(lats[rows], lngs[rows], np.asarray(wp_lats)[pos], np.asarray(wp_lngs)[pos])
+    nonempty = counts > 0
+    out[nonempty] = np.minimum.reduceat(dist, first[nonempty])
+    return out
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Bounded executor for CPU-heavy model calls in the inference service.
+Work runs on a fixed number of threads or processes; once `workers +
+max_queue` calls are in flight, new calls are rejected with QueueFullError
+so the service sheds load instead of queueing without limit.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is at capacity."""
+
+
+def _init_process_worker(threads: int, initializer: Optional[Callable], initargs: Tuple):
+    # Split cores between workers so each process' OpenMP pool does not
+    # oversubscribe. Unpickling `initializer` may already have loaded an
+    # OpenMP runtime, so its thread count is set directly as well as through
+    # the environment read by runtimes loaded later.
+    os.environ.setdefault('OMP_NUM_THREADS', str(threads))
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(int(os.environ['OMP_NUM_THREADS']), user_api='openmp')
+    except (ImportError, ValueError):
+        pass
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _timed_call(fn: Callable, *args) -> Tuple[Any, float]:
+    # Runs inside the worker; only the duration crosses the process boundary
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class InferencePool:
+    """Thread or process pool with a bounded queue and wait/run timing.
+
+    `observer(fn, wait_s, run_s)`, if given, is called after every completed call.
+    """
+
+    def __init__(self, kind: str = "thread", workers: Optional[int] = None, max_queue: int = 64,
+                 initializer: Optional[Callable] = None, initargs: Tuple = (),
+                 observer: Optional[Callable[[Callable, float, float], None]] = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.observer = observer
+        self._inflight = 0
+        self.stats = {
+            'completed': 0,
+            'rejected': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'run_seconds_total': 0.0,
+            'run_seconds_max': 0.0,
+        }
+
+        if kind == "process":
+            # Spawn avoids forking a parent that already started OpenMP; the
+            # thread limit is set in the workers, not in this process
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process_worker, initargs=(threads, initializer, initargs)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix='inference',
+                initializer=initializer, initargs=initargs
+            )
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._inflight - self.workers)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run `fn(*args)` on the pool, or raise QueueFullError if it is saturated."""
+        if self._inflight >= self.workers + self.max_queue:
+            self.stats['rejected'] += 1
+            raise QueueFullError(f"{self._inflight} inference calls in flight")
+
+        loop = asyncio.get_running_loop()
+        self._inflight += 1
+        submitted = time.perf_counter()
+        try:
+            result, run_s = await loop.run_in_executor(self._executor, _timed_call, fn, *args)
+        finally:
+            self._inflight -= 1
+
+        wait_s = max(0.0, time.perf_counter() - submitted - run_s)
+        stats = self.stats
+        stats['completed'] += 1
+        stats['wait_seconds_total'] += wait_s
+        stats['run_seconds_total'] += run_s
+        stats['wait_seconds_max'] = max(stats['wait_seconds_max'], wait_s)
+        stats['run_seconds_max'] = max(stats['run_seconds_max'], run_s)
+        if self.observer is not None:
+            self.observer(fn, wait_s, run_s)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        completed = max(self.stats['completed'], 1)
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'inflight': self._inflight,
+            'queue_depth': self.queue_depth,
+            'completed': self.stats['completed'],
+            'rejected': self.stats['rejected'],
+            'avg_wait_ms': self.stats['wait_seconds_total'] / completed * 1000.0,
+            'max_wait_ms': self.stats['wait_seconds_max'] * 1000.0,
+            'avg_run_ms': self.stats['run_seconds_total'] / completed * 1000.0,
+            'max_run_ms': self.stats['run_seconds_max'] * 1000.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -7,10 +7,14 @@ Trains safety score prediction and anomaly detection models.
 import pandas as pd
 import numpy as np
 import joblib
+import hashlib
+import importlib.util
 import json
+import os
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Callable, Optional
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -21,18 +25,143 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.metrics import roc_auc_score, precision_recall_curve, roc_curve
 from sklearn.ensemble import IsolationForest
 from sklearn.svm import OneClassSVM
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import SGDOneClassSVM
 import lightgbm as lgb
-import shap
-
-# Plotting (optional)
-try:
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    PLOTTING_AVAILABLE = True
-except ImportError:
-    PLOTTING_AVAILABLE = False
-    plt = None
-    sns = None
+
+from dataset_store import dataset_format, iter_chunks, read_table, table_files
+from runtime import (ArrayOneClassSVM, CompiledTrees, SafetyExplainer, SafetyFeatureEncoder,
+                     export_runtime_artifacts, predict_raw, safety_scores)
+from tourist_state import SpeedStats
+
+# Plotting (optional); matplotlib and shap are imported on first use so
+# inference processes that only load models do not pay for them
+PLOTTING_AVAILABLE = importlib.util.find_spec('matplotlib') is not None
+
+# Inputs of SafetyScoreModel.prepare_features; each categorical column adds
+# a '<col>_encoded' feature after these
+SAFETY_FEATURE_COLUMNS = [
+    'distance_from_itinerary', 'time_since_last_fix', 'avg_speed_last_15min',
+    'area_risk_score', 'prior_incidents_count', 'days_into_trip',
+    'is_in_restricted_zone', 'sos_flag', 'age', 'sex_encoded', 'days_trip_duration'
+]
+SAFETY_CATEGORICAL_COLUMNS = ['time_of_day_bucket']
+
+# Feature-table columns read for training (see ModelTrainingPipeline.load_data)
+TRAINING_COLUMNS = [
+    'tourist_id', 'time_of_day_bucket', 'distance_from_itinerary', 'time_since_last_fix',
+    'avg_speed_last_15min', 'area_risk_score', 'prior_incidents_count', 'days_into_trip',
+    'is_in_restricted_zone', 'sos_flag', 'age', 'sex_encoded', 'days_trip_duration', 'safety_label'
+]
+# The subset AnomalyDetectionModel.train reads
+ANOMALY_TRAINING_COLUMNS = [
+    'tourist_id', 'distance_from_itinerary', 'time_since_last_fix', 'avg_speed_last_15min',
+    'area_risk_score', 'days_into_trip'
+]
+
+
+# Bumped when the encoding in prepare_features changes
+DATASET_CACHE_VERSION = 1
+# LightGBM parameters that change how a Dataset is binned
+_DATASET_PARAMS = (
+    'max_bin', 'max_bin_by_feature', 'min_data_in_bin', 'bin_construct_sample_cnt', 'data_random_seed',
+    'seed', 'random_state', 'feature_pre_filter', 'min_data_in_leaf', 'use_missing', 'zero_as_missing',
+    'linear_tree'
+)
+
+
+def dataset_cache_key(data_dir: Path, params: Dict[str, Any]) -> str:
+    """Hash of the train/val files' contents, the safety features and the binning parameters."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps({
+        'version': DATASET_CACHE_VERSION,
+        'features': SAFETY_FEATURE_COLUMNS,
+        'categorical': SAFETY_CATEGORICAL_COLUMNS,
+        'params': {name: params[name] for name in _DATASET_PARAMS if name in params}
+    }, sort_keys=True).encode())
+    for name in ('train', 'val'):
+        for path in table_files(data_dir, name):
+            digest.update(f"{name}/{path.name}\0".encode())
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def _regression_metrics(preds: np.ndarray, data: lgb.Dataset) -> List[Tuple[str, float, bool]]:
+    """feval for Booster.eval_train/eval_valid: the rmse/mae/r2 reported by SafetyScoreModel."""
+    y = data.get_label()
+    return [
+        ('rmse', float(np.sqrt(mean_squared_error(y, preds))), False),
+        ('mae', float(mean_absolute_error(y, preds)), False),
+        ('r2', float(r2_score(y, preds)), True)
+    ]
+
+
+class _ChunkedTable:
+    """A stored feature table streamed from disk one chunk at a time.
+
+    chunk(k) returns chunk k encoded by `encode`. Only the current chunk is
+    kept; asking for an earlier one restarts the stream. lgb.Dataset reads
+    its Sequences front to back (once to sample bin boundaries, once to push
+    rows), so each pass reads the table once.
+    """
+
+    def __init__(self, data_dir: Path, name: str, chunk_rows: int):
+        self.data_dir = data_dir
+        self.name = name
+        self.chunk_rows = chunk_rows
+        self.encode: Optional[Callable[[pd.DataFrame], np.ndarray]] = None
+        self.sizes: List[int] = []
+        self._stream = None
+        self._next = 0
+        self._index = -1
+        self._current = None
+
+    def scan(self, categorical: List[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """First pass: chunk sizes, labels, and the sorted distinct values of `categorical`."""
+        labels, values = [], {col: set() for col in categorical}
+        self.sizes = []
+        for chunk in iter_chunks(self.data_dir, self.name, ['safety_label'] + categorical, self.chunk_rows):
+            self.sizes.append(len(chunk))
+            labels.append(chunk['safety_label'].to_numpy())
+            for col in categorical:
+                values[col].update(chunk[col].unique().tolist())
+        return (np.concatenate(labels) if labels else np.zeros(0),
+                {col: np.array(sorted(v), dtype=object) for col, v in values.items()})
+
+    def chunk(self, index: int) -> np.ndarray:
+        if index == self._index:
+            return self._current
+        if self._stream is None or index < self._next:
+            self._stream = iter_chunks(self.data_dir, self.name, TRAINING_COLUMNS, self.chunk_rows)
+            self._next = 0
+        self._current = None  # release the previous chunk before reading the next
+        while self._next <= index:
+            frame = next(self._stream)
+            self._next += 1
+        self._index, self._current = index, self.encode(frame)
+        return self._current
+
+    def sequences(self) -> List['_ChunkSequence']:
+        return [_ChunkSequence(self, index, rows) for index, rows in enumerate(self.sizes)]
+
+
+class _ChunkSequence(lgb.Sequence):
+    """One chunk of a _ChunkedTable as a LightGBM Sequence, pushed in a single batch."""
+
+    def __init__(self, table: _ChunkedTable, index: int, rows: int):
+        self.table = table
+        self.index = index
+        self.rows = rows
+        self.batch_size = rows
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, idx):
+        return self.table.chunk(self.index)[idx]
+
 
 class SafetyScoreModel:
     """Safety Score Prediction Model using LightGBM."""
@@ -54,18 +183,16 @@ class SafetyScoreModel:
         self.feature_names = None
         self.scaler = StandardScaler()
         self.label_encoders = {}
+        self.encoder = None
+        self.trees = None
         
     def prepare_features(self, df: pd.DataFrame, fit_encoders: bool = False) -> np.ndarray:
         """Prepare features for training/inference."""
         # Feature columns to use
-        feature_cols = [
-            'distance_from_itinerary', 'time_since_last_fix', 'avg_speed_last_15min',
-            'area_risk_score', 'prior_incidents_count', 'days_into_trip',
-            'is_in_restricted_zone', 'sos_flag', 'age', 'sex_encoded', 'days_trip_duration'
-        ]
+        feature_cols = list(SAFETY_FEATURE_COLUMNS)
         
         # Categorical features to encode
-        categorical_cols = ['time_of_day_bucket']
+        categorical_cols = SAFETY_CATEGORICAL_COLUMNS
         
         df_processed = df.copy()
         
@@ -103,78 +230,176 @@ class SafetyScoreModel:
     
     def train(self, train_df: pd.DataFrame, val_df: pd.DataFrame = None) -> Dict[str, Any]:
         """Train the safety score model."""
+        train_data, val_data = self.build_datasets(train_df, val_df)
+        return self.train_datasets(train_data, val_data)
+
+    def train_out_of_core(self, data_dir: str, chunk_rows: int = 100_000) -> Dict[str, Any]:
+        """Train like train() on the stored train/val splits without loading them."""
+        train_data, val_data = self.build_datasets_out_of_core(data_dir, chunk_rows)
+        return self.train_datasets(train_data, val_data)
+
+    def build_datasets(self, train_df: pd.DataFrame,
+                       val_df: pd.DataFrame = None) -> Tuple[lgb.Dataset, Optional[lgb.Dataset]]:
+        """Fit the encoders on train_df and bin both frames into LightGBM Datasets."""
         print("Preparing training features...")
         X_train, feature_cols = self.prepare_features(train_df, fit_encoders=True)
-        y_train = train_df['safety_label'].values
-        
+        train_data = lgb.Dataset(X_train, label=train_df['safety_label'].values,
+                                 feature_name=feature_cols, params=self.params).construct()
+        val_data = None
         if val_df is not None:
             X_val, _ = self.prepare_features(val_df, fit_encoders=False)
-            y_val = val_df['safety_label'].values
-            val_data = lgb.Dataset(X_val, label=y_val, feature_name=feature_cols)
-            valid_sets = [val_data]
-            valid_names = ['validation']
-        else:
-            valid_sets = None
-            valid_names = None
-        
+            val_data = lgb.Dataset(X_val, label=val_df['safety_label'].values, feature_name=feature_cols,
+                                   reference=train_data, params=self.params).construct()
+        return train_data, val_data
+
+    def build_datasets_out_of_core(self, data_dir: str,
+                                   chunk_rows: int = 100_000) -> Tuple[lgb.Dataset, Optional[lgb.Dataset]]:
+        """build_datasets() for the stored train/val splits, streamed from disk.
+
+        Both splits are read in chunks of `chunk_rows` rows and pushed into
+        the Datasets chunk by chunk, so beyond the binned Datasets and the
+        labels only one raw chunk is in memory at a time. Encoders are fitted
+        on a first pass over the categorical columns; the Datasets match
+        build_datasets() on the same data.
+        """
+        data_dir = Path(data_dir)
+        train_table = _ChunkedTable(data_dir, 'train', chunk_rows)
+        val_table = _ChunkedTable(data_dir, 'val', chunk_rows)
+
+        print("Scanning training data...")
+        y_train, categories = train_table.scan(SAFETY_CATEGORICAL_COLUMNS)
+        y_val, _ = val_table.scan([])
+        self.label_encoders = {col: LabelEncoder().fit(values) for col, values in categories.items()}
+
+        def encode(frame: pd.DataFrame) -> np.ndarray:
+            X, cols = self.prepare_features(frame, fit_encoders=False)
+            self.feature_names = cols
+            # lgb.Dataset stores train()'s mixed-dtype matrix as float32;
+            # Sequences must be float64, so round through float32 instead
+            return X.astype(np.float32).astype(np.float64)
+
+        train_table.encode = val_table.encode = encode
+        train_table.chunk(0)
+        feature_cols = self.feature_names
+
+        print("Binning training data...")
+        train_data = lgb.Dataset(train_table.sequences(), label=y_train, feature_name=feature_cols,
+                                 params=self.params).construct()
+        val_data = None
+        if len(y_val):
+            val_data = lgb.Dataset(val_table.sequences(), label=y_val, feature_name=feature_cols,
+                                   reference=train_data, params=self.params).construct()
+        return train_data, val_data
+
+    def save_datasets(self, cache_dir: Path, train_data: lgb.Dataset, val_data: Optional[lgb.Dataset] = None):
+        """Save constructed Datasets and the fitted encoders for load_datasets()."""
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        train_data.save_binary(str(cache_dir / 'train.bin'))
+        if val_data is not None:
+            val_data.save_binary(str(cache_dir / 'val.bin'))
+        meta = {
+            'feature_names': self.feature_names,
+            'label_encoders': {col: encoder.classes_.tolist() for col, encoder in self.label_encoders.items()}
+        }
+        # meta.json marks a complete entry, so it is written last
+        with open(cache_dir / 'meta.json.tmp', 'w') as f:
+            json.dump(meta, f)
+        (cache_dir / 'meta.json.tmp').replace(cache_dir / 'meta.json')
+
+    def load_datasets(self, cache_dir: Path) -> Tuple[lgb.Dataset, Optional[lgb.Dataset]]:
+        """Load Datasets saved by save_datasets() and restore the encoders fitted with them."""
+        cache_dir = Path(cache_dir)
+        with open(cache_dir / 'meta.json') as f:
+            meta = json.load(f)
+        self.feature_names = meta['feature_names']
+        self.label_encoders = {}
+        for col, classes in meta['label_encoders'].items():
+            encoder = LabelEncoder()
+            encoder.classes_ = np.array(classes, dtype=object)
+            self.label_encoders[col] = encoder
+        train_data = lgb.Dataset(str(cache_dir / 'train.bin'), params=self.params).construct()
+        val_data = None
+        if (cache_dir / 'val.bin').exists():
+            val_data = lgb.Dataset(str(cache_dir / 'val.bin'), reference=train_data,
+                                   params=self.params).construct()
+        return train_data, val_data
+
+    def train_datasets(self, train_data: lgb.Dataset, val_data: Optional[lgb.Dataset] = None) -> Dict[str, Any]:
+        """Train on constructed Datasets (from build_datasets, or loaded from a binary cache).
+
+        Metrics come from the booster's scores on the binned rows, as the
+        Datasets hold no raw features to predict on.
+        """
         print("Training LightGBM model...")
-        train_data = lgb.Dataset(X_train, label=y_train, feature_name=feature_cols)
-        
-        self.model = lgb.train(
+        valid_sets = [val_data] if val_data is not None else None
+        valid_names = ['validation'] if val_data is not None else None
+        model = lgb.train(
             self.params,
             train_data,
             num_boost_round=1000,
             valid_sets=valid_sets,
             valid_names=valid_names,
-            callbacks=[lgb.early_stopping(100), lgb.log_evaluation(100)]
+            callbacks=[lgb.early_stopping(100), lgb.log_evaluation(100)],
+            keep_training_booster=True
         )
-        
-        # Training metrics
-        train_pred = self.model.predict(X_train)
-        train_metrics = {
-            'train_rmse': np.sqrt(mean_squared_error(y_train, train_pred)),
-            'train_mae': mean_absolute_error(y_train, train_pred),
-            'train_r2': r2_score(y_train, train_pred)
-        }
-        
-        if val_df is not None:
-            val_pred = self.model.predict(X_val)
-            val_metrics = {
-                'val_rmse': np.sqrt(mean_squared_error(y_val, val_pred)),
-                'val_mae': mean_absolute_error(y_val, val_pred),
-                'val_r2': r2_score(y_val, val_pred)
-            }
-            train_metrics.update(val_metrics)
+        # Drop the rounds after the best one, as lgb.train does when it
+        # hands back the model, so the scores below are the model's
+        while model.best_iteration and model.current_iteration() > model.best_iteration:
+            model.rollback_one_iter()
+
+        train_metrics = {f'train_{name}': value for _, name, value, _ in model.eval_train(_regression_metrics)}
+        if val_data is not None:
+            train_metrics.update({f'val_{name}': value
+                                  for _, name, value, _ in model.eval_valid(_regression_metrics)})
+        self.model = model.model_from_string(model.model_to_string()).free_dataset()
+        self.encoder = SafetyFeatureEncoder.from_model(self)
+        try:
+            self.trees = CompiledTrees.from_booster(self.model)
+        except ValueError as e:
+            print(f"Trees not compiled, predictions use the booster: {e}")
+            self.trees = None
         
         print(f"Training complete! RMSE: {train_metrics['train_rmse']:.2f}")
         return train_metrics
     
-    def predict(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    def encode(self, columns) -> np.ndarray:
+        """Encode a DataFrame or dict of raw columns for inference."""
+        if getattr(self, 'encoder', None) is None:
+            # Models saved before the frozen encoder existed
+            self.encoder = SafetyFeatureEncoder.from_model(self)
+        return self.encoder.transform(columns)
+    
+    def predict(self, df) -> Tuple[np.ndarray, np.ndarray]:
         """Predict safety scores with confidence."""
-        X, _ = self.prepare_features(df, fit_encoders=False)
-        predictions = self.model.predict(X)
-        
-        # Calculate confidence based on prediction variance
-        # This is a simple heuristic - in practice you might use prediction intervals
-        confidence = np.clip(100 - np.abs(predictions - 50), 20, 95) / 100
-        
-        return np.clip(predictions, 0, 100), confidence
+        X = self.encode(df)
+        return safety_scores(predict_raw(self.model, getattr(self, 'trees', None), X))
     
+    def explainer(self) -> SafetyExplainer:
+        """SHAP explainer for this model, built on first use and kept."""
+        if getattr(self, '_explainer', None) is None:
+            self._explainer = SafetyExplainer(self.model, self.feature_names)
+        return self._explainer
+
+    def __getstate__(self):
+        # The explainer is rebuilt on demand rather than pickled with the model
+        state = self.__dict__.copy()
+        state.pop('_explainer', None)
+        return state
+
     def explain_prediction(self, df: pd.DataFrame, sample_idx: int = 0) -> Dict[str, Any]:
         """Provide explanation for a single prediction using SHAP."""
-        X, feature_cols = self.prepare_features(df, fit_encoders=False)
-        
-        # Create SHAP explainer
-        explainer = shap.TreeExplainer(self.model)
-        shap_values = explainer.shap_values(X[sample_idx:sample_idx+1])
+        X = self.encode(df.iloc[sample_idx:sample_idx + 1])
+        explainer = self.explainer()
+        shap_values, base_values = explainer.explain(X)
         
         # Get feature importance
-        feature_importance = dict(zip(feature_cols, shap_values[0]))
+        feature_importance = dict(zip(self.feature_names, shap_values[0]))
         
         return {
-            'prediction': self.model.predict(X[sample_idx:sample_idx+1])[0],
+            'prediction': self.model.predict(X)[0],
             'feature_importance': feature_importance,
-            'base_value': explainer.expected_value
+            'base_value': base_values[0]
         }
     
     def get_feature_importance(self) -> Dict[str, float]:
@@ -182,20 +407,108 @@ class SafetyScoreModel:
         importance = self.model.feature_importance(importance_type='gain')
         return dict(zip(self.feature_names, importance))
 
+# Reasons reported by AnomalyDetectionModel.detect_anomalies, in order; the
+# rule-based ones map to bits of _detect_rule_based_anomalies' bitmask and
+# the ML flag takes the next bit.
+RULE_ANOMALY_REASONS = (
+    'route_deviation',
+    'communication_loss',
+    'prolonged_inactivity',
+    'high_risk_area',
+    'night_travel_risky_area',
+    'sos_activated',
+    'restricted_zone_entry',
+)
+ANOMALY_REASONS = RULE_ANOMALY_REASONS + ('ml_detected_anomaly',)
+_ANOMALY_REASON_LISTS = [
+    tuple(reason for bit, reason in enumerate(ANOMALY_REASONS) if code >> bit & 1)
+    for code in range(1 << len(ANOMALY_REASONS))
+]
+SEVERITY_INFO, SEVERITY_WARN, SEVERITY_CRITICAL = 0, 1, 2
+
+
+def _alert_timestamps(values: pd.Series) -> List[Any]:
+    """Timestamps for alert dicts: the ISO strings the ticks carry.
+
+    Stored datasets are read with datetime64 timestamps (see
+    dataset_store.py); alerts are JSON payloads, so those are turned back
+    into the strings they were generated as.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return [None if pd.isna(ts) else ts.isoformat() for ts in values]
+    return values.tolist()
+
+
+class NystroemOneClassSVM:
+    """Approximate RBF One-Class SVM: a linear one-class SVM (SGD) on a
+    Nystroem feature map of `n_components` landmark rows.
+
+    Fitting is linear in the number of rows, and scoring costs
+    O(n_components) per row however large the training set. The feature map
+    and the linear model fold into the exact model's form,
+
+        decision(x) = sum_j w_j * exp(-gamma * ||x - c_j||^2) - offset,
+
+    with w = normalization.T @ coef, so the fitted model exposes
+    support_vectors_/dual_coef_/intercept_ like OneClassSVM and is exported
+    and scored by ArrayOneClassSVM unchanged.
+    """
+
+    def __init__(self, nu: float = 0.1, gamma='scale', n_components: int = 300,
+                 random_state: int = 42):
+        self.nu = nu
+        self.gamma = gamma
+        self.n_components = n_components
+        self.random_state = random_state
+
+    def fit(self, X) -> 'NystroemOneClassSVM':
+        X = np.asarray(X, dtype=np.float64)
+        # Same rule as OneClassSVM(gamma='scale')
+        self._gamma = 1.0 / (X.shape[1] * X.var()) if self.gamma == 'scale' else float(self.gamma)
+        feature_map = Nystroem(kernel='rbf', gamma=self._gamma,
+                               n_components=min(self.n_components, len(X)),
+                               random_state=self.random_state)
+        features = feature_map.fit_transform(X)
+        linear = SGDOneClassSVM(nu=self.nu, random_state=self.random_state).fit(features)
+
+        self.support_vectors_ = feature_map.components_
+        self.dual_coef_ = (feature_map.normalization_.T @ linear.coef_)[None, :]
+        self.intercept_ = np.array([-linear.offset_[0]])
+        self._kernel = ArrayOneClassSVM(self.support_vectors_, self.dual_coef_.ravel(),
+                                        self.intercept_[0], self._gamma)
+        return self
+
+    def decision_function(self, X) -> np.ndarray:
+        return self._kernel.decision_function(X)
+
+    def predict(self, X) -> np.ndarray:
+        return self._kernel.predict(X)
+
+
 class AnomalyDetectionModel:
-    """Anomaly Detection Model combining rule-based and ML approaches."""
+    """Anomaly Detection Model combining rule-based and ML approaches.
+
+    `svm='nystroem'` swaps the exact One-Class SVM, whose fit is quadratic in
+    the rows and whose scoring cost grows with the support vectors, for
+    NystroemOneClassSVM with `svm_components` landmarks.
+    """
     
-    def __init__(self):
+    def __init__(self, svm: str = 'exact', svm_components: int = 300):
         self.isolation_forest = IsolationForest(
             contamination=0.1, 
             random_state=42,
             n_estimators=100
         )
-        self.one_class_svm = OneClassSVM(
-            nu=0.1, 
-            kernel='rbf',
-            gamma='scale'
-        )
+        if svm == 'exact':
+            self.one_class_svm = OneClassSVM(
+                nu=0.1, 
+                kernel='rbf',
+                gamma='scale'
+            )
+        elif svm == 'nystroem':
+            self.one_class_svm = NystroemOneClassSVM(nu=0.1, gamma='scale', n_components=svm_components)
+        else:
+            raise ValueError(f"Unknown one-class SVM mode: {svm}")
         self.scaler = StandardScaler()
         self.feature_names = None
         self.thresholds = {
@@ -206,23 +519,33 @@ class AnomalyDetectionModel:
             'battery_critical': 10  # battery percentage
         }
         
-    def prepare_features(self, df: pd.DataFrame, fit_scaler: bool = False) -> np.ndarray:
-        """Prepare features for anomaly detection."""
+    def prepare_features(self, df: pd.DataFrame, fit_scaler: bool = False,
+                         speed_stats: Optional[SpeedStats] = None) -> np.ndarray:
+        """Prepare features for anomaly detection.
+
+        `speed_variance` is the running std of the tourist's speed over the
+        ticks seen so far, read from `speed_stats` after folding in `df`'s
+        rows; without a store the frame is taken as the whole history, in
+        row order.
+        """
         feature_cols = [
             'distance_from_itinerary', 'time_since_last_fix', 'avg_speed_last_15min',
             'area_risk_score', 'days_into_trip'
         ]
         
         # Add derived features
-        df_processed = df.copy()
-        df_processed['speed_variance'] = df_processed.groupby('tourist_id')['avg_speed_last_15min'].transform('std').fillna(0)
-        df_processed['location_consistency'] = 1.0 / (1.0 + df_processed['distance_from_itinerary'])
+        if speed_stats is None:
+            speed_stats = SpeedStats()
+        features = {col: df[col] for col in feature_cols if col in df.columns}
+        features['speed_variance'] = speed_stats.update(df['tourist_id'].to_numpy(),
+                                                        df['avg_speed_last_15min'].to_numpy())
+        features['location_consistency'] = 1.0 / (1.0 + df['distance_from_itinerary'].astype(np.float64))
         
         feature_cols.extend(['speed_variance', 'location_consistency'])
         
         # Select features
-        available_cols = [col for col in feature_cols if col in df_processed.columns]
-        X = df_processed[available_cols].fillna(0)
+        available_cols = [col for col in feature_cols if col in features]
+        X = pd.DataFrame({col: features[col] for col in available_cols}, index=df.index).fillna(0)
         
         if fit_scaler:
             X_scaled = self.scaler.fit_transform(X)
@@ -255,115 +578,215 @@ class AnomalyDetectionModel:
         print("Anomaly detection training complete!")
         return metrics
     
-    def detect_anomalies(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Detect anomalies in location data."""
-        anomalies = []
-        
-        for idx, row in df.iterrows():
-            alert = {
-                'tourist_id': row['tourist_id'],
-                'timestamp': row['timestamp'],
-                'anomaly': False,
-                'severity': 'info',
-                'reasons': [],
-                'anomaly_score': 0.0,
-                'ml_scores': {}
-            }
-            
-            # Rule-based detection
-            rule_anomalies = self._detect_rule_based_anomalies(row)
-            
-            # ML-based detection
-            X, _ = self.prepare_features(pd.DataFrame([row]), fit_scaler=False)
-            
-            if_score = self.isolation_forest.decision_function(X)[0]
-            svm_score = self.one_class_svm.decision_function(X)[0]
-            if_anomaly = self.isolation_forest.predict(X)[0] == -1
-            svm_anomaly = self.one_class_svm.predict(X)[0] == -1
-            
-            alert['ml_scores'] = {
-                'isolation_forest': float(if_score),
-                'svm': float(svm_score)
+    def detect_anomalies(self, df: pd.DataFrame,
+                         speed_stats: Optional[SpeedStats] = None) -> List[Dict[str, Any]]:
+        """Detect anomalies in location data.
+
+        The whole frame is scored with one call per model and the rules are
+        applied as column masks. Pass the caller's `speed_stats` to continue
+        each tourist's history across calls (see prepare_features).
+        """
+        if len(df) == 0:
+            return []
+
+        # Rule-based detection
+        codes, rule_severity = self._detect_rule_based_anomalies(df)
+        
+        # ML-based detection
+        X, _ = self.prepare_features(df, speed_stats=speed_stats)
+        if_scores = self.isolation_forest.decision_function(X)
+        svm_scores = self.one_class_svm.decision_function(X)
+        # Same thresholds IsolationForest.predict and OneClassSVM.predict apply
+        ml_anomaly = (if_scores < 0) | (svm_scores <= 0)
+        
+        # Combine rule-based and ML results
+        rule_codes = codes
+        codes = codes | (ml_anomaly.astype(np.int64) << len(RULE_ANOMALY_REASONS))
+        
+        # Determine overall severity
+        critical = (rule_severity == SEVERITY_CRITICAL) | (ml_anomaly & (rule_codes != 0))
+        warn = ~critical & ((rule_severity == SEVERITY_WARN) | ml_anomaly)
+        ml_magnitude = np.abs(np.minimum(if_scores, svm_scores))
+        anomaly_score = np.where(critical, np.maximum(0.9, ml_magnitude),
+                                 np.where(warn, np.maximum(0.6, ml_magnitude),
+                                          np.where(codes != 0, 0.3, 0.0)))
+        severity = np.where(critical, 'critical', np.where(warn, 'warn', 'info'))
+        
+        reasons = _ANOMALY_REASON_LISTS
+        return [
+            {
+                'tourist_id': tid,
+                'timestamp': ts,
+                'anomaly': is_anomaly,
+                'severity': sev,
+                'reasons': list(reasons[code]),
+                'anomaly_score': score,
+                'ml_scores': {
+                    'isolation_forest': if_score,
+                    'svm': svm_score
+                }
             }
-            
-            # Combine rule-based and ML results
-            all_reasons = rule_anomalies['reasons']
-            ml_anomaly = if_anomaly or svm_anomaly
-            
-            if ml_anomaly:
-                all_reasons.append('ml_detected_anomaly')
-                
-            # Determine overall severity
-            if rule_anomalies['severity'] == 'critical' or (ml_anomaly and len(all_reasons) > 1):
-                alert['severity'] = 'critical'
-                alert['anomaly'] = True
-                alert['anomaly_score'] = max(0.9, abs(min(if_score, svm_score)))
-            elif rule_anomalies['severity'] == 'warn' or ml_anomaly:
-                alert['severity'] = 'warn'
-                alert['anomaly'] = True
-                alert['anomaly_score'] = max(0.6, abs(min(if_score, svm_score)))
-            elif len(all_reasons) > 0:
-                alert['severity'] = 'info'
-                alert['anomaly_score'] = 0.3
-                
-            alert['reasons'] = all_reasons
-            anomalies.append(alert)
-            
-        return anomalies
+            for tid, ts, is_anomaly, sev, code, score, if_score, svm_score in zip(
+                df['tourist_id'].tolist(),
+                _alert_timestamps(df['timestamp']),
+                (critical | warn).tolist(),
+                severity.tolist(),
+                codes.tolist(),
+                anomaly_score.tolist(),
+                if_scores.astype(np.float64).tolist(),
+                svm_scores.astype(np.float64).tolist(),
+            )
+        ]
     
-    def _detect_rule_based_anomalies(self, row: pd.Series) -> Dict[str, Any]:
-        """Detect rule-based anomalies."""
-        reasons = []
-        severity = 'info'
-        
-        # Route deviation
-        if row.get('distance_from_itinerary', 0) > self.thresholds['distance_from_itinerary']:
-            reasons.append('route_deviation')
-            severity = 'warn'
-            
-        # Communication loss
-        if row.get('time_since_last_fix', 0) > self.thresholds['time_since_last_fix']:
-            reasons.append('communication_loss')
-            if row.get('time_since_last_fix', 0) > 3600:  # More than 1 hour
-                severity = 'critical'
-            else:
-                severity = 'warn'
-                
-        # Prolonged inactivity
-        if row.get('avg_speed_last_15min', 1) == 0:
-            reasons.append('prolonged_inactivity')
-            severity = 'warn'
-            
-        # High risk area
-        if row.get('area_risk_score', 0) > self.thresholds['high_risk_area']:
-            reasons.append('high_risk_area')
-            severity = 'warn'
-            
-        # Night travel in high risk area
-        if (row.get('time_of_day_bucket', '') == 'night' and 
-            row.get('area_risk_score', 0) > 0.4):
-            reasons.append('night_travel_risky_area')
-            severity = 'warn'
-            
-        # SOS flag
-        if row.get('sos_flag', False):
-            reasons.append('sos_activated')
-            severity = 'critical'
-            
-        # Restricted zone
-        if row.get('is_in_restricted_zone', False):
-            reasons.append('restricted_zone_entry')
-            severity = 'warn'
-            
-        return {'reasons': reasons, 'severity': severity}
+    def _detect_rule_based_anomalies(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Detect rule-based anomalies for every row.
+
+        Returns a bitmask over RULE_ANOMALY_REASONS and a severity level per
+        row; as in the original per-row checks, the last rule that fires sets
+        the severity.
+        """
+        n = len(df)
+
+        def col(name, default):
+            return df[name].to_numpy() if name in df.columns else np.full(n, default)
+
+        distance = col('distance_from_itinerary', 0)
+        since_fix = col('time_since_last_fix', 0)
+        area_risk = col('area_risk_score', 0)
+        rules = (
+            # Route deviation
+            (distance > self.thresholds['distance_from_itinerary'], SEVERITY_WARN),
+            # Communication loss, critical after more than 1 hour
+            (since_fix > self.thresholds['time_since_last_fix'],
+             np.where(since_fix > 3600, SEVERITY_CRITICAL, SEVERITY_WARN)),
+            # Prolonged inactivity
+            (col('avg_speed_last_15min', 1) == 0, SEVERITY_WARN),
+            # High risk area
+            (area_risk > self.thresholds['high_risk_area'], SEVERITY_WARN),
+            # Night travel in high risk area
+            ((col('time_of_day_bucket', '') == 'night') & (area_risk > 0.4), SEVERITY_WARN),
+            # SOS flag (truthiness, as a per-row `if` would test it)
+            (col('sos_flag', False).astype(bool), SEVERITY_CRITICAL),
+            # Restricted zone
+            (col('is_in_restricted_zone', False).astype(bool), SEVERITY_WARN),
+        )
+        codes = np.zeros(n, dtype=np.int64)
+        severity = np.full(n, SEVERITY_INFO, dtype=np.int64)
+        for bit, (mask, level) in enumerate(rules):
+            mask = np.asarray(mask, dtype=bool)
+            codes |= mask.astype(np.int64) << bit
+            severity = np.where(mask, level, severity)
+        return codes, severity
+
+# Search space sampled by ModelTrainingPipeline.sweep when no configs are given
+SWEEP_SPACE = {
+    'num_leaves': [15, 31, 63, 127],
+    'learning_rate': [0.02, 0.05, 0.1],
+    'feature_fraction': [0.7, 0.9, 1.0],
+    'bagging_fraction': [0.7, 0.8, 1.0],
+    'lambda_l1': [0.0, 1.0],
+    'lambda_l2': [0.0, 1.0, 10.0]
+}
+
+
+def sample_sweep_configs(n: int, space: Dict[str, List[Any]] = None, seed: int = 0) -> List[Dict[str, Any]]:
+    """`n` distinct parameter sets drawn at random from the grid `space`."""
+    space = space or SWEEP_SPACE
+    names = sorted(space)
+    total = int(np.prod([len(space[name]) for name in names]))
+    rng = np.random.default_rng(seed)
+    configs = []
+    for flat in rng.choice(total, size=min(n, total), replace=False):
+        config = {}
+        for name in names:
+            flat, pick = divmod(int(flat), len(space[name]))
+            config[name] = space[name][pick]
+        configs.append(config)
+    return configs
+
+
+# Per-process state of a sweep worker (see _init_sweep_worker)
+_SWEEP_WORKER: Dict[str, Any] = {}
+
+
+def _init_sweep_worker(cache_entry: str, base_params: Dict[str, Any], rungs, lock, num_threads: int):
+    model = SafetyScoreModel(base_params)
+    train_data, val_data = model.load_datasets(Path(cache_entry))
+    _SWEEP_WORKER.update(train_data=train_data, val_data=val_data, base_params=base_params, rungs=rungs,
+                         lock=lock, num_threads=num_threads)
+
+
+def _run_sweep_trial(trial: int, config: Dict[str, Any], eta: Optional[int], min_rounds: int) -> Dict[str, Any]:
+    """Train one configuration on the worker's shared Datasets.
+
+    With `eta`, trials are pruned by asynchronous successive halving: at
+    rounds min_rounds * eta**k each trial records its validation RMSE in the
+    sweep-wide rung and stops unless it is in the top 1/eta of the trials
+    that have reached that rung so far.
+    """
+    state = _SWEEP_WORKER
+    # Same base as the final retrain, so trials are ranked under the params the winner gets
+    params = dict(state['base_params'], **config, num_threads=state['num_threads'])
+    rung_rounds = set()
+    if eta:
+        rounds = min_rounds
+        while rounds < 1000:
+            rung_rounds.add(rounds)
+            rounds *= eta
+    best = {'score': np.inf, 'iteration': 0, 'results': None, 'pruned_at': None, 'rounds': 0}
+
+    def prune(env):
+        best['rounds'] = env.iteration + 1
+        score = env.evaluation_result_list[0][2]
+        if score < best['score']:
+            best.update(score=score, iteration=env.iteration, results=env.evaluation_result_list)
+        rounds = env.iteration + 1
+        if rounds not in rung_rounds:
+            return
+        with state['lock']:
+            scores = state['rungs'].get(rounds, []) + [score]
+            state['rungs'][rounds] = scores
+        keep = len(scores) // eta
+        if keep and score > sorted(scores)[keep - 1]:
+            best['pruned_at'] = rounds
+            raise lgb.callback.EarlyStopException(best['iteration'], best['results'])
+    prune.order = 40  # after early stopping
+
+    start = time.perf_counter()
+    booster = lgb.train(
+        params,
+        state['train_data'],
+        num_boost_round=1000,
+        valid_sets=[state['val_data']],
+        valid_names=['validation'],
+        callbacks=[lgb.early_stopping(100, verbose=False), prune]
+    )
+    return {
+        'trial': trial,
+        'val_rmse': float(booster.best_score['validation']['rmse']),
+        'best_iteration': booster.best_iteration,
+        'rounds': best['rounds'],
+        'pruned_at': best['pruned_at'],
+        'train_seconds': time.perf_counter() - start,
+        'params': json.dumps(config, sort_keys=True)
+    }
+
 
 class ModelTrainingPipeline:
     """Complete model training and evaluation pipeline."""
     
-    def __init__(self, data_dir: str = "data", models_dir: str = "models"):
+    def __init__(self, data_dir: str = "data", models_dir: str = "models",
+                 chunk_rows: Optional[int] = None, dataset_cache: bool = True,
+                 dataset_cache_dir: Optional[str] = None):
         self.data_dir = Path(data_dir)
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(exist_ok=True)
+        # Set to train the safety model out of core, streaming this many rows at a time
+        self.chunk_rows = chunk_rows
+        # Binned safety-model Datasets, reused while the train/val data is unchanged
+        self.dataset_cache_dir = None
+        if dataset_cache:
+            self.dataset_cache_dir = Path(dataset_cache_dir or self.data_dir / 'lgb_cache')
         
         self.safety_model = SafetyScoreModel()
         self.anomaly_model = AnomalyDetectionModel()
@@ -373,9 +796,10 @@ class ModelTrainingPipeline:
         """Load training, validation, and test datasets."""
         print("Loading datasets...")
         
-        train_df = pd.read_csv(self.data_dir / "train.csv")
-        val_df = pd.read_csv(self.data_dir / "val.csv")
-        test_df = pd.read_csv(self.data_dir / "test.csv")
+        # Only what training and evaluation read; timestamps for the test alerts
+        train_df = read_table(self.data_dir, 'train', TRAINING_COLUMNS)
+        val_df = read_table(self.data_dir, 'val', TRAINING_COLUMNS)
+        test_df = read_table(self.data_dir, 'test', TRAINING_COLUMNS + ['timestamp'])
         
         print(f"Train: {len(train_df)} samples")
         print(f"Validation: {len(val_df)} samples")
@@ -383,24 +807,126 @@ class ModelTrainingPipeline:
         
         return train_df, val_df, test_df
     
-    def train_models(self):
-        """Train all models."""
-        train_df, val_df, test_df = self.load_data()
+    def train_models(self, progress: Optional[Callable[[str], None]] = None):
+        """Train all models, reporting each stage name to `progress` if given."""
+        progress = progress or (lambda stage: None)
+        progress('loading_data')
+        cache_entry = None
+        if self.dataset_cache_dir is not None:
+            cache_entry = self.dataset_cache_dir / dataset_cache_key(self.data_dir, self.safety_model.params)
+        cached = cache_entry is not None and (cache_entry / 'meta.json').exists()
+        if cached or self.chunk_rows:
+            # The safety model reads its binned Datasets from the cache or
+            # streams train/val from disk; only the anomaly model's columns
+            # of the train split are loaded
+            print("Loading datasets...")
+            train_df = read_table(self.data_dir, 'train', ANOMALY_TRAINING_COLUMNS)
+            test_df = read_table(self.data_dir, 'test', TRAINING_COLUMNS + ['timestamp'])
+        else:
+            train_df, val_df, test_df = self.load_data()
         
         # Train safety score model
         print("\n=== Training Safety Score Model ===")
-        safety_metrics = self.safety_model.train(train_df, val_df)
+        progress('training_safety_model')
+        if cached:
+            print(f"Using cached datasets from {cache_entry}")
+            train_data, val_data = self.safety_model.load_datasets(cache_entry)
+        else:
+            if self.chunk_rows:
+                train_data, val_data = self.safety_model.build_datasets_out_of_core(self.data_dir, self.chunk_rows)
+            else:
+                train_data, val_data = self.safety_model.build_datasets(train_df, val_df)
+            if cache_entry is not None:
+                self.safety_model.save_datasets(cache_entry, train_data, val_data)
+        safety_metrics = self.safety_model.train_datasets(train_data, val_data)
         self.metrics['safety_score'] = safety_metrics
         
         # Train anomaly detection model
         print("\n=== Training Anomaly Detection Model ===")
+        progress('training_anomaly_model')
         anomaly_metrics = self.anomaly_model.train(train_df)
         self.metrics['anomaly_detection'] = anomaly_metrics
         
         # Evaluate on test set
         print("\n=== Evaluating on Test Set ===")
+        progress('evaluating')
         self._evaluate_test_set(test_df)
         
+    def sweep(self, configs: Optional[List[Dict[str, Any]]] = None, workers: Optional[int] = None,
+              eta: Optional[int] = 3, min_rounds: int = 50) -> pd.DataFrame:
+        """Train many safety-model parameter sets concurrently and rank them by val RMSE.
+
+        Each configuration overrides the pipeline's safety-model params
+        (--safety-params, else SafetyScoreModel's defaults), the same base
+        the winner is retrained with (default: 24 samples of SWEEP_SPACE). The binned train/val Datasets
+        are built once (or taken from the dataset cache) and loaded by every
+        worker process; `num_threads` is the CPU count split across the
+        workers. Losing trials are pruned by asynchronous successive halving
+        (see _run_sweep_trial); eta=None trains every trial to early
+        stopping. The leaderboard is written to sweep_leaderboard.csv and
+        the winner's parameters to sweep_best_params.json in models_dir.
+        """
+        import multiprocessing
+        import shutil
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        configs = configs if configs is not None else sample_sweep_configs(24)
+        for config in configs:
+            fixed = sorted(set(config) & set(_DATASET_PARAMS + ('min_child_samples', 'min_data')))
+            if fixed:
+                raise ValueError(f"Sweep configs cannot change Dataset binning parameters: {fixed}")
+        cpus = os.cpu_count() or 1
+        workers = max(1, min(workers or cpus, len(configs)))
+        num_threads = max(1, cpus // workers)
+
+        cache_root = self.dataset_cache_dir or Path(tempfile.mkdtemp(prefix='sweep-datasets-'))
+        cache_entry = cache_root / dataset_cache_key(self.data_dir, self.safety_model.params)
+        try:
+            if not (cache_entry / 'meta.json').exists():
+                model = SafetyScoreModel(self.safety_model.params)
+                if self.chunk_rows:
+                    datasets = model.build_datasets_out_of_core(self.data_dir, self.chunk_rows)
+                else:
+                    train_df, val_df, _ = self.load_data()
+                    datasets = model.build_datasets(train_df, val_df)
+                    del train_df, val_df
+                if datasets[1] is None:
+                    raise ValueError("Sweeps rank trials on the validation split, which is empty")
+                model.save_datasets(cache_entry, *datasets)
+                del datasets
+
+            print(f"Sweeping {len(configs)} configurations on {workers} workers x {num_threads} threads...")
+            ctx = multiprocessing.get_context('spawn')
+            start = time.perf_counter()
+            with ctx.Manager() as manager:
+                rungs, lock = manager.dict(), manager.Lock()
+                with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_sweep_worker,
+                                         initargs=(str(cache_entry), self.safety_model.params, rungs, lock,
+                                                   num_threads)) as pool:
+                    futures = [pool.submit(_run_sweep_trial, trial, config, eta, min_rounds)
+                               for trial, config in enumerate(configs)]
+                    results = []
+                    for future in as_completed(futures):
+                        result = future.result()
+                        results.append(result)
+                        status = f"pruned at {result['pruned_at']}" if result['pruned_at'] else 'complete'
+                        print(f"Trial {result['trial']}: val RMSE {result['val_rmse']:.4f} "
+                              f"in {result['train_seconds']:.1f}s ({status})")
+            elapsed = time.perf_counter() - start
+        finally:
+            if self.dataset_cache_dir is None:
+                shutil.rmtree(cache_root, ignore_errors=True)
+
+        leaderboard = pd.DataFrame(results).sort_values(['val_rmse', 'train_seconds']).reset_index(drop=True)
+        leaderboard.to_csv(self.models_dir / 'sweep_leaderboard.csv', index=False)
+        best = dict(self.safety_model.params, **json.loads(leaderboard.loc[0, 'params']))
+        with open(self.models_dir / 'sweep_best_params.json', 'w') as f:
+            json.dump(best, f, indent=2)
+        print(f"Sweep finished in {elapsed:.1f}s; best val RMSE {leaderboard.loc[0, 'val_rmse']:.4f}")
+        print(f"Leaderboard saved to {self.models_dir / 'sweep_leaderboard.csv'}")
+        return leaderboard
+
     def _evaluate_test_set(self, test_df: pd.DataFrame):
         """Evaluate models on test set."""
         # Safety score evaluation
@@ -420,7 +946,7 @@ class ModelTrainingPipeline:
         print(f"Safety Score Test R²: {test_r2:.3f}")
         
         # Anomaly detection evaluation
-        anomalies = self.anomaly_model.detect_anomalies(test_df.head(1000))  # Sample for speed
+        anomalies = self.anomaly_model.detect_anomalies(test_df)
         critical_alerts = sum(1 for a in anomalies if a['severity'] == 'critical')
         warn_alerts = sum(1 for a in anomalies if a['severity'] == 'warn')
         
@@ -440,6 +966,7 @@ class ModelTrainingPipeline:
             return
             
         print("\n=== Generating Evaluation Plots ===")
+        import matplotlib.pyplot as plt
         
         # Feature importance plot
         importance = self.safety_model.get_feature_importance()
@@ -467,6 +994,9 @@ class ModelTrainingPipeline:
         # Save anomaly detection model
         joblib.dump(self.anomaly_model, self.models_dir / 'anomaly_detection_model.joblib')
         
+        # Pickle-free artifacts loaded by the inference service
+        export_runtime_artifacts(self.safety_model, self.anomaly_model, self.models_dir / 'runtime')
+        
         # Save metrics
         with open(self.models_dir / 'training_metrics.json', 'w') as f:
             json.dump(self.metrics, f, indent=2)
@@ -484,7 +1014,8 @@ class ModelTrainingPipeline:
             },
             'model_files': {
                 'safety_score': 'safety_score_model.joblib',
-                'anomaly_detection': 'anomaly_detection_model.joblib'
+                'anomaly_detection': 'anomaly_detection_model.joblib',
+                'runtime': 'runtime/manifest.json'
             }
         }
         
@@ -580,6 +1111,27 @@ class ModelTrainingPipeline:
                 else:
                     print(f"  {metric}: {value}")
 
+def train_and_save(data_dir: str, models_dir: str, num_tourists: int = 1000,
+                   progress: Optional[Callable[[str], None]] = None):
+    """Generate a synthetic dataset if `data_dir` has none, then train and save models.
+
+    Used by the inference service to build missing models in a separate
+    process; `progress` receives each stage name as it starts.
+    """
+    progress = progress or (lambda stage: None)
+    if dataset_format(data_dir) is None:
+        print("Training data not found. Generating synthetic dataset...")
+        progress('generating_data')
+        from data_generator import TouristDataGenerator
+        generator = TouristDataGenerator(seed=42)
+        generator.generate_dataset(num_tourists=num_tourists, output_dir=str(data_dir))
+
+    pipeline = ModelTrainingPipeline(data_dir=str(data_dir), models_dir=str(models_dir))
+    pipeline.train_models(progress)
+    progress('saving')
+    pipeline.save_models()
+
+
 if __name__ == "__main__":
     import argparse
     
@@ -588,8 +1140,39 @@ if __name__ == "__main__":
                        help="Directory containing training data")
     parser.add_argument("--models-dir", type=str, default="models",
                        help="Directory to save trained models")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                       help="Train the safety model out of core, reading this many rows at a time")
+    parser.add_argument("--dataset-cache", type=str, default=None,
+                       help="Directory for cached binned datasets (default: <data-dir>/lgb_cache)")
+    parser.add_argument("--no-dataset-cache", action="store_true",
+                       help="Always rebuild the binned datasets")
+    parser.add_argument("--safety-params", type=str, default=None,
+                       help="JSON file of safety model parameters (e.g. sweep_best_params.json)")
+    parser.add_argument("--sweep", type=int, default=None,
+                       help="Run a hyperparameter sweep over this many sampled configurations instead of training")
+    parser.add_argument("--sweep-workers", type=int, default=None,
+                       help="Concurrent sweep trials (default: CPU count)")
+    parser.add_argument("--no-prune", action="store_true",
+                       help="Train every sweep trial to early stopping")
+    parser.add_argument("--anomaly-svm", choices=["exact", "nystroem"], default="exact",
+                       help="One-Class SVM of the anomaly model: exact RBF, or the Nystroem approximation")
+    parser.add_argument("--svm-components", type=int, default=300,
+                       help="Nystroem landmarks for --anomaly-svm nystroem")
     
     args = parser.parse_args()
     
-    pipeline = ModelTrainingPipeline(args.data_dir, args.models_dir)
-    pipeline.run_full_pipeline()
\ No newline at end of file
+    pipeline = ModelTrainingPipeline(args.data_dir, args.models_dir, chunk_rows=args.chunk_rows,
+                                     dataset_cache=not args.no_dataset_cache,
+                                     dataset_cache_dir=args.dataset_cache)
+    if args.safety_params:
+        with open(args.safety_params) as f:
+            pipeline.safety_model = SafetyScoreModel(json.load(f))
+    if args.anomaly_svm != 'exact':
+        pipeline.anomaly_model = AnomalyDetectionModel(svm=args.anomaly_svm,
+                                                       svm_components=args.svm_components)
+    
+    if args.sweep:
+        pipeline.sweep(sample_sweep_configs(args.sweep), workers=args.sweep_workers,
+                       eta=None if args.no_prune else 3)
+    else:
+        pipeline.run_full_pipeline()
\ No newline at end of file
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Safety-score cache for the inference service.
+Tourists standing still send nearly identical ticks every few seconds.
+PredictionCache quantizes the continuous inputs to fixed resolutions (10 m
+of distance, 0.01 of area risk, ...) and keys each row on the bytes of its
+encoded feature vector, so repeated ticks are answered from an LRU table
+instead of the model. Misses are scored on the quantized rows, so a row
+gets the same score whether or not it was cached. Entries expire after
+`ttl_s`, the table is held under `max_bytes`, and everything is dropped
+when the model version changes.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+Columns = Dict[str, np.ndarray]
+
+# Raw input column -> quantization step; columns not listed are used as is
+DEFAULT_RESOLUTIONS = {
+    'distance_from_itinerary': 10.0,  # metres
+    'time_since_last_fix': 60.0,  # seconds
+    'avg_speed_last_15min': 0.1,  # m/s
+    'area_risk_score': 0.01,
+}
+
+# Approximate bytes per entry besides its key: the OrderedDict slot and
+# links, the (score, confidence, expires_at) tuple and its three floats
+_ENTRY_OVERHEAD = 240
+
+
+@dataclass
+class CacheLookup:
+    """Result of PredictionCache.lookup for one batch.
+
+    `keys` are the distinct rows of the batch, `first` the batch row each
+    first appears at and `inverse` maps each row to its key; `missing`
+    indexes the keys that were not cached.
+    """
+    keys: List[bytes]
+    first: np.ndarray
+    inverse: np.ndarray
+    scores: np.ndarray
+    confidence: np.ndarray
+    missing: np.ndarray
+    version: Optional[str]
+
+    @property
+    def missing_rows(self) -> np.ndarray:
+        """Batch rows to score: one per missing key."""
+        return self.first[self.missing]
+
+    def fill(self, scores: np.ndarray, confidence: np.ndarray):
+        """Record the model's output for the missing keys."""
+        self.scores[self.missing] = scores
+        self.confidence[self.missing] = confidence
+
+    def result(self):
+        """(scores, confidence) per batch row."""
+        return self.scores[self.inverse], self.confidence[self.inverse]
+
+
+class PredictionCache:
+    """LRU/TTL table of (score, confidence) keyed on quantized, encoded feature rows.
+
+    Thread-safe; counters are in `stats`.
+    """
+
+    def __init__(self, resolutions: Optional[Dict[str, float]] = None, max_bytes: int = 64 << 20,
+                 ttl_s: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.resolutions = dict(DEFAULT_RESOLUTIONS if resolutions is None else resolutions)
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def quantize(self, cols: Columns) -> Columns:
+        """Copy of `cols` with each configured column rounded to its resolution.
+
+        Non-zero values never round to zero: the model treats exactly 0 (a
+        stationary tourist, no itinerary deviation) differently from small
+        values, so those round to +-step instead. NaN is kept.
+        """
+        out = dict(cols)
+        for name, step in self.resolutions.items():
+            if name in out and step > 0:
+                x = np.asarray(out[name], dtype=np.float64)
+                q = np.round(x / step) * step
+                # + 0.0 turns -0.0 into 0.0 so both share a key
+                out[name] = np.where((q == 0) & (x != 0), np.copysign(step, x), q) + 0.0
+        return out
+
+    def _set_version(self, version: Optional[str]):
+        # Caller holds the lock
+        if version != self._version:
+            if self._entries:
+                self.stats['invalidations'] += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def lookup(self, X: np.ndarray, version: Optional[str] = None) -> CacheLookup:
+        """Look up the encoded rows X (from quantized columns) for model `version`.
+
+        A version other than the one the entries were stored under clears the table.
+        """
+        X = np.ascontiguousarray(X)
+        rows = X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()
+        unique, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        keys = [row.tobytes() for row in unique]
+        scores = np.empty(len(keys))
+        confidence = np.empty(len(keys))
+        missing = []
+        now = self._clock()
+        with self._lock:
+            self._set_version(version)
+            entries = self._entries
+            for i, key in enumerate(keys):
+                entry = entries.get(key)
+                if entry is not None and entry[2] <= now:
+                    self._drop(key)
+                    self.stats['expirations'] += 1
+                    entry = None
+                if entry is None:
+                    missing.append(i)
+                    continue
+                entries.move_to_end(key)
+                scores[i], confidence[i] = entry[0], entry[1]
+            # Counted per batch row, duplicates included
+            counts = np.bincount(inverse.ravel(), minlength=len(keys))
+            missed = int(counts[missing].sum()) if missing else 0
+            self.stats['misses'] += missed
+            self.stats['hits'] += len(rows) - missed
+        return CacheLookup(keys, first, inverse.ravel(), scores, confidence,
+                           np.asarray(missing, dtype=np.int64), version)
+
+    def _drop(self, key: bytes):
+        del self._entries[key]
+        self._bytes -= sys.getsizeof(key) + _ENTRY_OVERHEAD
+
+    def store(self, lookup: CacheLookup):
+        """Insert the missing keys of a filled lookup; skipped if the model changed since."""
+        expires_at = self._clock() + self.ttl_s
+        with self._lock:
+            if lookup.version != self._version:
+                return
+            entries = self._entries
+            for i in lookup.missing.tolist():
+                key = lookup.keys[i]
+                if key in entries:
+                    self._drop(key)
+                entries[key] = (float(lookup.scores[i]), float(lookup.confidence[i]), expires_at)
+                self._bytes += sys.getsizeof(key) + _ENTRY_OVERHEAD
+            while self._bytes > self.max_bytes and entries:
+                self._drop(next(iter(entries)))
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> Dict[str, float]:
+        lookups = max(self.stats['hits'] + self.stats['misses'], 1)
+        return {
+            **self.stats,
+            'hit_ratio': self.stats['hits'] / lookups,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'model_version': self._version,
+        }
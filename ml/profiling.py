@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Opt-in request profiler for the inference service.
+RequestProfiler samples a fraction of /predict requests and records where
+their time goes, on the event-loop thread and in the inference worker that
+scores them. The event-loop side is paused while the request awaits the
+worker, so other requests running on the loop stay out of its profile.
+Each profiled request is written to its own file in a private directory
+that keeps only the newest `max_files`:
+
+- mode 'stack': folded stacks ("frame;frame;frame microseconds" per line),
+  the input format of flamegraph.pl, inferno and speedscope. Stacks are
+  sampled from a sys.setprofile hook every `interval_s`, each weighted by
+  the time since the previous sample.
+- mode 'cprofile': a cProfile/pstats dump (.prof) per request, for
+  snakeviz, flameprof or `python -m pstats`.
+
+Profiling is toggled at runtime (configure() or toggle()); while it is off
+the service only reads `enabled` per request.
+"""
+
+import contextlib
+import cProfile
+import functools
+import os
+import pstats
+import random
+import stat
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+MODES = ('stack', 'cprofile')
+
+# Profiles hold request-derived frame data, so they go in a private per-user directory
+DEFAULT_DIR = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'tourist-safety' / 'profiles'
+
+
+def _private_dir(path: Path):
+    """Create `path` with mode 0700; PermissionError if it belongs to someone else or others can write to it."""
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode) or (hasattr(os, 'getuid') and (
+            info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH))):
+        raise PermissionError(f"Profile directory {path} must be owned by this user and not writable by others")
+
+
+def _frame_name(code) -> str:
+    # py-spy's folded-stack frame format: function (file:line)
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _fold(frame) -> list:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class _StackSampler:
+    """Time-weighted stack samples of the current thread, taken from a profile hook.
+
+    On each call/return event at least `interval_s` after the last sample,
+    the time since that sample is charged to the stack that was running:
+    the caller before a call, the returning function (or C function) before
+    a return.
+    """
+
+    def __init__(self, stacks: Counter, interval_s: float):
+        self.stacks = stacks
+        self.interval_s = interval_s
+        self._prefix = threading.current_thread().name
+        self._last = 0.0
+        self._previous = None
+
+    def _hook(self, frame, event, arg):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        if elapsed < self.interval_s:
+            return
+        self._last = now
+        if event == 'call':
+            frame = frame.f_back
+        stack = _fold(frame)
+        if event in ('c_return', 'c_exception'):
+            stack.append(f"{getattr(arg, '__qualname__', arg)} (native)")
+        self.stacks[';'.join([self._prefix] + stack)] += elapsed
+
+    def start(self) -> bool:
+        self._previous = sys.getprofile()
+        self._last = time.perf_counter()
+        sys.setprofile(self._hook)
+        return True
+
+    def stop(self):
+        sys.setprofile(self._previous)
+
+
+class _CProfileRecorder:
+    """A cProfile.Profile that reports, rather than raises, when it cannot start.
+
+    From Python 3.12 cProfile runs on sys.monitoring, which allows one
+    active profiler per process (and that one sees every thread), so a
+    second enable() raises ValueError.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.started = False
+
+    def start(self) -> bool:
+        try:
+            self.profile.enable()
+        except ValueError:
+            return False
+        self.started = True
+        return True
+
+    def stop(self):
+        self.profile.disable()
+
+
+class RequestProfile:
+    """Profile of one sampled request; threads join it through wrap()."""
+
+    def __init__(self, mode: str, interval_s: float):
+        self.mode = mode
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.duration_s = 0.0
+        self.rows = 0
+        self._recorder = None
+
+    def _start_recorder(self):
+        # Starts recording the calling thread; None if another profiler is active
+        recorder = _CProfileRecorder() if self.mode == 'cprofile' else _StackSampler(self.stacks, self.interval_s)
+        if not recorder.start():
+            return None
+        if self.mode == 'cprofile':
+            with self._lock:
+                self._profiles.append(recorder.profile)
+        return recorder
+
+    def start(self) -> bool:
+        """Record the calling thread until stop(); False if another profiler is active."""
+        self._recorder = self._start_recorder()
+        return self._recorder is not None
+
+    def stop(self):
+        self._recorder.stop()
+        self.duration_s = time.perf_counter() - self._started
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Stop recording the calling thread for the block, e.g. while it awaits.
+
+        Around an await on the event loop, this keeps other requests'
+        coroutines out of the profile. The paused time is not charged to
+        any stack.
+        """
+        self._recorder.stop()
+        try:
+            yield
+        finally:
+            self._recorder.start()
+
+    def wrap(self, fn: Callable) -> Callable:
+        """`fn`, recording into this profile on whichever thread runs it.
+
+        If the thread cannot get a profiler of its own (cProfile on Python
+        3.12+ while the request's profiler is active, which already sees
+        every thread), `fn` runs unrecorded by the wrapper.
+        """
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            recorder = self._start_recorder()
+            if recorder is None:
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.stop()
+        return profiled
+
+    def write(self, path: Path) -> Path:
+        """Write to `path` plus .folded or .prof; returns the file written."""
+        if self.mode == 'cprofile':
+            path = path.with_name(path.name + '.prof')
+            stats = pstats.Stats(*self._profiles)
+            stats.dump_stats(str(path))
+            return path
+        path = path.with_name(path.name + '.folded')
+        with self._lock:
+            lines = [f"{stack} {max(1, round(seconds * 1e6))}\n" for stack, seconds in self.stacks.items()]
+        path.write_text(''.join(lines))
+        return path
+
+
+class RequestProfiler:
+    """Samples requests for profiling and rotates the profiles it writes.
+
+    Only `enabled` is read on the request path while profiling is off. One
+    request is profiled at a time; requests sampled meanwhile are skipped.
+    Profiles of requests faster than `min_ms` are dropped unwritten.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_DIR, sample_rate: float = 0.01, mode: str = 'stack',
+                 interval_ms: float = 0.1, min_ms: float = 0.0, max_files: int = 100,
+                 enabled: bool = False):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.min_ms = min_ms
+        self.stats = {'sampled': 0, 'skipped_busy': 0, 'unavailable': 0, 'dropped_fast': 0, 'written': 0}
+        self._active = False
+        self._seq = 0
+        self._lock = threading.Lock()
+        if enabled:
+            self.toggle()
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                  mode: Optional[str] = None, interval_ms: Optional[float] = None,
+                  min_ms: Optional[float] = None):
+        """Change any of the settings; None leaves one as it is."""
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        if sample_rate is not None and not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.sample_rate = self.sample_rate if sample_rate is None else sample_rate
+        self.mode = mode or self.mode
+        self.interval_ms = self.interval_ms if interval_ms is None else interval_ms
+        self.min_ms = self.min_ms if min_ms is None else min_ms
+        if enabled:
+            _private_dir(self.directory)
+        if enabled is not None:
+            self.enabled = enabled
+
+    def toggle(self):
+        try:
+            self.configure(enabled=not self.enabled)
+        except OSError as e:
+            print(f"Request profiling not enabled: {e}")
+            return
+        print(f"Request profiling {'on' if self.enabled else 'off'} "
+              f"({self.mode}, {self.sample_rate:.2%} of requests, writing to {self.directory})")
+
+    def start(self) -> Optional[RequestProfile]:
+        """A started profile for this request if it is sampled, else None.
+
+        Also None when another profiler (a debugger, coverage, cProfile run
+        by hand) holds the interpreter's profiling hook.
+        """
+        if random.random() >= self.sample_rate:
+            return None
+        if self._active:
+            self.stats['skipped_busy'] += 1
+            return None
+        profile = RequestProfile(self.mode, self.interval_ms / 1000.0)
+        if not profile.start():
+            self.stats['unavailable'] += 1
+            return None
+        self._active = True
+        self.stats['sampled'] += 1
+        return profile
+
+    def finish(self, profile: RequestProfile):
+        """Stop `profile`; call save() afterwards to write it."""
+        profile.stop()
+        self._active = False
+
+    def save(self, profile: RequestProfile) -> Optional[Path]:
+        """Write a finished profile and drop the oldest files beyond max_files."""
+        duration_ms = profile.duration_s * 1000.0
+        if duration_ms < self.min_ms:
+            self.stats['dropped_fast'] += 1
+            return None
+        with self._lock:
+            self._seq += 1
+            name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._seq:06d}-{profile.rows}rows-{duration_ms:.1f}ms"
+            path = profile.write(self.directory / name)
+            self.stats['written'] += 1
+            files = sorted(p for p in self.directory.iterdir() if p.suffix in ('.folded', '.prof'))
+            for old in files[:max(0, len(files) - self.max_files)]:
+                old.unlink(missing_ok=True)
+        return path
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'mode': self.mode,
+            'sample_rate': self.sample_rate,
+            'interval_ms': self.interval_ms,
+            'min_ms': self.min_ms,
+            'directory': str(self.directory),
+            'max_files': self.max_files,
+            **self.stats,
+        }
@@ -0,0 +1,636 @@
+#!/usr/bin/env python3
+"""
+Pickle-free runtime artifacts for the Tourist Safety models.
+`export_runtime_artifacts` writes what inference needs as plain files:
+the LightGBM model text, its trees as flat node arrays for the compiled
+predictor, the frozen encoder tables and the anomaly detector's scaler,
+One-Class SVM and Isolation Forest as flat .npy arrays. Loading needs only
+numpy and lightgbm (plus a C compiler for the compiled predictor); large
+arrays are memory-mapped so worker processes share their pages.
+"""
+
+import ctypes
+import functools
+import hashlib
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sysconfig
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+
+
+RUNTIME_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+
+
+def safety_scores(predictions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Clip raw model output to a 0-100 score and derive its confidence."""
+    # Calculate confidence based on prediction variance
+    # This is a simple heuristic - in practice you might use prediction intervals
+    confidence = np.clip(100 - np.abs(predictions - 50), 20, 95) / 100
+    return np.clip(predictions, 0, 100), confidence
+
+
+class SafetyFeatureEncoder:
+    """Inference-only feature encoder frozen from a trained SafetyScoreModel.
+
+    Maps raw columns (a DataFrame or a dict of arrays) to the contiguous
+    float32 matrix LightGBM sees, in the fixed ``feature_names`` order.
+    Equivalent to ``prepare_features(df, fit_encoders=False)`` without the
+    DataFrame copy or per-row category mapping.
+    """
+
+    def __init__(self, feature_names: List[str], categories: Dict[str, np.ndarray]):
+        self.feature_names = list(feature_names)
+        # Sorted category labels per categorical column (LabelEncoder.classes_);
+        # a label's code is its position, unseen labels fall back to code 0.
+        self.categories = {col: np.asarray(classes).astype(str) for col, classes in categories.items()}
+        self._columns = []
+        for name in self.feature_names:
+            base = name[:-len('_encoded')] if name.endswith('_encoded') else None
+            if base in self.categories:
+                self._columns.append((base, self.categories[base]))
+            else:
+                self._columns.append((name, None))
+
+    @classmethod
+    def from_model(cls, model: 'SafetyScoreModel') -> 'SafetyFeatureEncoder':
+        return cls(model.feature_names,
+                   {col: enc.classes_ for col, enc in model.label_encoders.items()})
+
+    @staticmethod
+    def _lookup_codes(values, classes: np.ndarray) -> np.ndarray:
+        values = np.asarray(values).astype(str)
+        pos = np.searchsorted(classes, values)
+        np.minimum(pos, len(classes) - 1, out=pos)
+        return np.where(classes[pos] == values, pos, 0)
+
+    def transform(self, columns) -> np.ndarray:
+        """Encode raw columns into a C-contiguous (n, n_features) float32 matrix."""
+        if hasattr(columns, 'shape'):  # DataFrame
+            n = columns.shape[0]
+        else:
+            n = next((len(columns[name]) for name, _ in self._columns if name in columns), 0)
+        X = np.empty((n, len(self._columns)), dtype=np.float32)
+        for j, (name, classes) in enumerate(self._columns):
+            if name not in columns:
+                X[:, j] = 0.0
+            elif classes is None:
+                X[:, j] = columns[name]
+            else:
+                X[:, j] = self._lookup_codes(columns[name], classes)
+        # Handle missing values
+        np.copyto(X, 0.0, where=np.isnan(X))
+        return X
+
+
+# Walks CompiledTrees' node arrays. The decisions are LightGBM's
+# Tree::NumericalDecision/CategoricalDecision on the float32 input widened to
+# double, and leaf values are summed tree by tree in double as
+# Booster.predict does, so the scores are bit-identical. Compile without
+# -ffast-math.
+_TREE_KERNEL_SOURCE = r"""
+#include <math.h>
+#include <stdint.h>
+
+#define MISSING_ZERO 1
+#define MISSING_NAN 2
+#define DEFAULT_LEFT 4
+#define CATEGORICAL 8
+
+static const double kZeroThreshold = 1e-35f;
+
+void predict_trees(const float *X, int64_t n_rows, int64_t n_features,
+                   const int32_t *feature, const double *threshold, const int32_t *left,
+                   const int32_t *right, const uint8_t *flags, const int32_t *cat_start,
+                   const int32_t *cat_words, const uint32_t *cat_bits, const double *value,
+                   const int32_t *roots, int64_t n_trees, double *out)
+{
+    for (int64_t i = 0; i < n_rows; i++) {
+        const float *x = X + i * n_features;
+        double total = 0.0;
+        for (int64_t t = 0; t < n_trees; t++) {
+            int32_t node = roots[t];
+            while (left[node] >= 0) {
+                double fval = (double)x[feature[node]];
+                uint8_t f = flags[node];
+                int go_left;
+                if (f & CATEGORICAL) {
+                    if (isnan(fval) || fval >= 2147483647.0 || (int)fval < 0) {
+                        go_left = 0;
+                    } else {
+                        int32_t code = (int32_t)fval;
+                        go_left = (code >> 5) < cat_words[node]
+                                  && ((cat_bits[cat_start[node] + (code >> 5)] >> (code & 31)) & 1);
+                    }
+                } else {
+                    if (isnan(fval) && !(f & MISSING_NAN))
+                        fval = 0.0;
+                    if (((f & MISSING_ZERO) && fval >= -kZeroThreshold && fval <= kZeroThreshold)
+                        || ((f & MISSING_NAN) && isnan(fval)))
+                        go_left = (f & DEFAULT_LEFT) != 0;
+                    else
+                        go_left = fval <= threshold[node];
+                }
+                node = go_left ? left[node] : right[node];
+            }
+            total += value[node];
+        }
+        out[i] = total;
+    }
+}
+"""
+
+_TREE_ARRAYS = (('feature', np.int32), ('threshold', np.float64), ('left', np.int32),
+                ('right', np.int32), ('flags', np.uint8), ('cat_start', np.int32),
+                ('cat_words', np.int32), ('cat_bits', np.uint32), ('value', np.float64),
+                ('roots', np.int32))
+_MISSING_ZERO, _MISSING_NAN, _DEFAULT_LEFT, _CATEGORICAL = 1, 2, 4, 8
+# Objectives whose Booster.predict output is the raw sum of the trees
+_RAW_OUTPUT_OBJECTIVES = {'regression', 'regression_l1', 'huber', 'fair', 'quantile', 'mape'}
+
+
+def _kernel_cache_dir() -> Path:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(os.environ.get('ML_KERNEL_CACHE') or Path(cache_home) / 'tourist-safety' / 'kernels')
+
+
+def _is_private(path: Path) -> bool:
+    """Whether `path` (not a symlink) belongs to this user and no one else can write to it."""
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode):
+        return False
+    if not hasattr(os, 'getuid'):  # Windows: no uid or mode bits to check
+        return True
+    return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _compile_kernel(compiler: str, cache_dir: Path, library: Path) -> Optional[str]:
+    # Source and output are private temp files; the output is renamed into
+    # place so concurrent workers never load half a file. Returns compiler errors.
+    fd, source = tempfile.mkstemp(suffix='.c', dir=cache_dir)
+    with os.fdopen(fd, 'w') as f:
+        f.write(_TREE_KERNEL_SOURCE)
+    fd, partial = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+    os.close(fd)
+    try:
+        result = subprocess.run([compiler, '-O2', '-fPIC', '-shared', source, '-o', partial, '-lm'],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            return result.stderr
+        os.chmod(partial, 0o700)
+        os.replace(partial, library)
+        return None
+    finally:
+        for path in (source, partial):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+@functools.lru_cache(maxsize=None)
+def _tree_kernel():
+    """The compiled predict_trees function, built once per machine; None without a C compiler.
+
+    The library is only loaded from a cache directory owned by this user
+    that no one else can write to, and only if it is owned and protected
+    the same way.
+    """
+    digest = hashlib.blake2b(_TREE_KERNEL_SOURCE.encode(), digest_size=8).hexdigest()
+    cache_dir = _kernel_cache_dir()
+    library = cache_dir / f"trees_{digest}_{platform.machine()}{sysconfig.get_config_var('SHLIB_SUFFIX') or '.so'}"
+    try:
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not _is_private(cache_dir):
+            print(f"Kernel cache {cache_dir} is writable by other users; safety scores use Booster.predict")
+            return None
+        if not library.exists():
+            compiler = os.environ.get('CC') or shutil.which('cc') or shutil.which('gcc')
+            if compiler is None:
+                print("No C compiler found; safety scores use Booster.predict")
+                return None
+            errors = _compile_kernel(compiler, cache_dir, library)
+            if errors is not None:
+                print(f"Tree kernel did not compile; safety scores use Booster.predict:\n{errors}")
+                return None
+        if not _is_private(library):
+            print(f"{library} is not owned by this user or is writable by others; safety scores use Booster.predict")
+            return None
+    except OSError as e:
+        print(f"Tree kernel cache unavailable ({e}); safety scores use Booster.predict")
+        return None
+    fn = ctypes.CDLL(str(library)).predict_trees
+    fn.argtypes = [ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64] + [ctypes.c_void_p] * 10 + \
+                  [ctypes.c_int64, ctypes.c_void_p]
+    fn.restype = None
+    return fn
+
+
+def _flatten_booster(booster: lgb.Booster) -> Dict[str, np.ndarray]:
+    """Node arrays of every tree Booster.predict uses; children are node ids, -1 for leaves."""
+    dump = booster.dump_model()
+    objective = (dump.get('objective') or '').split(' ')[0]
+    if objective not in _RAW_OUTPUT_OBJECTIVES or dump.get('average_output'):
+        raise ValueError(f"Only raw-output regression boosters compile, not {objective!r}")
+    cols = {name: [] for name, _ in _TREE_ARRAYS if name not in ('cat_bits', 'roots')}
+    cat_bits, roots = [], []
+
+    def add(node) -> int:
+        i = len(cols['feature'])
+        for values in cols.values():
+            values.append(0)
+        if 'split_index' not in node:
+            cols['left'][i] = cols['right'][i] = -1
+            cols['value'][i] = node['leaf_value']
+            return i
+        flags = ({'Zero': _MISSING_ZERO, 'NaN': _MISSING_NAN}.get(node['missing_type'], 0)
+                 | (_DEFAULT_LEFT if node['default_left'] else 0))
+        cols['feature'][i] = node['split_feature']
+        if node['decision_type'] == '==':
+            flags |= _CATEGORICAL
+            codes = [int(c) for c in str(node['threshold']).split('||')]
+            words = np.zeros(max(codes) // 32 + 1, dtype=np.uint32)
+            for code in codes:
+                words[code // 32] |= np.uint32(1 << (code % 32))
+            cols['cat_start'][i], cols['cat_words'][i] = sum(len(w) for w in cat_bits), len(words)
+            cat_bits.append(words)
+        else:
+            cols['threshold'][i] = node['threshold']
+        cols['flags'][i] = flags
+        cols['left'][i] = add(node['left_child'])
+        cols['right'][i] = add(node['right_child'])
+        return i
+
+    for tree in dump['tree_info']:
+        roots.append(add(tree['tree_structure']))
+    arrays = {name: np.asarray(cols[name], dtype=dtype) for name, dtype in _TREE_ARRAYS if name in cols}
+    arrays['cat_bits'] = np.concatenate(cat_bits) if cat_bits else np.zeros(1, dtype=np.uint32)
+    arrays['roots'] = np.asarray(roots, dtype=np.int32)
+    return arrays
+
+
+class CompiledTrees:
+    """A LightGBM booster flattened to node arrays and walked by a small C kernel.
+
+    Scores are bit-identical to Booster.predict on the same float32 matrix,
+    without its per-call overhead, so small batches (one /predict tick) are
+    several times faster. The kernel does not depend on the model: it is
+    compiled once per machine into ML_KERNEL_CACHE and only the arrays are
+    saved with the model. Without a C compiler `available` is False and
+    callers keep using the booster.
+    """
+
+    # Larger batches go to Booster.predict, which spreads rows over threads
+    max_rows = 256
+
+    def __init__(self, arrays: Dict[str, np.ndarray], n_features: int):
+        self.arrays = {name: np.ascontiguousarray(arrays[name], dtype=dtype) for name, dtype in _TREE_ARRAYS}
+        self.n_features = n_features
+        self._bind()
+
+    @classmethod
+    def from_booster(cls, booster: lgb.Booster) -> 'CompiledTrees':
+        return cls(_flatten_booster(booster), booster.num_feature())
+
+    def _bind(self):
+        self._kernel = _tree_kernel()
+        self._pointers = [self.arrays[name].ctypes.data for name, _ in _TREE_ARRAYS]
+
+    @property
+    def available(self) -> bool:
+        return self._kernel is not None
+
+    def __getstate__(self):
+        return {'arrays': self.arrays, 'n_features': self.n_features}
+
+    def __setstate__(self, state):
+        self.arrays, self.n_features = state['arrays'], state['n_features']
+        self._bind()
+
+    def predict(self, X) -> np.ndarray:
+        """Raw scores for a (n, n_features) matrix, as Booster.predict returns them."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got shape {X.shape}")
+        out = np.empty(len(X))
+        *nodes, roots = self._pointers
+        self._kernel(X.ctypes.data, len(X), self.n_features, *nodes, roots, len(self.arrays['roots']),
+                     out.ctypes.data)
+        return out
+
+
+def predict_raw(booster: lgb.Booster, trees: Optional[CompiledTrees], X: np.ndarray) -> np.ndarray:
+    """Booster output for X, from the compiled trees for batches up to their max_rows."""
+    if trees is not None and trees.available and len(X) <= trees.max_rows:
+        return trees.predict(X)
+    return booster.predict(X)
+
+
+class SafetyExplainer:
+    """Per-feature attributions of the safety model's raw output, for whole batches.
+
+    Attributions are path-dependent TreeSHAP values: each row's values plus
+    its base value sum to the raw prediction. The shap TreeExplainer is built
+    once (on first use or by warm()) and reused; `fast=True` reads the same
+    values from LightGBM's native pred_contrib without shap.
+    """
+
+    def __init__(self, booster: lgb.Booster, feature_names: List[str]):
+        self.booster = booster
+        self.feature_names = list(feature_names)
+        self._tree_explainer = None
+
+    def warm(self):
+        """Import shap and build the TreeExplainer now rather than on the first request."""
+        if self._tree_explainer is None:
+            import shap
+            self._tree_explainer = shap.TreeExplainer(self.booster)
+        return self._tree_explainer
+
+    def explain(self, X: np.ndarray, fast: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """(attributions (n, n_features), base values (n,)) for the encoded rows X."""
+        if fast:
+            contrib = self.booster.predict(X, pred_contrib=True)
+            return contrib[:, :-1], contrib[:, -1]
+        explainer = self.warm()
+        values = np.asarray(explainer.shap_values(X)).reshape(len(X), -1)
+        return values, np.full(len(X), float(np.ravel(explainer.expected_value)[0]))
+
+
+class RuntimeSafetyModel:
+    """Safety score model loaded from runtime artifacts (no pickle, no sklearn objects)."""
+
+    def __init__(self, booster: lgb.Booster, encoder: SafetyFeatureEncoder,
+                 trees: Optional[CompiledTrees] = None):
+        self.model = booster
+        self.encoder = encoder
+        self.trees = trees
+        self.feature_names = encoder.feature_names
+
+    def encode(self, columns) -> np.ndarray:
+        return self.encoder.transform(columns)
+
+    def predict(self, df) -> Tuple[np.ndarray, np.ndarray]:
+        """Predict safety scores with confidence (same contract as SafetyScoreModel.predict)."""
+        return safety_scores(predict_raw(self.model, self.trees, self.encode(df)))
+
+
+class ArrayStandardScaler:
+    """StandardScaler.transform from its mean/scale arrays."""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X) -> np.ndarray:
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+
+class ArrayOneClassSVM:
+    """RBF One-Class SVM decision function from support vectors and dual coefficients."""
+
+    # Rows per kernel block; a 256 x n_support block stays cache-resident
+    _CHUNK = 256
+
+    def __init__(self, support_vectors: np.ndarray, dual_coef: np.ndarray, intercept: float, gamma: float):
+        self.support_vectors_ = support_vectors
+        self.dual_coef_ = dual_coef
+        self.intercept_ = intercept
+        self.gamma = gamma
+        self._sv_sq = np.einsum('ij,ij->i', support_vectors, support_vectors)
+
+    def decision_function(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        out = np.empty(len(X))
+        for start in range(0, len(X), self._CHUNK):
+            x = X[start:start + self._CHUNK]
+            # -gamma * ||x - sv||^2, built in place in the x @ sv.T buffer
+            kernel = x @ self.support_vectors_.T
+            kernel *= 2.0 * self.gamma
+            kernel -= self.gamma * np.einsum('ij,ij->i', x, x)[:, None]
+            kernel -= self.gamma * self._sv_sq[None, :]
+            np.minimum(kernel, 0.0, out=kernel)
+            np.exp(kernel, out=kernel)
+            out[start:start + self._CHUNK] = kernel @ self.dual_coef_ + self.intercept_
+        return out
+
+    def predict(self, X) -> np.ndarray:
+        return np.where(self.decision_function(X) > 0, 1, -1)
+
+
+class ArrayIsolationForest:
+    """Isolation Forest scoring over concatenated, flattened tree arrays.
+
+    ``node_term`` holds, per node, the path length a sample ending there
+    contributes (depth + average path length of the unbuilt subtree - 1).
+    """
+
+    def __init__(self, children_left: np.ndarray, children_right: np.ndarray, feature: np.ndarray,
+                 threshold: np.ndarray, node_term: np.ndarray, roots: np.ndarray,
+                 denominator: float, offset: float):
+        self.children_left = children_left
+        self.children_right = children_right
+        self.feature = feature
+        self.threshold = threshold
+        self.node_term = node_term
+        self.roots = roots
+        self.denominator = denominator
+        self.offset_ = offset
+
+    def score_samples(self, X) -> np.ndarray:
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        while True:
+            left = self.children_left[node]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(internal, np.where(go_left, left, self.children_right[node]), node)
+        depths = self.node_term[node].sum(axis=1)
+        return -(2 ** (-depths / self.denominator))
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X) -> np.ndarray:
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Average path length of an unsuccessful BST search over n samples (as in sklearn)."""
+    n = np.asarray(n_samples, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+
+def _flatten_isolation_forest(forest) -> Dict[str, np.ndarray]:
+    arrays = {k: [] for k in ('children_left', 'children_right', 'feature', 'threshold', 'node_term')}
+    roots, offset = [], 0
+    for estimator, features in zip(forest.estimators_, forest.estimators_features_):
+        tree = estimator.tree_
+        left, right = tree.children_left, tree.children_right
+        depth = np.zeros(tree.node_count, dtype=np.float64)
+        depth[0] = 1.0
+        for node in range(tree.node_count):  # children always follow their parent
+            if left[node] != -1:
+                depth[left[node]] = depth[right[node]] = depth[node] + 1.0
+        is_leaf = left == -1
+        arrays['children_left'].append(np.where(is_leaf, -1, left + offset))
+        arrays['children_right'].append(np.where(is_leaf, -1, right + offset))
+        arrays['feature'].append(np.where(is_leaf, 0, np.asarray(features)[np.maximum(tree.feature, 0)]))
+        arrays['threshold'].append(tree.threshold)
+        arrays['node_term'].append(depth + _average_path_length(tree.n_node_samples) - 1.0)
+        roots.append(offset)
+        offset += tree.node_count
+    flat = {k: np.concatenate(v) for k, v in arrays.items()}
+    flat['children_left'] = flat['children_left'].astype(np.int64)
+    flat['children_right'] = flat['children_right'].astype(np.int64)
+    flat['feature'] = flat['feature'].astype(np.int64)
+    flat['roots'] = np.asarray(roots, dtype=np.int64)
+    return flat
+
+
+def _save_arrays(out_dir: Path, prefix: str, arrays: Dict[str, np.ndarray]) -> Dict[str, str]:
+    files = {}
+    for name, array in arrays.items():
+        filename = f"{prefix}_{name}.npy"
+        np.save(out_dir / filename, np.ascontiguousarray(array))
+        files[name] = filename
+    return files
+
+
+def _load_arrays(runtime_dir: Path, files: Dict[str, str], mmap: bool = True) -> Dict[str, np.ndarray]:
+    return {name: np.load(runtime_dir / filename, mmap_mode='r' if mmap else None)
+            for name, filename in files.items()}
+
+
+def export_runtime_artifacts(safety_model, anomaly_model, out_dir) -> Path:
+    """Write pickle-free inference artifacts for trained models; returns the manifest path."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    booster_file = 'safety_booster.txt'
+    safety_model.model.save_model(str(out_dir / booster_file))
+    encoder = getattr(safety_model, 'encoder', None) or SafetyFeatureEncoder.from_model(safety_model)
+    trees = getattr(safety_model, 'trees', None)
+    if trees is None:
+        try:
+            trees = CompiledTrees.from_booster(safety_model.model)
+        except ValueError as e:
+            print(f"Safety model trees not compiled: {e}")
+    manifest: Dict[str, Any] = {
+        'format': RUNTIME_FORMAT,
+        'created_at': datetime.now().isoformat(),
+        'lightgbm_version': lgb.__version__,
+        'safety': {
+            'booster': booster_file,
+            'feature_names': encoder.feature_names,
+            'categories': {col: classes.tolist() for col, classes in encoder.categories.items()},
+        },
+    }
+    if trees is not None:
+        manifest['safety']['trees'] = {
+            'arrays': _save_arrays(out_dir, 'trees', trees.arrays),
+            'n_features': trees.n_features,
+        }
+
+    if anomaly_model is not None:
+        svm = anomaly_model.one_class_svm
+        forest = anomaly_model.isolation_forest
+        manifest['anomaly'] = {
+            'feature_names': anomaly_model.feature_names,
+            'thresholds': anomaly_model.thresholds,
+            'scaler': _save_arrays(out_dir, 'scaler', {
+                'mean': anomaly_model.scaler.mean_, 'scale': anomaly_model.scaler.scale_}),
+            'one_class_svm': {
+                'arrays': _save_arrays(out_dir, 'svm', {
+                    'support_vectors': svm.support_vectors_, 'dual_coef': svm.dual_coef_.ravel()}),
+                'intercept': float(svm.intercept_[0]),
+                'gamma': float(svm._gamma),
+            },
+            'isolation_forest': {
+                'arrays': _save_arrays(out_dir, 'iforest', _flatten_isolation_forest(forest)),
+                'denominator': float(len(forest.estimators_) * _average_path_length([forest.max_samples_])[0]),
+                'offset': float(forest.offset_),
+            },
+        }
+
+    manifest_path = out_dir / MANIFEST_FILE
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+
+def read_manifest(runtime_dir) -> Dict[str, Any]:
+    with open(Path(runtime_dir) / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != RUNTIME_FORMAT:
+        raise ValueError(f"Unsupported runtime artifact format: {manifest.get('format')}")
+    return manifest
+
+
+def load_safety_model(runtime_dir, mmap: bool = True) -> RuntimeSafetyModel:
+    runtime_dir = Path(runtime_dir)
+    spec = read_manifest(runtime_dir)['safety']
+    booster = lgb.Booster(model_file=str(runtime_dir / spec['booster']))
+    encoder = SafetyFeatureEncoder(spec['feature_names'],
+                                   {col: np.asarray(classes) for col, classes in spec['categories'].items()})
+    trees = None
+    if 'trees' in spec:
+        trees = CompiledTrees(_load_arrays(runtime_dir, spec['trees']['arrays'], mmap), spec['trees']['n_features'])
+    return RuntimeSafetyModel(booster, encoder, trees)
+
+
+def load_anomaly_model(runtime_dir, mmap: bool = True):
+    """AnomalyDetectionModel whose estimators are backed by (memory-mapped) arrays."""
+    from model_training import AnomalyDetectionModel
+
+    runtime_dir = Path(runtime_dir)
+    spec = read_manifest(runtime_dir)['anomaly']
+    model = AnomalyDetectionModel()
+    model.feature_names = spec['feature_names']
+    model.thresholds = spec['thresholds']
+    scaler = _load_arrays(runtime_dir, spec['scaler'], mmap)
+    model.scaler = ArrayStandardScaler(scaler['mean'], scaler['scale'])
+    svm = spec['one_class_svm']
+    svm_arrays = _load_arrays(runtime_dir, svm['arrays'], mmap)
+    model.one_class_svm = ArrayOneClassSVM(svm_arrays['support_vectors'], svm_arrays['dual_coef'],
+                                           svm['intercept'], svm['gamma'])
+    forest = spec['isolation_forest']
+    model.isolation_forest = ArrayIsolationForest(**_load_arrays(runtime_dir, forest['arrays'], mmap),
+                                                  denominator=forest['denominator'], offset=forest['offset'])
+    return model
+
+
+if __name__ == "__main__":
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export pickle-free runtime artifacts from saved models")
+    parser.add_argument("--models-dir", type=str, default="models",
+                       help="Directory containing the joblib models")
+
+    args = parser.parse_args()
+
+    models_dir = Path(args.models_dir)
+    safety = joblib.load(models_dir / 'safety_score_model.joblib')
+    anomaly = joblib.load(models_dir / 'anomaly_detection_model.joblib')
+    path = export_runtime_artifacts(safety, anomaly, models_dir / 'runtime')
+    print(f"Runtime artifacts written to {path.parent}/")
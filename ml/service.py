@@ -1,30 +1,109 @@
 #!/usr/bin/env python3
 """
 FastAPI inference service for Tourist Safety models.
-Loads trained models from ml/models; if missing, will attempt to train using ml/data.
+Loads trained models from ml/models; if missing, trains them from ml/data in a
+background process and serves rules-only scores until they are ready.
 Exposes:
 - GET /health
 - POST /predict  (single or batch)
+- POST /predict/stream  (NDJSON in, NDJSON out)
+- POST /explain  (per-feature attributions of the safety score)
+- PUT /tourists/{tourist_id}/itinerary
+- GET /metrics  (Prometheus text format)
+- GET/PUT /admin/profiling  (opt-in /predict profiler)
 """
 
+import asyncio
+import contextvars
+import hashlib
+import hmac
 import os
 import json
+import multiprocessing
+import queue
+import signal
+import threading
+import time
 from pathlib import Path
-from typing import List, Optional, Any, Dict
-
-import pandas as pd
-import joblib
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-
-from model_training import ModelTrainingPipeline
+from typing import List, Literal, Optional, Any, Dict
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from starlette.background import BackgroundTask
+from starlette.requests import ClientDisconnect
+
+from batching import MicroBatcher
+from inference_pool import InferencePool, QueueFullError
+from metrics import ROW_BUCKETS, Registry
+from prediction_cache import DEFAULT_RESOLUTIONS, PredictionCache
+from profiling import DEFAULT_DIR as DEFAULT_PROFILE_DIR, RequestProfiler
+from runtime import (MANIFEST_FILE, SafetyExplainer, load_anomaly_model, load_safety_model, predict_raw,
+                     safety_scores)
+from tourist_state import TickFeatureState
+from zones import ZONE_BITS, ZoneCatalog, ZoneIndex
 
 
 MODELS_DIR = Path(__file__).parent / "models"
 DATA_DIR = Path(__file__).parent / "data"
 
+# Missing models are trained in a background process; /predict serves
+# rules-only scores until they are ready
+TRAIN_IF_MISSING = os.getenv("ML_TRAIN_IF_MISSING", "1") == "1"
+TRAIN_NUM_TOURISTS = int(os.getenv("ML_TRAIN_NUM_TOURISTS", "1000"))
+
+# Opt-in micro-batching: coalesce concurrent /predict calls into one model call
+MICROBATCH_ENABLED = os.getenv("ML_MICROBATCH", "0") == "1"
+MICROBATCH_MAX_ROWS = int(os.getenv("ML_MICROBATCH_MAX_ROWS", "256"))
+MICROBATCH_MAX_DELAY_MS = float(os.getenv("ML_MICROBATCH_MAX_DELAY_MS", "5"))
+
+# Opt-in cache of safety scores keyed on quantized feature rows; resolutions
+# is a JSON object of column -> step merged over prediction_cache.DEFAULT_RESOLUTIONS
+PREDICT_CACHE_ENABLED = os.getenv("ML_PREDICT_CACHE", "0") == "1"
+PREDICT_CACHE_MAX_MB = float(os.getenv("ML_PREDICT_CACHE_MAX_MB", "64"))
+PREDICT_CACHE_TTL_S = float(os.getenv("ML_PREDICT_CACHE_TTL", "300"))
+PREDICT_CACHE_RESOLUTIONS = {**DEFAULT_RESOLUTIONS, **json.loads(os.getenv("ML_PREDICT_CACHE_RESOLUTIONS", "{}"))}
+
+# Bounded pool for model calls (thread | process); a full queue answers 503
+INFERENCE_EXECUTOR = os.getenv("ML_INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("ML_INFERENCE_WORKERS", "0")) or None
+INFERENCE_MAX_QUEUE = int(os.getenv("ML_INFERENCE_MAX_QUEUE", "64"))
+INFERENCE_RETRY_AFTER_S = int(os.getenv("ML_INFERENCE_RETRY_AFTER", "1"))
+
+# Derive missing movement features from each tourist's previous ticks
+TICK_STATE_ENABLED = os.getenv("ML_TICK_STATE", "1") == "1"
+TICK_STATE_MAX_TOURISTS = int(os.getenv("ML_TICK_STATE_MAX_TOURISTS", "100000"))
+
+# /predict/stream scores at most this many ticks per model call; a full
+# inference queue pauses reading the upload for STREAM_BACKOFF_S
+STREAM_CHUNK_ROWS = int(os.getenv("ML_STREAM_CHUNK_ROWS", "512"))
+STREAM_BACKOFF_S = 0.01
+
+# Build the /explain SHAP explainer in the background once the models load
+# (imports shap); otherwise it is built on the first /explain call
+EXPLAIN_WARM = os.getenv("ML_EXPLAIN_WARM", "1") == "1"
+
+# Opt-in /predict profiling (see profiling.py); off unless ML_PROFILE=1, and
+# toggled at runtime through PUT /admin/profiling or SIGUSR2
+PROFILE_ENABLED = os.getenv("ML_PROFILE", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("ML_PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_MODE = os.getenv("ML_PROFILE_MODE", "stack")
+PROFILE_INTERVAL_MS = float(os.getenv("ML_PROFILE_INTERVAL_MS", "0.1"))
+PROFILE_MIN_MS = float(os.getenv("ML_PROFILE_MIN_MS", "0"))
+PROFILE_DIR = Path(os.getenv("ML_PROFILE_DIR", str(DEFAULT_PROFILE_DIR)))
+PROFILE_MAX_FILES = int(os.getenv("ML_PROFILE_MAX_FILES", "100"))
+# Bearer token required by the /admin endpoints when set
+ADMIN_TOKEN = os.getenv("ML_ADMIN_TOKEN", "")
+
 # --- Simple Geofencing & Area Risk Configuration ---
-# Replace these with real polygons/tiles as data becomes available.
+# Zones load from ML_ZONES_FILE (GeoJSON, see zones.py) when it exists and
+# are reloaded in the background when it changes; these example polygons
+# are the fallback.
+ZONES_FILE = Path(os.getenv("ML_ZONES_FILE", str(DATA_DIR / "zones.geojson")))
+ZONES_RELOAD_INTERVAL_S = float(os.getenv("ML_ZONES_RELOAD_INTERVAL", "5"))
+
 RESTRICTED_ZONES = [
     # Example square near lat 28.62, lng 77.20
     [(28.620, 77.195), (28.620, 77.205), (28.630, 77.205), (28.630, 77.195)],
@@ -35,32 +114,21 @@ HIGH_RISK_AREAS = [
     [(28.500, 77.100), (28.500, 77.300), (28.700, 77.300), (28.700, 77.100)],
 ]
 
-def _point_in_polygon(lat: float, lng: float, polygon: list) -> bool:
-    # Ray casting algorithm for point-in-polygon
-    inside = False
-    n = len(polygon)
-    if n < 3:
-        return False
-    for i in range(n):
-        lat_i, lng_i = polygon[i]
-        lat_j, lng_j = polygon[(i + 1) % n]
-        intersect = ((lng_i > lng) != (lng_j > lng)) and (
-            lat < (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i + 1e-9) + lat_i
-        )
-        if intersect:
-            inside = not inside
-    return inside
+tick_state = TickFeatureState(max_tourists=TICK_STATE_MAX_TOURISTS)
+
+zone_catalog = ZoneCatalog(ZONES_FILE, fallback=ZoneIndex.from_polygons(RESTRICTED_ZONES, HIGH_RISK_AREAS))
+
 
-def _compute_area_flags(lat: float, lng: float) -> dict:
-    in_restricted = any(_point_in_polygon(lat, lng, poly) for poly in RESTRICTED_ZONES)
-    in_high_risk = any(_point_in_polygon(lat, lng, poly) for poly in HIGH_RISK_AREAS)
+def _compute_area_flags_batch(lats: np.ndarray, lngs: np.ndarray):
+    """Vectorized area flags: (area_risk_score, is_in_restricted_zone) arrays."""
+    kinds = zone_catalog.index.query(lats, lngs)
+    in_restricted = (kinds & ZONE_BITS['restricted']) != 0
+    in_high_risk = (kinds & ZONE_BITS['high_risk']) != 0
     # Risk baseline + bump if inside high-risk area; clamp to [0,1]
     base = 0.2
-    risk = base + (0.5 if in_high_risk else 0.0) + (0.3 if in_restricted else 0.0)
-    return {
-        'is_in_restricted_zone': in_restricted,
-        'area_risk_score': float(max(0.0, min(1.0, risk)))
-    }
+    risk = base + np.where(in_high_risk, 0.5, 0.0) + np.where(in_restricted, 0.3, 0.0)
+    return np.clip(risk, 0.0, 1.0), in_restricted
+
 
 def _infer_time_of_day_bucket(ts: str) -> str:
     try:
@@ -88,11 +156,12 @@ class LocationTick(BaseModel):
     provider: Optional[str] = "gps"
     battery_pct: Optional[int] = 100
     device_status: Optional[str] = "active"
-    # Precomputed features if available; otherwise defaults
+    # Precomputed features if available; otherwise defaults. Movement features
+    # left out are derived from the tourist's previous ticks (see tourist_state.py)
     time_of_day_bucket: Optional[str] = None
-    distance_from_itinerary: Optional[float] = 0.0
-    time_since_last_fix: Optional[float] = 0.0
-    avg_speed_last_15min: Optional[float] = 0.0
+    distance_from_itinerary: Optional[float] = None
+    time_since_last_fix: Optional[float] = None
+    avg_speed_last_15min: Optional[float] = None
     area_risk_score: Optional[float] = 0.3
     prior_incidents_count: Optional[int] = 0
     days_into_trip: Optional[int] = 0
@@ -107,135 +176,805 @@ class PredictRequest(BaseModel):
     records: List[LocationTick] = Field(..., description="One or more location-feature records")
 
 
+class ExplainRequest(PredictRequest):
+    fast: bool = Field(False, description="Read attributions from LightGBM's pred_contrib instead of shap")
+
+
+class ProfilingRequest(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1, description="Fraction of /predict requests profiled")
+    mode: Optional[Literal['stack', 'cprofile']] = None
+    interval_ms: Optional[float] = Field(None, gt=0, description="Stack sampling interval")
+    min_ms: Optional[float] = Field(None, ge=0, description="Only write profiles of requests at least this slow")
+
+
+class Waypoint(BaseModel):
+    lat: float
+    lng: float
+
+
+class ItineraryRequest(BaseModel):
+    waypoints: List[Waypoint] = Field(..., description="Planned stops; an empty list removes the itinerary")
+
+
 app = FastAPI(title="Tourist Safety ML Service", version="1.0")
 
 
 class ModelBundle:
+    """Model artifacts plus a readiness state the service can report.
+
+    States: ``starting`` -> ``loading`` -> ``ready``, or via ``training`` when
+    no artifacts exist (and ``ML_TRAIN_IF_MISSING`` allows it); ``failed``
+    keeps the error. Training runs in a separate process so the serving
+    process only ever loads finished artifacts.
+    """
+
     def __init__(self):
         self.pipeline = None
-        self._load_or_train()
+        self.safety = None
+        self.explainer = None
+        self.model_version = None
+        self.artifact_format = None
+        self._anomaly = None
+        self.state = 'starting'
+        self.stage = None
+        self.error = None
+        self.started_at = time.time()
+        self.ready_at = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def anomaly(self):
+        # Not on the /predict path, so runtime artifacts load it on first use
+        if self._anomaly is None and self.artifact_format == 'runtime':
+            self._anomaly = load_anomaly_model(MODELS_DIR / 'runtime')
+        return self._anomaly
+
+    def start(self, train_if_missing: bool = TRAIN_IF_MISSING):
+        """Load (or train) in a background thread; poll `state` or `wait()`."""
+        self._thread = threading.Thread(target=self._load_or_train, args=(train_if_missing,),
+                                        name='model-loader', daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = self.ready_at or time.time()
+        return {
+            'state': self.state,
+            'stage': self.stage,
+            'error': self.error,
+            'format': self.artifact_format,
+            'model_version': self.model_version,
+            'elapsed_s': round(now - self.started_at, 1),
+        }
 
-    def _load_or_train(self):
+    def load_artifacts(self) -> bool:
+        """Load saved models if there are any; returns whether the bundle is ready."""
         MODELS_DIR.mkdir(exist_ok=True)
+        self.state = 'loading'
+
+        # Pickle-free runtime artifacts (see runtime.py) load fastest and share pages across workers
+        runtime_dir = MODELS_DIR / 'runtime'
+        if (runtime_dir / MANIFEST_FILE).exists():
+            try:
+                self.safety = load_safety_model(runtime_dir)
+                self._mark_ready('runtime')
+                return True
+            except Exception as e:
+                print(f"Runtime artifacts not loaded ({e}); trying joblib models")
 
         safety_path = MODELS_DIR / 'safety_score_model.joblib'
         anomaly_path = MODELS_DIR / 'anomaly_detection_model.joblib'
 
         if safety_path.exists() and anomaly_path.exists():
             try:
+                import joblib
                 self.safety = joblib.load(safety_path)
-                self.anomaly = joblib.load(anomaly_path)
-                return
+                self._anomaly = joblib.load(anomaly_path)
+                self._mark_ready('joblib')
+                return True
             except Exception:
                 pass
+        return False
 
-        # Train if models missing
-        if not (DATA_DIR / 'train.csv').exists():
-            print("Training data not found. Generating synthetic dataset...")
-            from data_generator import TouristDataGenerator
-            generator = TouristDataGenerator(seed=42)
-            generator.generate_dataset(num_tourists=1000, output_dir=str(DATA_DIR))
-
-        self.pipeline = ModelTrainingPipeline(data_dir=str(DATA_DIR), models_dir=str(MODELS_DIR))
-        self.pipeline.train_models()
-        self.pipeline.save_models()
-
-        self.safety = self.pipeline.safety_model
-        self.anomaly = self.pipeline.anomaly_model
+    def _mark_ready(self, artifact_format: str):
+        self.explainer = SafetyExplainer(self.safety.model, self.safety.feature_names)
+        # Content hash of the booster; cached predictions are only valid for it
+        self.model_version = hashlib.blake2b(self.safety.model.model_to_string().encode(),
+                                             digest_size=8).hexdigest()
+        self.artifact_format = artifact_format
+        self.state, self.stage = 'ready', None
+        self.ready_at = time.time()
+        self._ready.set()
+
+    def _load_or_train(self, train_if_missing: bool = TRAIN_IF_MISSING):
+        try:
+            if not self.load_artifacts():
+                if not train_if_missing:
+                    raise RuntimeError(f"No model artifacts in {MODELS_DIR}")
+                self.state = 'training'
+                self._train_in_subprocess()
+                if not self.load_artifacts():
+                    raise RuntimeError(f"Training finished but no artifacts found in {MODELS_DIR}")
+        except Exception as e:
+            self.state, self.error = 'failed', str(e)
+            print(f"Models not available, serving rules-only scores: {e}")
+            return
+        if EXPLAIN_WARM:
+            try:
+                self.explainer.warm()
+            except ImportError as e:
+                print(f"shap not available ({e}); /explain serves fast mode only")
+
+    def _train_in_subprocess(self):
+        # Train models if missing, away from the event loop and request threads
+        from model_training import train_and_save
+        ctx = multiprocessing.get_context('spawn')
+        progress = ctx.Queue()
+        proc = ctx.Process(target=train_and_save, name='model-training',
+                           args=(str(DATA_DIR), str(MODELS_DIR), TRAIN_NUM_TOURISTS, progress.put))
+        proc.start()
+        while proc.is_alive() or not progress.empty():
+            try:
+                self.stage = progress.get(timeout=1.0)
+            except queue.Empty:
+                pass
+        proc.join()
+        if proc.exitcode != 0:
+            raise RuntimeError(f"Training process exited with code {proc.exitcode}")
 
 
 bundle = None
+batcher = None
+inference_pool = None
+prediction_cache = PredictionCache(PREDICT_CACHE_RESOLUTIONS, int(PREDICT_CACHE_MAX_MB * (1 << 20)),
+                                   PREDICT_CACHE_TTL_S) if PREDICT_CACHE_ENABLED else None
+profiler = RequestProfiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_MODE, PROFILE_INTERVAL_MS, PROFILE_MIN_MS,
+                           PROFILE_MAX_FILES, enabled=PROFILE_ENABLED)
+# Profile of the /predict request being handled, if it was sampled
+_request_profile: contextvars.ContextVar = contextvars.ContextVar('request_profile', default=None)
+
+# Served by GET /metrics. Histogram children are bound once; each timed stage
+# costs one perf_counter() call and one observe() on the request path
+registry = Registry()
+_stage_seconds = registry.histogram(
+    'ml_stage_seconds', 'Time spent in each stage of a scoring request', labelnames=('stage',))
+STAGES = {name: _stage_seconds.labels(name) for name in (
+    'validate', 'enrich', 'cache_lookup', 'queue_wait', 'inference', 'encode', 'model', 'respond')}
+_request_seconds = registry.histogram(
+    'ml_request_seconds', 'Scoring request latency, from body received to response built', labelnames=('endpoint',))
+_batch_rows = registry.histogram(
+    'ml_batch_rows', 'Records per scoring request (per chunk for /predict/stream)', ROW_BUCKETS, ('endpoint',))
+_rows_total = registry.counter(
+    'ml_rows_total', 'Rows scored; rate() gives rows/s', ('endpoint', 'scorer', 'model_version'))
+
+
+# Encode and model are timed inside _score_columns, which the process executor
+# runs in worker processes the parent cannot read; their series are left out then
+_WORKER_STAGES = ('encode', 'model')
+
+
+def _bind_worker_stages(executor: str):
+    for name in _WORKER_STAGES:
+        if executor == "process":
+            _stage_seconds.remove(name)
+        else:
+            STAGES[name] = _stage_seconds.labels(name)
+
+
+def _observe_pool_call(fn, wait_s: float, run_s: float):
+    # /explain calls share the pool but are not part of the scoring stages
+    if getattr(fn, '__wrapped__', fn) is _score_columns:
+        STAGES['queue_wait'].observe(wait_s)
+        STAGES['inference'].observe(run_s)
+
+
+def _observe_scored(endpoint: str, started: float, rows: int, scorer: str):
+    _request_seconds.labels(endpoint).observe(time.perf_counter() - started)
+    _batch_rows.labels(endpoint).observe(rows)
+    version = bundle.model_version if scorer == 'model' else ''
+    _rows_total.labels(endpoint, scorer, version).inc(rows)
+
+
+def _collect_service_metrics():
+    ready = bundle is not None and bundle.ready
+    yield 'ml_models_ready', 'gauge', 'Whether the models are loaded', [({}, float(ready))]
+    if bundle is not None:
+        yield 'ml_model_info', 'gauge', 'Loaded model version and artifact format', [(
+            {'model_version': bundle.model_version or '', 'format': bundle.artifact_format or '',
+             'state': bundle.state}, 1.0)]
+    if inference_pool is not None:
+        pool = inference_pool
+        yield 'ml_inference_inflight', 'gauge', 'Inference calls running or queued', [({}, pool.inflight)]
+        yield 'ml_inference_queue_depth', 'gauge', 'Inference calls waiting for a worker', [({}, pool.queue_depth)]
+        yield 'ml_inference_completed_total', 'counter', 'Inference calls completed', [({}, pool.stats['completed'])]
+        yield 'ml_inference_rejected_total', 'counter', 'Inference calls rejected with a full queue', [
+            ({}, pool.stats['rejected'])]
+    if batcher is not None:
+        for key in ('requests', 'rows', 'batches', 'rejected'):
+            yield f'ml_microbatch_{key}_total', 'counter', f'Micro-batcher {key}', [({}, batcher.stats[key])]
+    if prediction_cache is not None:
+        stats = prediction_cache.snapshot()
+        for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+            yield f'ml_prediction_cache_{key}_total', 'counter', f'Prediction cache {key}', [({}, stats[key])]
+        yield 'ml_prediction_cache_entries', 'gauge', 'Prediction cache entries', [({}, stats['entries'])]
+        yield 'ml_prediction_cache_bytes', 'gauge', 'Approximate prediction cache size', [({}, stats['bytes'])]
+    if TICK_STATE_ENABLED:
+        yield 'ml_tourist_state_tourists', 'gauge', 'Tourists with tick state', [({}, len(tick_state))]
+
+
+registry.add_collector(_collect_service_metrics)
+
+
+def _init_inference_worker(models_dir: str, data_dir: str):
+    # Process-pool workers load their own copy of the artifacts the parent uses;
+    # if the parent is still training, _score_columns loads them on first use
+    global bundle, MODELS_DIR, DATA_DIR
+    MODELS_DIR, DATA_DIR = Path(models_dir), Path(data_dir)
+    if bundle is None:
+        bundle = ModelBundle()
+        bundle.load_artifacts()
+
+
+def _start_inference(executor: str = INFERENCE_EXECUTOR, workers: Optional[int] = INFERENCE_WORKERS,
+                     max_queue: int = INFERENCE_MAX_QUEUE, microbatch: bool = MICROBATCH_ENABLED):
+    global batcher, inference_pool
+    _bind_worker_stages(executor)
+    if executor == "process":
+        inference_pool = InferencePool(executor, workers, max_queue, initializer=_init_inference_worker,
+                                       initargs=(str(MODELS_DIR), str(DATA_DIR)), observer=_observe_pool_call)
+    else:
+        inference_pool = InferencePool(executor, workers, max_queue, observer=_observe_pool_call)
+    if microbatch:
+        # The batcher never has more pool calls in flight than workers, so it
+        # sheds load itself once max_queue requests wait for a flush
+        batcher = MicroBatcher(_score_columns, MICROBATCH_MAX_ROWS, MICROBATCH_MAX_DELAY_MS,
+                               runner=inference_pool.run, concurrency=inference_pool.workers,
+                               max_queue=max_queue)
+        batcher.start()
+
+
+async def _stop_inference():
+    global batcher, inference_pool
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
+    if inference_pool is not None:
+        inference_pool.shutdown()
+        inference_pool = None
 
 
 @app.on_event("startup")
-def _startup():
+async def _startup():
     global bundle
+    zone_catalog.reload()
+    zone_catalog.start_watching(ZONES_RELOAD_INTERVAL_S)
     bundle = ModelBundle()
+    bundle.start()
+    _start_inference()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, profiler.toggle)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        pass  # no SIGUSR2 (Windows) or not on the main thread; use /admin/profiling
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    zone_catalog.stop_watching()
+    await _stop_inference()
 
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "models_ready": True}
+    status = {"status": "ok", "models_ready": bundle is not None and bundle.ready, "zones": zone_catalog.info}
+    if bundle is not None:
+        status["model_format"] = bundle.artifact_format
+        status["model_state"] = bundle.snapshot()
+    if inference_pool is not None:
+        status["inference_pool"] = inference_pool.snapshot()
+    if batcher is not None:
+        status["microbatch"] = dict(batcher.stats)
+    if prediction_cache is not None:
+        status["prediction_cache"] = prediction_cache.snapshot()
+    if TICK_STATE_ENABLED:
+        status["tourist_state"] = {"tourists": len(tick_state), "itineraries": tick_state.itineraries}
+    return status
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of the service's histograms, counters and gauges."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _check_admin(request: Request):
+    if ADMIN_TOKEN and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {ADMIN_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Admin token required")
+
+
+@app.get("/admin/profiling")
+def profiling_status(request: Request):
+    _check_admin(request)
+    return profiler.snapshot()
+
+
+@app.put("/admin/profiling")
+def configure_profiling(req: ProfilingRequest, request: Request):
+    """Turn /predict profiling on or off, or change its settings; omitted fields are kept."""
+    _check_admin(request)
+    try:
+        profiler.configure(**req.model_dump())
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Profiling not enabled: {e}")
+    return profiler.snapshot()
+
+
+@app.put("/tourists/{tourist_id}/itinerary")
+def set_itinerary(tourist_id: str, req: ItineraryRequest):
+    """Cache a tourist's waypoints for deriving distance_from_itinerary."""
+    tick_state.set_itinerary(tourist_id, [(w.lat, w.lng) for w in req.waypoints])
+    return {"success": True, "tourist_id": tourist_id, "waypoints": len(req.waypoints)}
+
+
+# Input-driven explanation flags, in the order they are reported.
+RISK_FACTORS = (
+    'high_area_risk',
+    'off_itinerary',
+    'stale_gps_signal',
+    'low_recent_movement',
+    'restricted_zone_flag',
+    'sos_flag_active',
+    'prior_incidents_history',
+)
+
+# Every combination of RISK_FACTORS, indexed by its bitmask, so rows are
+# explained with a table lookup instead of per-row string building.
+_EXPLANATIONS = []
+for _code in range(1 << len(RISK_FACTORS)):
+    _factors = [f for bit, f in enumerate(RISK_FACTORS) if _code & (1 << bit)]
+    _EXPLANATIONS.append({
+        'factors': _factors,
+        'summary': ' | '.join(_factors) if _factors else 'no notable risk factors from input'
+    })
+
+_FLOAT_FIELDS = ('latitude', 'longitude', 'distance_from_itinerary', 'time_since_last_fix',
+                 'avg_speed_last_15min', 'area_risk_score')
+_INT_FIELDS = ('prior_incidents_count', 'days_into_trip', 'age', 'sex_encoded', 'days_trip_duration')
+_BOOL_FIELDS = ('is_in_restricted_zone', 'sos_flag')
+
+
+def _fill_movement_features(cols: Dict[str, np.ndarray], speeds: np.ndarray, observe: bool = True):
+    # Every observed tick advances its tourist's state; derived values only fill nulls
+    if observe:
+        since_fix, avg_speed = tick_state.observe(cols['tourist_id'].tolist(), cols['timestamp'].tolist(), speeds)
+        for name, derived in (('time_since_last_fix', since_fix), ('avg_speed_last_15min', avg_speed)):
+            col = cols[name]
+            missing = np.isnan(col)
+            col[missing] = derived[missing]
+    distance = cols['distance_from_itinerary']
+    missing = np.flatnonzero(np.isnan(distance))
+    if len(missing) and tick_state.itineraries:
+        distance[missing] = tick_state.itinerary_distance(
+            cols['tourist_id'][missing].tolist(), cols['latitude'][missing], cols['longitude'][missing])
+
+
+def _records_to_columns(records: List[LocationTick], observe: bool = True) -> Dict[str, np.ndarray]:
+    """Build one NumPy column per model input straight from the validated ticks.
+
+    Missing (null) optional values become NaN/0 exactly as the model's
+    ``fillna(0)`` would treat them; null area flags and time-of-day buckets
+    are filled from the geofence and timestamp, and null movement features
+    from the per-tourist tick state. With ``observe=False`` the ticks do not
+    advance that state, so only distance_from_itinerary is derived.
+    """
+    cols: Dict[str, np.ndarray] = {
+        'tourist_id': np.array([r.tourist_id for r in records], dtype=object),
+        'timestamp': np.array([r.timestamp for r in records], dtype=object),
+    }
+    for name in _FLOAT_FIELDS:
+        cols[name] = np.array([getattr(r, name) for r in records], dtype=np.float64)
+    for name in _INT_FIELDS:
+        col = np.array([getattr(r, name) for r in records], dtype=np.float64)
+        cols[name] = np.nan_to_num(col, nan=0.0).astype(np.int64)
+    raw_bools = {name: np.array([getattr(r, name) for r in records], dtype=np.float64)
+                 for name in _BOOL_FIELDS}
+
+    if TICK_STATE_ENABLED:
+        _fill_movement_features(cols, np.array([r.speed_m_s for r in records], dtype=np.float64), observe)
+
+    # Fill area flags only where the caller did not provide them
+    area, restricted = cols['area_risk_score'], raw_bools['is_in_restricted_zone']
+    missing = np.flatnonzero(np.isnan(area) | np.isnan(restricted))
+    if len(missing):
+        risk, in_restricted = _compute_area_flags_batch(cols['latitude'][missing], cols['longitude'][missing])
+        area[missing] = np.where(np.isnan(area[missing]), risk, area[missing])
+        restricted[missing] = np.where(np.isnan(restricted[missing]), in_restricted, restricted[missing])
+    for name, col in raw_bools.items():
+        cols[name] = np.nan_to_num(col, nan=0.0).astype(bool)
+
+    # Fill time of day bucket if missing
+    buckets = [r.time_of_day_bucket for r in records]
+    for i, bucket in enumerate(buckets):
+        if not bucket and records[i].timestamp:
+            buckets[i] = _infer_time_of_day_bucket(records[i].timestamp)
+    cols['time_of_day_bucket'] = np.array(buckets, dtype=object)
+    return cols
+
+
+def _safety_bands(scores: np.ndarray) -> np.ndarray:
+    return np.where(scores >= 75, 'high', np.where(scores >= 50, 'medium', 'low'))
+
+
+def _risk_factor_codes(cols: Dict[str, np.ndarray]) -> np.ndarray:
+    """Bitmask of RISK_FACTORS per row (transparent, input-driven; not anomalies).
+
+    Null inputs (movement features without tick state, distance without an
+    itinerary) count as 0, as they do for the model.
+    """
+    area, distance, since_fix, speed = (np.nan_to_num(cols[name], nan=0.0) for name in (
+        'area_risk_score', 'distance_from_itinerary', 'time_since_last_fix', 'avg_speed_last_15min'))
+    masks = (
+        area >= 0.6,
+        distance >= 300,
+        since_fix >= 900,
+        speed < 0.3,
+        cols['is_in_restricted_zone'],
+        cols['sos_flag'],
+        cols['prior_incidents_count'] > 0,
+    )
+    codes = np.zeros(len(cols['tourist_id']), dtype=np.int64)
+    for bit, mask in enumerate(masks):
+        codes |= mask.astype(np.int64) << bit
+    return codes
+
+
+def _build_results(cols: Dict[str, np.ndarray], scores: np.ndarray, conf: np.ndarray) -> List[Dict[str, Any]]:
+    explanations = _EXPLANATIONS
+    return [
+        {
+            'tourist_id': tid,
+            'timestamp': ts,
+            'predicted_safety': score,
+            'confidence': conf_v,
+            'safety_band': band,
+            'explanations': explanations[code]
+        }
+        for tid, ts, score, conf_v, band, code in zip(
+            cols['tourist_id'].tolist(),
+            cols['timestamp'].tolist(),
+            scores.astype(np.float64).tolist(),
+            conf.astype(np.float64).tolist(),
+            _safety_bands(scores).tolist(),
+            _risk_factor_codes(cols).tolist(),
+        )
+    ]
 
 
-@app.post("/predict")
-def predict(req: PredictRequest):
+def _loaded_bundle() -> ModelBundle:
+    global bundle
+    if bundle is None or not bundle.ready:
+        # Process-pool worker started before the parent finished training
+        bundle = ModelBundle()
+        if not bundle.load_artifacts():
+            raise RuntimeError(f"No model artifacts in {MODELS_DIR}")
+    return bundle
+
+
+def _score_columns(cols: Dict[str, np.ndarray]):
+    # Safety score only (anomaly reasons removed until proper time-series logic exists).
+    # Same as safety.predict(cols), with encoding and the model call timed apart
+    safety = _loaded_bundle().safety
+    start = time.perf_counter()
+    X = safety.encode(cols)
+    encoded = time.perf_counter()
+    raw = predict_raw(safety.model, getattr(safety, 'trees', None), X)
+    STAGES['encode'].observe(encoded - start)
+    STAGES['model'].observe(time.perf_counter() - encoded)
+    return safety_scores(raw)
+
+
+def _explain_columns(cols: Dict[str, np.ndarray], fast: bool) -> List[Dict[str, Any]]:
+    """/explain results: one encode and one attribution call for the whole batch."""
+    loaded = _loaded_bundle()
+    X = loaded.safety.encode(cols)
+    attributions, base_values = loaded.explainer.explain(X, fast=fast)
+    # Attributions and base value sum to the raw output; the score is it clipped
+    raw = attributions.sum(axis=1) + base_values
+    scores, _ = safety_scores(raw)
+    names = loaded.explainer.feature_names
+    return [
+        {
+            'tourist_id': tid,
+            'timestamp': ts,
+            'predicted_safety': score,
+            'raw_prediction': raw_v,
+            'base_value': base,
+            'attributions': dict(zip(names, row)),
+        }
+        for tid, ts, score, raw_v, base, row in zip(
+            cols['tourist_id'].tolist(),
+            cols['timestamp'].tolist(),
+            scores.tolist(),
+            raw.tolist(),
+            base_values.tolist(),
+            attributions.tolist(),
+        )
+    ]
+
+
+# Confidence reported for rules-only scores, below anything the model reports (>= 0.2)
+RULES_CONFIDENCE = 0.1
+
+
+def _rules_score_columns(cols: Dict[str, np.ndarray]):
+    """Rules-only safety score used until the models are ready.
+
+    Applies the same penalties the synthetic labels are built from
+    (data_generator.generate_safety_labels) without the noise. Null inputs
+    count as 0, as they do for the model.
+    """
+    area, distance, since_fix, speed = (np.nan_to_num(cols[name], nan=0.0) for name in (
+        'area_risk_score', 'distance_from_itinerary', 'time_since_last_fix', 'avg_speed_last_15min'))
+    scores = (
+        75.0
+        - area * 30
+        - np.minimum(distance / 1000, 20)
+        - np.minimum(since_fix / 3600, 25)
+        - cols['prior_incidents_count'] * 10
+    )
+    bucket = cols['time_of_day_bucket']
+    scores -= np.where(bucket == 'night', 15, np.where(bucket == 'evening', 5, 0))
+    age = cols['age']
+    scores -= np.where((age > 60) | (age < 25), 5, 0)
+    scores += np.where(speed == 0, -10, np.where(speed > 20, 5, 0))
+    scores -= np.where(cols['is_in_restricted_zone'], 20, 0)
+    scores = np.where(cols['sos_flag'], 0.0, scores)
+    return np.clip(scores, 0, 100), np.full(len(scores), RULES_CONFIDENCE)
+
+
+async def _score_model(cols: Dict[str, np.ndarray]):
+    profile = _request_profile.get() if profiler.enabled else None
+    if profile is not None:
+        return await _score_model_profiled(cols, profile)
+    if batcher is not None:
+        return await batcher.submit(cols)
+    return await inference_pool.run(_score_columns, cols)
+
+
+async def _score_model_profiled(cols: Dict[str, np.ndarray], profile):
+    # The event loop runs other requests while this one waits, so its recorder
+    # is paused; a thread worker records the model call itself (process workers
+    # and micro-batches shared with other requests are not recorded)
+    with profile.paused():
+        if batcher is not None:
+            return await batcher.submit(cols)
+        fn = profile.wrap(_score_columns) if inference_pool.kind == "thread" else _score_columns
+        return await inference_pool.run(fn, cols)
+
+
+async def _score_cached(cols: Dict[str, np.ndarray]):
+    """Scores from the prediction cache; only rows it misses go to the model."""
+    start = time.perf_counter()
+    cols = prediction_cache.quantize(cols)
+    lookup = prediction_cache.lookup(bundle.safety.encode(cols), bundle.model_version)
+    STAGES['cache_lookup'].observe(time.perf_counter() - start)
+    if len(lookup.missing):
+        rows = lookup.missing_rows
+        lookup.fill(*await _score_model({name: col[rows] for name, col in cols.items()}))
+        prediction_cache.store(lookup)
+    return lookup.result()
+
+
+async def _score(cols: Dict[str, np.ndarray]):
+    """(scorer, scores, confidence): rules-only until the models are ready."""
+    if bundle is None or not bundle.ready:
+        scores, conf = _rules_score_columns(cols)
+        return "rules", scores, conf
+    if prediction_cache is not None:
+        scores, conf = await _score_cached(cols)
+    else:
+        scores, conf = await _score_model(cols)
+    return "model", scores, conf
+
+
+def _json_body(model) -> Dict[str, Any]:
+    # OpenAPI request body for handlers that validate it themselves
+    schema = model.model_json_schema(ref_template='#/components/schemas/{model}')
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}}
+
+
+def _validate_body(model, body: bytes):
+    """Parse a JSON body into `model`, failing as FastAPI's own validation does (422)."""
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, 'loc': ('body', *err['loc'])}
+                                      for err in e.errors(include_url=False)], body=body)
+
+
+# The body is validated in the handler rather than by FastAPI so that
+# validation shows up as its own stage in /metrics
+@app.post("/predict", openapi_extra=_json_body(PredictRequest))
+async def predict(request: Request):
+    body = await request.body()
+    if not profiler.enabled:
+        return await _predict(body)
+    profile = profiler.start()
+    if profile is None:
+        return await _predict(body)
+    token = _request_profile.set(profile)
     try:
-        # Convert input and enrich with geofence/risk/time-of-day if missing
-        input_rows = []
-        for r in req.records:
-            row = r.dict()
-            lat = float(row.get('latitude') or 0.0)
-            lng = float(row.get('longitude') or 0.0)
-            # Fill area flags when not provided
-            if row.get('area_risk_score') is None or row.get('is_in_restricted_zone') is None:
-                flags = _compute_area_flags(lat, lng)
-                row.setdefault('area_risk_score', flags['area_risk_score'])
-                row.setdefault('is_in_restricted_zone', flags['is_in_restricted_zone'])
-            # Fill time of day bucket if missing
-            if not row.get('time_of_day_bucket') and row.get('timestamp'):
-                row['time_of_day_bucket'] = _infer_time_of_day_bucket(row['timestamp'])
-            input_rows.append(row)
-
-        df = pd.DataFrame(input_rows)
-        # Safety score only (anomaly reasons removed until proper time-series logic exists)
-        scores, conf = bundle.safety.predict(df)
-        df_out = df.copy()
-        df_out['predicted_safety'] = scores
-        df_out['confidence'] = conf
-        
-        def band(score: float) -> str:
-            if score >= 75:
-                return 'high'
-            if score >= 50:
-                return 'medium'
-            return 'low'
-
-        def derive_risk_factors(row: Dict[str, Any]) -> Dict[str, Any]:
-            factors = []
-            # Transparent, input-driven explanations (not anomalies)
-            if float(row.get('area_risk_score', 0)) >= 0.6:
-                factors.append('high_area_risk')
-            if float(row.get('distance_from_itinerary', 0)) >= 300:
-                factors.append('off_itinerary')
-            if float(row.get('time_since_last_fix', 0)) >= 900:
-                factors.append('stale_gps_signal')
-            if float(row.get('avg_speed_last_15min', 0)) < 0.3:
-                factors.append('low_recent_movement')
-            if bool(row.get('is_in_restricted_zone', False)):
-                factors.append('restricted_zone_flag')
-            if bool(row.get('sos_flag', False)):
-                factors.append('sos_flag_active')
-            if int(row.get('prior_incidents_count', 0)) > 0:
-                factors.append('prior_incidents_history')
-            # Summarize
-            summary = ' | '.join(factors) if factors else 'no notable risk factors from input'
-            return { 'factors': factors, 'summary': summary }
-
-        results = []
-        for _, row in df_out.iterrows():
-            score = float(row['predicted_safety'])
-            conf_v = float(row['confidence'])
-            rationale = derive_risk_factors(row)
-            results.append({
-                'tourist_id': row['tourist_id'],
-                'timestamp': row['timestamp'],
-                'predicted_safety': score,
-                'confidence': conf_v,
-                'safety_band': band(score),
-                'explanations': rationale
-            })
+        response = await _predict(body, profile)
+    finally:
+        _request_profile.reset(token)
+        profiler.finish(profile)
+    if isinstance(response, Response):
+        # Written after the response is sent
+        response.background = BackgroundTask(profiler.save, profile)
+    return response
+
+
+async def _predict(body: bytes, profile=None):
+    started = time.perf_counter()
+    req = _validate_body(PredictRequest, body)
+    if not req.records:
+        return {"success": True, "results": []}
+    if profile is not None:
+        profile.rows = len(req.records)
+    try:
+        validated = time.perf_counter()
+        STAGES['validate'].observe(validated - started)
+        cols = _records_to_columns(req.records)
+        enriched = time.perf_counter()
+        STAGES['enrich'].observe(enriched - validated)
+        scorer, scores, conf = await _score(cols)
+        scored = time.perf_counter()
+        # Results are plain Python values; skip FastAPI's per-field encoder
+        response = JSONResponse({
+            "success": True,
+            "scorer": scorer,
+            "results": _build_results(cols, scores, conf)
+        })
+        STAGES['respond'].observe(time.perf_counter() - scored)
+        _observe_scored('predict', started, len(req.records), scorer)
+        return response
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"Inference queue full: {e}",
+                            headers={"Retry-After": str(INFERENCE_RETRY_AFTER_S)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {
+
+@app.post("/explain")
+async def explain(req: ExplainRequest):
+    """Per-feature attributions of each record's safety score.
+
+    Ticks are encoded as /predict encodes them but do not advance the
+    per-tourist tick state, so movement features left out count as missing.
+    """
+    if not req.records:
+        return {"success": True, "results": []}
+    if bundle is None or not bundle.ready:
+        raise HTTPException(status_code=503, detail="Models are not ready",
+                            headers={"Retry-After": str(INFERENCE_RETRY_AFTER_S)})
+    try:
+        started = time.perf_counter()
+        cols = _records_to_columns(req.records, observe=False)
+        results = await inference_pool.run(_explain_columns, cols, req.fast)
+        response = JSONResponse({
             "success": True,
+            "mode": "fast" if req.fast else "shap",
             "results": results
-        }
+        })
+        _request_seconds.labels('explain').observe(time.perf_counter() - started)
+        _batch_rows.labels('explain').observe(len(req.records))
+        return response
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"Inference queue full: {e}",
+                            headers={"Retry-After": str(INFERENCE_RETRY_AFTER_S)})
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=f"shap is not installed ({e}); use fast mode")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that does not listen for disconnects while streaming.
+
+    /predict/stream keeps reading the request body while results go out;
+    Starlette's disconnect listener would consume those body messages.
+    A disconnect still surfaces through request.stream().
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+async def _score_stream_chunk(records: List[LocationTick]) -> bytes:
+    started = time.perf_counter()
+    cols = _records_to_columns(records)
+    enriched = time.perf_counter()
+    STAGES['enrich'].observe(enriched - started)
+    while True:
+        try:
+            scorer, scores, conf = await _score(cols)
+            break
+        except QueueFullError:
+            # Back-pressure: stop reading the upload until the pool has room
+            await asyncio.sleep(STREAM_BACKOFF_S)
+    scored = time.perf_counter()
+    lines = []
+    for result in _build_results(cols, scores, conf):
+        result['scorer'] = scorer
+        lines.append(json.dumps(result))
+    lines.append('')
+    body = '\n'.join(lines).encode()
+    STAGES['respond'].observe(time.perf_counter() - scored)
+    _observe_scored('stream', started, len(records), scorer)
+    return body
+
+
+async def _predict_stream_lines(request: Request):
+    pending: List[LocationTick] = []
+    tail = b''
+    line_no = 0
+
+    def parse(lines: List[bytes]) -> List[bytes]:
+        nonlocal line_no
+        started = time.perf_counter()
+        errors = []
+        for line in lines:
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                pending.append(LocationTick.model_validate_json(line))
+            except ValidationError as e:
+                errors.append(json.dumps({'line': line_no, 'error': e.errors(include_url=False)},
+                                         default=str).encode() + b'\n')
+        # A body message without a newline completes no line
+        if lines and (len(lines) > 1 or lines[0].strip()):
+            STAGES['validate'].observe(time.perf_counter() - started)
+        return errors
+
+    try:
+        async for body in request.stream():
+            lines = (tail + body).split(b'\n')
+            tail = lines.pop()
+            for error in parse(lines):
+                yield error
+            # Score what this body message completed, so results keep pace with the upload
+            while pending:
+                chunk, pending = pending[:STREAM_CHUNK_ROWS], pending[STREAM_CHUNK_ROWS:]
+                yield await _score_stream_chunk(chunk)
+        for error in parse([tail]):
+            yield error
+        if pending:
+            yield await _score_stream_chunk(pending)
+    except ClientDisconnect:
+        return
+    except Exception as e:
+        # The status line is already sent; end the stream with the error
+        yield json.dumps({'line': line_no, 'error': str(e)}).encode() + b'\n'
+
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request):
+    """Score NDJSON LocationTick lines as they arrive; answers with NDJSON results.
+
+    Each result line carries the /predict result fields plus `scorer`;
+    invalid lines produce {"line": n, "error": [...]} and are skipped.
+    """
+    return _DuplexStreamingResponse(_predict_stream_lines(request), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("ML_PORT", "8001")))
-
-
@@ -0,0 +1,48 @@
+"""Shared setup: the ml modules are flat, so tests import them from the parent directory."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def kernel_cache(tmp_path_factory):
+    # Compile the tree kernel into a private per-session directory, not the user's cache
+    cache_dir = tmp_path_factory.mktemp('kernels')
+    cache_dir.chmod(0o700)
+    patch = pytest.MonkeyPatch()
+    patch.setenv('ML_KERNEL_CACHE', str(cache_dir))
+    yield cache_dir
+    patch.undo()
+
+
+@pytest.fixture(scope='session')
+def trained_models(tmp_path_factory):
+    """(data_dir, models_dir) with a small synthetic dataset and the models trained on it."""
+    from model_training import train_and_save
+
+    root = tmp_path_factory.mktemp('trained')
+    train_and_save(str(root / 'data'), str(root / 'models'), num_tourists=30)
+    return root / 'data', root / 'models'
+
+
+@pytest.fixture
+def service(trained_models, monkeypatch):
+    """The service module with the trained models loaded and a small thread pool."""
+    import service
+
+    data_dir, models_dir = trained_models
+    monkeypatch.setattr(service, 'DATA_DIR', data_dir)
+    monkeypatch.setattr(service, 'MODELS_DIR', models_dir)
+    monkeypatch.setattr(service, 'bundle', service.ModelBundle())
+    monkeypatch.setattr(service, 'prediction_cache', None)
+    assert service.bundle.load_artifacts()
+    service._start_inference('thread', workers=2, max_queue=4, microbatch=False)
+    yield service
+    if service.inference_pool is not None:
+        service.inference_pool.shutdown()
+    service.inference_pool = service.batcher = None
+    service.tick_state.clear()
@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+from inference_pool import QueueFullError
+
+
+def _cols(start, rows):
+    x = np.arange(start, start + rows)
+    return {'tourist_id': np.array([f"t{i}" for i in x], dtype=object), 'x': x}
+
+
+def _score(cols):
+    return cols['x'] * 10.0, cols['x'] / 1000.0
+
+
+class FakeRunner:
+    """Runs the score function inline and records each flush's row count."""
+
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.delay = delay
+
+    async def __call__(self, fn, cols):
+        self.batches.append(len(cols['tourist_id']))
+        await asyncio.sleep(self.delay)
+        return fn(cols)
+
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+def test_merged_requests_get_their_own_rows_back():
+    async def main():
+        runner = FakeRunner()
+        batcher = MicroBatcher(_score, max_rows=1000, max_delay_ms=20, runner=runner)
+        batcher.start()
+        sizes = [3, 1, 5, 2, 4]
+        starts = np.cumsum([0] + sizes[:-1]) * 100
+        results = await asyncio.gather(*(batcher.submit(_cols(s, n)) for s, n in zip(starts, sizes)))
+        await batcher.stop()
+        return runner, batcher, starts, sizes, results
+
+    runner, batcher, starts, sizes, results = _run(main())
+    assert runner.batches == [sum(sizes)]
+    assert batcher.stats == {'requests': 5, 'rows': sum(sizes), 'batches': 1, 'rejected': 0}
+    for start, n, (scores, conf) in zip(starts, sizes, results):
+        x = np.arange(start, start + n)
+        np.testing.assert_array_equal(scores, x * 10.0)
+        np.testing.assert_array_equal(conf, x / 1000.0)
+
+
+def test_flushes_at_max_rows_without_waiting_for_the_deadline():
+    async def main():
+        runner = FakeRunner()
+        batcher = MicroBatcher(_score, max_rows=8, max_delay_ms=5000, runner=runner)
+        batcher.start()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(_cols(i * 4, 4)) for i in range(4)))
+        elapsed = time.perf_counter() - started
+        await batcher.stop()
+        return runner, results, elapsed
+
+    runner, results, elapsed = _run(main())
+    assert runner.batches == [8, 8]
+    assert elapsed < 1.0
+    for i, (scores, _) in enumerate(results):
+        np.testing.assert_array_equal(scores, np.arange(i * 4, i * 4 + 4) * 10.0)
+
+
+def test_flushes_a_partial_batch_at_the_deadline():
+    async def main():
+        runner = FakeRunner()
+        batcher = MicroBatcher(_score, max_rows=1000, max_delay_ms=50, runner=runner)
+        batcher.start()
+        first = asyncio.ensure_future(batcher.submit(_cols(0, 2)))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(batcher.submit(_cols(2, 3)))
+        started = time.perf_counter()
+        await asyncio.gather(first, second)
+        waited = time.perf_counter() - started
+        late = await batcher.submit(_cols(5, 1))
+        await batcher.stop()
+        return runner, waited, late
+
+    runner, waited, late = _run(main())
+    assert runner.batches == [5, 1]
+    assert 0.02 < waited < 1.0
+    np.testing.assert_array_equal(late[0], [50.0])
+
+
+def test_requests_queue_while_every_flush_is_busy():
+    async def main():
+        runner = FakeRunner(delay=0.05)
+        batcher = MicroBatcher(_score, max_rows=1000, max_delay_ms=1, runner=runner, concurrency=1)
+        batcher.start()
+        first = asyncio.ensure_future(batcher.submit(_cols(0, 1)))
+        await asyncio.sleep(0.01)
+        rest = [asyncio.ensure_future(batcher.submit(_cols(i, 1))) for i in range(1, 6)]
+        await asyncio.gather(first, *rest)
+        await batcher.stop()
+        return runner
+
+    assert _run(main()).batches == [1, 5]
+
+
+def test_a_failed_flush_fails_every_caller_in_it():
+    calls = 0
+
+    async def fails_once(fn, cols):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("model crashed")
+        return fn(cols)
+
+    async def main():
+        batcher = MicroBatcher(_score, max_rows=1000, max_delay_ms=10, runner=fails_once, concurrency=1)
+        batcher.start()
+        results = await asyncio.gather(batcher.submit(_cols(0, 2)), batcher.submit(_cols(2, 2)),
+                                       return_exceptions=True)
+        # The failed flush gave its slot back
+        after = await batcher.submit(_cols(4, 1))
+        await batcher.stop()
+        return results, after
+
+    results, after = _run(main())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    np.testing.assert_array_equal(after[0], [40.0])
+
+
+def test_submit_raises_queue_full_past_max_queue():
+    async def main():
+        runner = FakeRunner(delay=0.05)
+        batcher = MicroBatcher(_score, max_rows=1, max_delay_ms=1, runner=runner, concurrency=1, max_queue=2)
+        batcher.start()
+        first = asyncio.ensure_future(batcher.submit(_cols(0, 1)))
+        await asyncio.sleep(0.01)  # in its flush; the next two wait for the slot
+        waiting = [asyncio.ensure_future(batcher.submit(_cols(i, 1))) for i in (1, 2)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await batcher.submit(_cols(3, 1))
+        results = await asyncio.gather(first, *waiting)
+        await batcher.stop()
+        return batcher, results
+
+    batcher, results = _run(main())
+    assert batcher.stats['rejected'] == 1
+    assert [r[0].tolist() for r in results] == [[0.0], [10.0], [20.0]]
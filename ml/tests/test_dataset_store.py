@@ -0,0 +1,118 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_store
+from dataset_store import FEATURE_SCHEMA, dataset_format, iter_chunks, read_table, write_table
+
+FORMATS = ['csv', pytest.param('parquet', marks=pytest.mark.skipif(dataset_store.pq is None,
+                                                                    reason="pyarrow is not installed"))]
+
+
+def _features(n, seed=0):
+    """Generator-shaped feature rows: ISO timestamp strings, object strings, Python bools."""
+    rng = np.random.default_rng(seed)
+    distance = rng.exponential(200, n)
+    distance[::9] = np.nan
+    return pd.DataFrame({
+        'tourist_id': [f"tourist-{i % 7}" for i in range(n)],
+        'timestamp': [(datetime(2025, 1, 1) + timedelta(minutes=37 * i, microseconds=i % 3 * 123457)).isoformat()
+                      for i in range(n)],
+        'time_of_day_bucket': rng.choice(['morning', 'afternoon', 'evening', 'night'], n),
+        'distance_from_itinerary': distance,
+        'time_since_last_fix': rng.uniform(0, 3600, n),
+        'avg_speed_last_15min': rng.uniform(0, 10, n),
+        'area_risk_score': rng.uniform(0, 1, n),
+        'prior_incidents_count': rng.integers(0, 3, n),
+        'days_into_trip': rng.integers(0, 10, n),
+        'is_in_restricted_zone': rng.random(n) < 0.1,
+        'sos_flag': rng.random(n) < 0.01,
+        'age': rng.integers(18, 80, n),
+        'sex_encoded': rng.integers(0, 3, n),
+        'days_trip_duration': rng.integers(1, 15, n),
+        'safety_label': rng.integers(0, 100, n),
+        'incident_within_24h': rng.random(n) < 0.05,
+    })
+
+
+def _check_dtypes(df):
+    for col, dtype in FEATURE_SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'datetime':
+            assert pd.api.types.is_datetime64_any_dtype(df[col]), col
+        else:
+            assert df[col].dtype == dtype, (col, df[col].dtype)
+
+
+@pytest.fixture
+def source():
+    return _features(1000)
+
+
+def _write_sharded(output_dir, df, fmt, parts=3):
+    # As sharded generation does: one part per shard, listed in manifest.json for CSV
+    bounds = np.linspace(0, len(df), parts + 1).astype(int)
+    files = [write_table(str(output_dir), 'train', df.iloc[a:b], fmt, part=i)
+             for i, (a, b) in enumerate(zip(bounds, bounds[1:]))]
+    if fmt == 'csv':
+        with open(output_dir / 'manifest.json', 'w') as f:
+            json.dump({'shards': [{'files': {'train': rel}} for rel in files]}, f)
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+@pytest.mark.parametrize('sharded', [False, True])
+def test_round_trip_keeps_values_and_types(tmp_path, source, fmt, sharded):
+    if sharded:
+        _write_sharded(tmp_path, source, fmt)
+    else:
+        write_table(str(tmp_path), 'train', source, fmt)
+    assert dataset_format(tmp_path) == fmt
+
+    df = read_table(str(tmp_path), 'train')
+    _check_dtypes(df)
+    assert list(df.columns) == list(source.columns)
+    expected = dataset_store._apply_schema(source, FEATURE_SCHEMA)
+    pd.testing.assert_frame_equal(df, expected, check_categorical=False)
+    # Timestamps come back as the instants the ISO strings name
+    assert [ts.isoformat() for ts in df['timestamp'][:3]] == source['timestamp'][:3].tolist()
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_read_only_some_columns(tmp_path, source, fmt):
+    write_table(str(tmp_path), 'train', source, fmt)
+    full = read_table(str(tmp_path), 'train')
+    # Returned in schema order whatever order they are asked for in
+    df = read_table(str(tmp_path), 'train', ['safety_label', 'tourist_id', 'timestamp'])
+    assert list(df.columns) == ['tourist_id', 'timestamp', 'safety_label']
+    _check_dtypes(df)
+    pd.testing.assert_frame_equal(df, full[['tourist_id', 'timestamp', 'safety_label']], check_categorical=False)
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_chunks_stream_the_table_in_order(tmp_path, source, fmt):
+    _write_sharded(tmp_path, source, fmt)
+    full = read_table(str(tmp_path), 'train', ['tourist_id', 'distance_from_itinerary', 'sos_flag'])
+    chunks = list(iter_chunks(str(tmp_path), 'train', ['sos_flag', 'distance_from_itinerary', 'tourist_id'],
+                              chunk_rows=150))
+    assert all(len(chunk) <= 150 for chunk in chunks)
+    # Chunks do not span the three parts: 334, 333 and 333 rows
+    assert len(chunks) == 9
+    for chunk in chunks:
+        assert list(chunk.columns) == ['tourist_id', 'distance_from_itinerary', 'sos_flag']
+        _check_dtypes(chunk)
+    joined = pd.concat(chunks, ignore_index=True)
+    joined['tourist_id'] = joined['tourist_id'].astype(str)
+    expected = full.assign(tourist_id=full['tourist_id'].astype(str))
+    pd.testing.assert_frame_equal(joined, expected)
+
+
+@pytest.mark.skipif(dataset_store.pq is None, reason="pyarrow is not installed")
+def test_both_formats_load_identical_frames(tmp_path, source):
+    for fmt in ('csv', 'parquet'):
+        write_table(str(tmp_path / fmt), 'train', source, fmt)
+    csv, parquet = (read_table(str(tmp_path / fmt), 'train') for fmt in ('csv', 'parquet'))
+    pd.testing.assert_frame_equal(csv, parquet)
@@ -0,0 +1,45 @@
+import joblib
+import numpy as np
+import pytest
+
+from dataset_store import read_table
+from runtime import SafetyFeatureEncoder, load_safety_model
+
+
+@pytest.fixture(scope='module')
+def model_and_rows(trained_models):
+    data_dir, models_dir = trained_models
+    model = joblib.load(models_dir / 'safety_score_model.joblib')
+    return model, read_table(str(data_dir), 'test').head(500)
+
+
+def test_encoder_matches_prepare_features(model_and_rows):
+    model, df = model_and_rows
+    df = df.copy()
+    df['time_of_day_bucket'] = df['time_of_day_bucket'].astype(object)
+    df.loc[df.index[::11], 'time_of_day_bucket'] = 'unseen-bucket'
+    df.loc[df.index[::13], 'distance_from_itinerary'] = np.nan
+    expected, _ = model.prepare_features(df, fit_encoders=False)
+    X = SafetyFeatureEncoder.from_model(model).transform(df)
+    assert X.dtype == np.float32 and X.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(X, expected.astype(np.float32))
+
+
+def test_dict_columns_encode_like_the_dataframe(model_and_rows):
+    model, df = model_and_rows
+    encoder = SafetyFeatureEncoder.from_model(model)
+    columns = {name: df[name].to_numpy() for name in df.columns if name != 'age'}
+    X = encoder.transform(columns)
+    expected = encoder.transform(df)
+    age = encoder.feature_names.index('age')
+    assert (X[:, age] == 0).all()
+    np.testing.assert_array_equal(np.delete(X, age, axis=1), np.delete(expected, age, axis=1))
+
+
+def test_runtime_artifacts_encode_like_the_trained_model(model_and_rows, trained_models):
+    model, df = model_and_rows
+    runtime = load_safety_model(trained_models[1] / 'runtime')
+    assert runtime.feature_names == model.feature_names
+    np.testing.assert_array_equal(runtime.encode(df), model.encode(df))
+    for got, expected in zip(runtime.predict(df), model.predict(df)):
+        np.testing.assert_array_equal(got, expected)
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from inference_pool import InferencePool, QueueFullError
+
+
+def _omp_num_threads():
+    return os.environ.get('OMP_NUM_THREADS')
+
+
+def test_queue_full_past_workers_plus_max_queue():
+    async def main():
+        pool = InferencePool('thread', workers=1, max_queue=1)
+        try:
+            running = [asyncio.ensure_future(pool.run(time.sleep, 0.1)) for _ in range(2)]
+            await asyncio.sleep(0)
+            with pytest.raises(QueueFullError):
+                await pool.run(time.sleep, 0)
+            await asyncio.gather(*running)
+            await pool.run(time.sleep, 0)
+            return pool.snapshot()
+        finally:
+            pool.shutdown()
+
+    snapshot = asyncio.run(main())
+    assert snapshot['rejected'] == 1
+    assert snapshot['completed'] == 3
+    assert snapshot['inflight'] == 0
+
+
+def test_process_workers_limit_openmp_without_touching_the_parent(monkeypatch):
+    monkeypatch.delenv('OMP_NUM_THREADS', raising=False)
+
+    async def main():
+        pool = InferencePool('process', workers=1)
+        try:
+            return await pool.run(_omp_num_threads)
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(main()) == str(os.cpu_count() or 1)
+    assert 'OMP_NUM_THREADS' not in os.environ
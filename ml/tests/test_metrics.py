@@ -0,0 +1,101 @@
+import threading
+
+from metrics import Registry
+
+
+def _samples(text):
+    """{series: value} for the sample lines of a rendered scrape."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            series, value = line.rsplit(' ', 1)
+            samples[series] = value
+    return samples
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    hist = registry.histogram('rows', 'Rows per batch', buckets=(10, 1, 5))
+    # On a bucket's upper bound counts in that bucket (le)
+    for value in (0.5, 1, 3, 5, 7, 100):
+        hist.observe(value)
+
+    text = registry.render()
+    assert text.startswith('# HELP rows Rows per batch\n# TYPE rows histogram\n')
+    assert text.endswith('\n')
+    assert _samples(text) == {
+        'rows_bucket{le="1"}': '2',
+        'rows_bucket{le="5"}': '4',
+        'rows_bucket{le="10"}': '5',
+        'rows_bucket{le="+Inf"}': '6',
+        'rows_sum': '116.5',
+        'rows_count': '6',
+    }
+
+
+def test_labels_are_escaped_and_series_sorted():
+    registry = Registry()
+    hist = registry.histogram('stage_seconds', 'Stage time', buckets=(0.5,), labelnames=('stage',))
+    hist.labels('score').observe(0.25)
+    hist.labels('say "hi"\\\n').observe(2)
+    counter = registry.counter('requests_total', 'Requests', labelnames=('path', 'status'))
+    counter.labels('/predict', 200).inc()
+    counter.labels('/predict', 200).inc(2)
+    registry.add_collector(lambda: [('queue_depth', 'gauge', 'Queued requests',
+                                     [({'pool': 'a"b'}, 3), ({'pool': 'c'}, float('nan'))])])
+
+    lines = [line for line in registry.render().splitlines() if not line.startswith('#')]
+    assert lines == [
+        'stage_seconds_bucket{stage="say \\"hi\\"\\\\\\n",le="0.5"} 0',
+        'stage_seconds_bucket{stage="say \\"hi\\"\\\\\\n",le="+Inf"} 1',
+        'stage_seconds_sum{stage="say \\"hi\\"\\\\\\n"} 2',
+        'stage_seconds_count{stage="say \\"hi\\"\\\\\\n"} 1',
+        'stage_seconds_bucket{stage="score",le="0.5"} 1',
+        'stage_seconds_bucket{stage="score",le="+Inf"} 1',
+        'stage_seconds_sum{stage="score"} 0.25',
+        'stage_seconds_count{stage="score"} 1',
+        'requests_total{path="/predict",status="200"} 3',
+        'queue_depth{pool="a\\"b"} 3',
+        'queue_depth{pool="c"} NaN',
+    ]
+
+
+def test_removed_children_are_not_exported():
+    registry = Registry()
+    hist = registry.histogram('latency', 'Latency', labelnames=('model',))
+    hist.labels('v1').observe(0.1)
+    hist.labels('v2').observe(0.1)
+    hist.remove('v1')
+    assert not any('v1' in line for line in registry.render().splitlines())
+
+
+def test_per_thread_shards_add_up():
+    registry = Registry()
+    hist = registry.histogram('rows', 'Rows per batch', buckets=(1, 10))
+    counter = registry.counter('batches_total', 'Batches')
+    threads, per_thread = 8, 5000
+    start = threading.Barrier(threads)
+
+    def work(index):
+        start.wait()
+        for i in range(per_thread):
+            # Half the rows in le="1", a quarter in le="10", the rest only in +Inf
+            hist.observe((1, 1, 10, 11)[i % 4])
+            counter.inc()
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(hist.labels()._shards) == threads
+    total = threads * per_thread
+    assert _samples(registry.render()) == {
+        'rows_bucket{le="1"}': str(total // 2),
+        'rows_bucket{le="10"}': str(total * 3 // 4),
+        'rows_bucket{le="+Inf"}': str(total),
+        'rows_sum': str(total // 4 * (1 + 1 + 10 + 11)),
+        'rows_count': str(total),
+        'batches_total': str(total),
+    }
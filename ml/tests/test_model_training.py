@@ -0,0 +1,154 @@
+import json
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_store import read_table, write_table
+from model_training import ModelTrainingPipeline, SafetyScoreModel, dataset_cache_key
+
+
+def _legacy_rule_anomalies(thresholds, row):
+    """The per-row rules detect_anomalies applied before it was vectorized."""
+    reasons = []
+    severity = 'info'
+    if row.get('distance_from_itinerary', 0) > thresholds['distance_from_itinerary']:
+        reasons.append('route_deviation')
+        severity = 'warn'
+    if row.get('time_since_last_fix', 0) > thresholds['time_since_last_fix']:
+        reasons.append('communication_loss')
+        severity = 'critical' if row.get('time_since_last_fix', 0) > 3600 else 'warn'
+    if row.get('avg_speed_last_15min', 1) == 0:
+        reasons.append('prolonged_inactivity')
+        severity = 'warn'
+    if row.get('area_risk_score', 0) > thresholds['high_risk_area']:
+        reasons.append('high_risk_area')
+        severity = 'warn'
+    if row.get('time_of_day_bucket', '') == 'night' and row.get('area_risk_score', 0) > 0.4:
+        reasons.append('night_travel_risky_area')
+        severity = 'warn'
+    if row.get('sos_flag', False):
+        reasons.append('sos_activated')
+        severity = 'critical'
+    if row.get('is_in_restricted_zone', False):
+        reasons.append('restricted_zone_entry')
+        severity = 'warn'
+    return reasons, severity
+
+
+def _legacy_detect_anomalies(model, df):
+    """detect_anomalies as it was: one DataFrame and one model call per row."""
+    alerts = []
+    for _, row in df.iterrows():
+        reasons, rule_severity = _legacy_rule_anomalies(model.thresholds, row)
+        X, _ = model.prepare_features(pd.DataFrame([row]))
+        if_score = model.isolation_forest.decision_function(X)[0]
+        svm_score = model.one_class_svm.decision_function(X)[0]
+        ml_anomaly = model.isolation_forest.predict(X)[0] == -1 or model.one_class_svm.predict(X)[0] == -1
+        if ml_anomaly:
+            reasons.append('ml_detected_anomaly')
+        alert = {'tourist_id': row['tourist_id'], 'timestamp': row['timestamp'], 'anomaly': False,
+                 'severity': 'info', 'reasons': reasons, 'anomaly_score': 0.0,
+                 'ml_scores': {'isolation_forest': float(if_score), 'svm': float(svm_score)}}
+        if rule_severity == 'critical' or (ml_anomaly and len(reasons) > 1):
+            alert.update(severity='critical', anomaly=True, anomaly_score=max(0.9, abs(min(if_score, svm_score))))
+        elif rule_severity == 'warn' or ml_anomaly:
+            alert.update(severity='warn', anomaly=True, anomaly_score=max(0.6, abs(min(if_score, svm_score))))
+        elif reasons:
+            alert['anomaly_score'] = 0.3
+        alerts.append(alert)
+    return alerts
+
+
+@pytest.fixture(scope='module')
+def anomaly_model(trained_models):
+    return joblib.load(trained_models[1] / 'anomaly_detection_model.joblib')
+
+
+def test_detect_anomalies_matches_the_per_row_implementation(anomaly_model, trained_models):
+    df = read_table(str(trained_models[0]), 'test').head(120).reset_index(drop=True)
+    # One row per tourist, so the speed history (and speed_variance) is the same row by row
+    df['tourist_id'] = [f"tourist-{i}" for i in range(len(df))]
+    df.loc[::17, 'sos_flag'] = True
+    df.loc[::13, 'is_in_restricted_zone'] = True
+    df.loc[::11, 'avg_speed_last_15min'] = 0.0
+    df.loc[::7, 'time_since_last_fix'] = 4000.0
+    df.loc[::19, 'distance_from_itinerary'] = np.nan
+    assert pd.api.types.is_datetime64_any_dtype(df['timestamp'])
+    # The ticks as the per-row path saw them, timestamps as the generator wrote them
+    legacy_df = df.assign(timestamp=[ts.to_pydatetime().isoformat() for ts in df['timestamp']])
+
+    alerts = anomaly_model.detect_anomalies(df)
+    assert alerts == _legacy_detect_anomalies(anomaly_model, legacy_df)
+    assert {alert['severity'] for alert in alerts} >= {'warn', 'critical'}
+    assert all(isinstance(alert['timestamp'], str) for alert in alerts)
+    json.dumps(alerts)
+
+
+def test_detect_anomalies_keeps_string_timestamps(anomaly_model, trained_models):
+    df = read_table(str(trained_models[0]), 'test').head(5)
+    df['timestamp'] = ['2025-01-01T10:00:00Z'] * 5
+    assert [alert['timestamp'] for alert in anomaly_model.detect_anomalies(df)] == ['2025-01-01T10:00:00Z'] * 5
+
+
+def test_out_of_core_training_matches_in_memory(trained_models):
+    data_dir = trained_models[0]
+    in_memory = SafetyScoreModel()
+    in_memory.train(read_table(str(data_dir), 'train'), read_table(str(data_dir), 'val'))
+    # Small chunks, so each split streams through several of them
+    out_of_core = SafetyScoreModel()
+    out_of_core.train_out_of_core(str(data_dir), chunk_rows=300)
+
+    assert out_of_core.feature_names == in_memory.feature_names
+    assert {col: list(enc.classes_) for col, enc in out_of_core.label_encoders.items()} == \
+        {col: list(enc.classes_) for col, enc in in_memory.label_encoders.items()}
+    assert out_of_core.model.model_to_string() == in_memory.model.model_to_string()
+
+
+def test_cache_hit_training_matches_in_memory(trained_models, tmp_path, monkeypatch):
+    data_dir = trained_models[0]
+    in_memory = SafetyScoreModel()
+    in_memory.train(read_table(str(data_dir), 'train'), read_table(str(data_dir), 'val'))
+
+    def pipeline():
+        return ModelTrainingPipeline(str(data_dir), str(tmp_path / 'models'), dataset_cache_dir=str(tmp_path / 'cache'))
+
+    cold = pipeline()
+    cold.train_models()
+    [entry] = (tmp_path / 'cache').iterdir()
+    assert entry.name == dataset_cache_key(data_dir, cold.safety_model.params)
+    assert (entry / 'meta.json').exists()
+
+    def rebuild(*args, **kwargs):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(SafetyScoreModel, 'build_datasets', rebuild)
+    warm = pipeline()
+    warm.train_models()
+    for model in (cold.safety_model, warm.safety_model):
+        assert model.feature_names == in_memory.feature_names
+        assert model.model.model_to_string() == in_memory.model.model_to_string()
+    assert warm.metrics['safety_score'] == cold.metrics['safety_score']
+
+
+def test_dataset_cache_key_tracks_binning_params_and_data(trained_models, tmp_path):
+    data_dir = trained_models[0]
+    params = SafetyScoreModel().params
+    key = dataset_cache_key(data_dir, params)
+    assert dataset_cache_key(data_dir, dict(params)) == key
+    # Training-only parameters reuse the binned Datasets
+    assert dataset_cache_key(data_dir, {**params, 'learning_rate': 0.1, 'num_leaves': 63}) == key
+    binned = {dataset_cache_key(data_dir, {**params, **change})
+              for change in ({'max_bin': 63}, {'min_data_in_bin': 10}, {'min_data_in_leaf': 5},
+                             {'random_state': 7}, {'zero_as_missing': True})}
+    assert len(binned) == 5 and key not in binned
+
+    # So does any change to the stored train/val data
+    copy = tmp_path / 'data'
+    shutil.copytree(data_dir, copy, ignore=shutil.ignore_patterns('lgb_cache'))
+    assert dataset_cache_key(copy, params) == key
+    val = read_table(str(copy), 'val')
+    write_table(str(copy), 'val', val.head(len(val) - 1))
+    assert dataset_cache_key(copy, params) != key
@@ -0,0 +1,92 @@
+import numpy as np
+
+from prediction_cache import PredictionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _score(cache, X, version='v1'):
+    """One service round trip: look up, score the misses as their row sums, store."""
+    lookup = cache.lookup(X, version)
+    rows = X[lookup.missing_rows]
+    lookup.fill(rows.sum(axis=1), np.full(len(rows), 0.5))
+    cache.store(lookup)
+    return lookup
+
+
+def test_quantize_keeps_zero_apart_from_small_values():
+    cache = PredictionCache({'distance_from_itinerary': 10.0})
+    cols = {'distance_from_itinerary': np.array([0.0, -0.0, 1.0, -1.0, 14.0, 16.0, np.nan]),
+            'other': np.array([1.234])}
+    out = cache.quantize(cols)
+    q = out['distance_from_itinerary']
+    np.testing.assert_array_equal(q[:6], [0.0, 0.0, 10.0, -10.0, 10.0, 20.0])
+    assert not np.signbit(q[1])
+    assert np.isnan(q[6])
+    assert out['other'] is cols['other']
+
+
+def test_hits_and_misses_count_batch_rows():
+    cache = PredictionCache()
+    X = np.array([[1.0, 2.0], [3.0, 4.0], [1.0, 2.0]], dtype=np.float32)
+    first = _score(cache, X)
+    assert len(first.missing) == 2
+    assert cache.stats == {'hits': 0, 'misses': 3, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    second = cache.lookup(X, 'v1')
+    assert len(second.missing) == 0
+    scores, confidence = second.result()
+    np.testing.assert_array_equal(scores, [3.0, 7.0, 3.0])
+    np.testing.assert_array_equal(confidence, [0.5, 0.5, 0.5])
+    assert cache.stats['hits'] == 3
+
+
+def test_new_model_version_invalidates():
+    cache = PredictionCache()
+    X = np.array([[1.0, 2.0]], dtype=np.float32)
+    _score(cache, X, 'v1')
+    assert len(cache.lookup(X, 'v2').missing) == 1
+    assert cache.stats['invalidations'] == 1
+    assert len(cache) == 0
+
+
+def test_store_is_skipped_when_the_version_changed_meanwhile():
+    cache = PredictionCache()
+    X = np.array([[1.0, 2.0]], dtype=np.float32)
+    stale = cache.lookup(X, 'v1')
+    stale.fill(np.array([99.0]), np.array([0.5]))
+    cache.lookup(np.array([[5.0, 6.0]], dtype=np.float32), 'v2')
+    cache.store(stale)
+    assert len(cache) == 0
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = PredictionCache(ttl_s=10.0, clock=clock)
+    X = np.array([[1.0, 2.0]], dtype=np.float32)
+    _score(cache, X)
+    clock.now = 9.9
+    assert len(cache.lookup(X, 'v1').missing) == 0
+    clock.now = 10.0
+    assert len(cache.lookup(X, 'v1').missing) == 1
+    assert cache.stats['expirations'] == 1
+
+
+def test_table_stays_under_max_bytes_evicting_least_recent():
+    cache = PredictionCache(max_bytes=2000)
+    X = np.arange(40, dtype=np.float32).reshape(20, 2)
+    _score(cache, X[:1])
+    for i in range(1, 20):
+        cache.lookup(X[:1], 'v1')  # keep row 0 recently used
+        _score(cache, X[i:i + 1])
+    snapshot = cache.snapshot()
+    assert snapshot['bytes'] <= snapshot['max_bytes']
+    assert cache.stats['evictions'] > 0
+    assert len(cache.lookup(X[:1], 'v1').missing) == 0
+    assert len(cache.lookup(X[1:2], 'v1').missing) == 1
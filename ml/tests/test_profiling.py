@@ -0,0 +1,102 @@
+import pstats
+import stat
+import threading
+
+import pytest
+
+from profiling import RequestProfiler
+
+
+def _busy_work():
+    total = 0
+    for i in range(20000):
+        total += sum(range(i % 50))
+    return total
+
+
+def _profile_request(profiler, rows=10):
+    """One sampled request: work on this thread and, through wrap(), on a worker thread."""
+    profile = profiler.start()
+    assert profile is not None
+    _busy_work()
+    worker = threading.Thread(target=profile.wrap(_busy_work), name='worker')
+    with profile.paused():
+        worker.start()
+        worker.join()
+    profile.rows = rows
+    profiler.finish(profile)
+    return profile
+
+
+def test_enabling_creates_a_private_directory(tmp_path):
+    profiler = RequestProfiler(tmp_path / 'profiles')
+    profiler.configure(enabled=True)
+    assert profiler.enabled
+    assert stat.S_IMODE((tmp_path / 'profiles').stat().st_mode) == 0o700
+
+    shared = tmp_path / 'shared'
+    shared.mkdir(mode=0o777)
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        RequestProfiler(shared).configure(enabled=True)
+    # toggle() reports the error and leaves profiling off
+    profiler = RequestProfiler(shared)
+    profiler.toggle()
+    assert not profiler.enabled
+
+
+def test_stack_mode_writes_folded_stacks_of_both_threads(tmp_path):
+    profiler = RequestProfiler(tmp_path, sample_rate=1.0, mode='stack', interval_ms=0.01, enabled=True)
+    path = profiler.save(_profile_request(profiler))
+
+    assert path.parent == tmp_path and path.suffix == '.folded'
+    assert '-10rows-' in path.name
+    stacks = {}
+    for line in path.read_text().splitlines():
+        stack, micros = line.rsplit(' ', 1)
+        assert int(micros) >= 1
+        stacks[stack] = int(micros)
+    threads = {stack.split(';', 1)[0] for stack in stacks}
+    assert threads == {threading.current_thread().name, 'worker'}
+    assert any('_busy_work (test_profiling.py' in stack for stack in stacks if stack.startswith('worker;'))
+    assert profiler.stats['sampled'] == profiler.stats['written'] == 1
+
+
+def test_cprofile_mode_writes_pstats(tmp_path):
+    profiler = RequestProfiler(tmp_path, sample_rate=1.0, mode='cprofile', enabled=True)
+    path = profiler.save(_profile_request(profiler))
+
+    assert path.suffix == '.prof'
+    stats = pstats.Stats(str(path))
+    calls = {func[2]: stat[0] for func, stat in stats.stats.items()}
+    # Once on the request's thread, once in the wrapped worker
+    assert calls['_busy_work'] == 2
+
+
+def test_only_the_newest_max_files_are_kept(tmp_path):
+    profiler = RequestProfiler(tmp_path, sample_rate=1.0, max_files=3, enabled=True)
+    paths = [profiler.save(_profile_request(profiler, rows=i)) for i in range(5)]
+    assert sorted(tmp_path.iterdir()) == paths[2:]
+    assert profiler.stats['written'] == 5
+
+
+def test_sampling_skips_and_drops(tmp_path):
+    profiler = RequestProfiler(tmp_path, sample_rate=0.0, enabled=True)
+    assert profiler.start() is None
+    assert profiler.stats['sampled'] == 0
+
+    profiler.configure(sample_rate=1.0, min_ms=60_000)
+    profile = profiler.start()
+    # One request is profiled at a time
+    assert profiler.start() is None
+    assert profiler.stats['skipped_busy'] == 1
+    profiler.finish(profile)
+    # Faster than min_ms: not written
+    assert profiler.save(profile) is None
+    assert profiler.stats['dropped_fast'] == 1
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(ValueError):
+        profiler.configure(mode='perf')
+    with pytest.raises(ValueError):
+        profiler.configure(sample_rate=2.0)
@@ -0,0 +1,78 @@
+import pickle
+
+import lightgbm as lgb
+import numpy as np
+import pytest
+
+from runtime import CompiledTrees, predict_raw, safety_scores
+
+
+def _train(objective='regression', rounds=30):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 5)).astype(np.float32)
+    X[:, 4] = rng.integers(0, 40, len(X))  # categorical, with codes past one 32-bit word
+    X[rng.random(X.shape) < 0.05] = np.nan
+    X[rng.random(len(X)) < 0.1, 1] = 0.0
+    y = 50 + 10 * np.nan_to_num(X[:, 0]) - 5 * np.nan_to_num(X[:, 1]) + (np.nan_to_num(X[:, 4]) % 7)
+    if objective == 'binary':
+        y = (y > 50).astype(float)
+    data = lgb.Dataset(X, y, categorical_feature=[4], params={'verbose': -1})
+    params = {'objective': objective, 'num_leaves': 15, 'min_data_in_leaf': 5, 'verbose': -1,
+              'use_missing': True}
+    return lgb.train(params, data, num_boost_round=rounds), X
+
+
+@pytest.fixture(scope='module')
+def booster():
+    return _train()
+
+
+@pytest.fixture(scope='module')
+def trees(booster):
+    trees = CompiledTrees.from_booster(booster[0])
+    if not trees.available:
+        pytest.skip("no C compiler for the tree kernel")
+    return trees
+
+
+def test_compiled_trees_match_booster_bit_for_bit(booster, trees):
+    model, X = booster
+    for n in (1, 7, trees.max_rows, len(X)):
+        np.testing.assert_array_equal(trees.predict(X[:n]), model.predict(X[:n]))
+
+
+def test_compiled_trees_handle_unseen_values(booster, trees):
+    model, _ = booster
+    X = np.array([[np.nan] * 5, [0.0] * 5, [1e30, -1e30, np.inf, -np.inf, 1000.0], [0, 0, 0, 0, -3]],
+                 dtype=np.float32)
+    np.testing.assert_array_equal(trees.predict(X), model.predict(X))
+
+
+def test_compiled_trees_survive_pickling(booster, trees):
+    model, X = booster
+    restored = pickle.loads(pickle.dumps(trees))
+    assert restored.available
+    np.testing.assert_array_equal(restored.predict(X[:50]), model.predict(X[:50]))
+
+
+def test_compiled_trees_reject_wrong_width(trees):
+    with pytest.raises(ValueError):
+        trees.predict(np.zeros((2, 3), dtype=np.float32))
+
+
+def test_non_raw_objective_does_not_compile():
+    model, _ = _train('binary', rounds=5)
+    with pytest.raises(ValueError):
+        CompiledTrees.from_booster(model)
+
+
+def test_predict_raw_uses_the_booster_for_large_batches(booster, trees):
+    model, X = booster
+    np.testing.assert_array_equal(predict_raw(model, trees, X), model.predict(X))
+    np.testing.assert_array_equal(predict_raw(model, None, X[:3]), model.predict(X[:3]))
+
+
+def test_safety_scores_clip_to_0_100():
+    scores, confidence = safety_scores(np.array([-20.0, 50.0, 130.0]))
+    np.testing.assert_array_equal(scores, [0.0, 50.0, 100.0])
+    assert ((confidence >= 0.2) & (confidence <= 0.95)).all()
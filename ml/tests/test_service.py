@@ -0,0 +1,218 @@
+import asyncio
+import json
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from benchmarks import asgi_request, synthetic_ticks
+from runtime import safety_scores
+
+
+def _post(service, path, payload):
+    status, body = asyncio.run(asgi_request(service.app, 'POST', path, json.dumps(payload).encode()))
+    return status, json.loads(body)
+
+
+def _legacy_results(service, safety, records):
+    """/predict as it was before the columnar path: one dict and one DataFrame row per record."""
+    rows = []
+    for record in records:
+        row = service.LocationTick(**record).model_dump()
+        if not row.get('time_of_day_bucket') and row.get('timestamp'):
+            row['time_of_day_bucket'] = service._infer_time_of_day_bucket(row['timestamp'])
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    X, _ = safety.prepare_features(df)
+    scores, conf = safety_scores(safety.model.predict(X))
+    results = []
+    for row, score, conf_v in zip(rows, scores, conf):
+        factors = [name for name, flag in (
+            ('high_area_risk', float(row['area_risk_score']) >= 0.6),
+            ('off_itinerary', float(row['distance_from_itinerary']) >= 300),
+            ('stale_gps_signal', float(row['time_since_last_fix']) >= 900),
+            ('low_recent_movement', float(row['avg_speed_last_15min']) < 0.3),
+            ('restricted_zone_flag', bool(row['is_in_restricted_zone'])),
+            ('sos_flag_active', bool(row['sos_flag'])),
+            ('prior_incidents_history', int(row['prior_incidents_count']) > 0),
+        ) if flag]
+        results.append({
+            'tourist_id': row['tourist_id'],
+            'timestamp': row['timestamp'],
+            'predicted_safety': float(score),
+            'confidence': float(conf_v),
+            'safety_band': 'high' if score >= 75 else 'medium' if score >= 50 else 'low',
+            'explanations': {'factors': factors,
+                             'summary': ' | '.join(factors) if factors else 'no notable risk factors from input'},
+        })
+    return results
+
+
+def test_predict_matches_the_per_record_path(service, trained_models, monkeypatch):
+    monkeypatch.setattr(service, 'TICK_STATE_ENABLED', False)
+    records = synthetic_ticks(300)
+    for i, record in enumerate(records):
+        record['avg_speed_last_15min'] = [0.0, 0.2, 0.3, 5.0][i % 4]
+        if i % 3 == 0:
+            del record['time_of_day_bucket']
+        if i % 5 == 0:
+            record['time_of_day_bucket'] = 'unseen-bucket'
+        if i % 7 == 0:
+            del record['area_risk_score']
+    safety = joblib.load(trained_models[1] / 'safety_score_model.joblib')
+
+    status, body = _post(service, '/predict', {'records': records})
+    assert status == 200
+    assert body['scorer'] == 'model'
+    assert body['results'] == _legacy_results(service, safety, records)
+
+
+def test_predict_sheds_load_with_micro_batching_on(service, monkeypatch):
+    gate = threading.Event()
+    score_columns = service._score_columns
+
+    def slow_score(cols):
+        gate.wait(10)
+        return score_columns(cols)
+
+    monkeypatch.setattr(service, '_score_columns', slow_score)
+    bodies = [json.dumps({'records': [tick]}).encode() for tick in synthetic_ticks(12)]
+
+    async def main():
+        service.inference_pool.shutdown()
+        service._start_inference('thread', workers=1, max_queue=2, microbatch=True)
+        asyncio.get_running_loop().call_later(0.3, gate.set)
+        try:
+            responses = await asyncio.gather(*(asgi_request(service.app, 'POST', '/predict', body)
+                                               for body in bodies))
+            return responses, dict(service.batcher.stats)
+        finally:
+            await service._stop_inference()
+
+    responses, stats = asyncio.run(main())
+    statuses = [status for status, _ in responses]
+    assert set(statuses) == {200, 503}
+    assert stats['rejected'] == statuses.count(503)
+    assert stats['requests'] == statuses.count(200)
+    shed = next(json.loads(body) for status, body in responses if status == 503)
+    assert shed['detail'].startswith('Inference queue full')
+
+
+async def _upload(app, path, chunks):
+    """POST `chunks` as separate body messages; returns (status, response body messages)."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'POST', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '', 'client': ('test', 0), 'server': ('test', 80),
+        'headers': [(b'content-type', b'application/x-ndjson'), (b'transfer-encoding', b'chunked')],
+    }
+    pending = iter(chunks)
+    status, messages = 0, []
+
+    async def receive():
+        chunk = next(pending, None)
+        if chunk is None:
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.sleep(0)
+        return {'type': 'http.request', 'body': chunk, 'more_body': True}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and message.get('body'):
+            messages.append(message['body'])
+
+    await app(scope, receive, send)
+    return status, messages
+
+
+def _ndjson_chunks(lines, size):
+    # Split an upload mid-line, as network reads do
+    body = b''.join(line + b'\n' for line in lines)
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def test_stream_matches_predict(service, monkeypatch):
+    monkeypatch.setattr(service, 'STREAM_CHUNK_ROWS', 16)
+    ticks = synthetic_ticks(100)
+    status, expected = _post(service, '/predict', {'records': ticks})
+    assert status == 200
+    service.tick_state.clear()
+
+    lines = [json.dumps(tick).encode() for tick in ticks]
+    status, messages = asyncio.run(_upload(service.app, '/predict/stream', _ndjson_chunks(lines, 1000)))
+    assert status == 200
+    assert len(messages) > 1
+    results = [json.loads(line) for line in b''.join(messages).splitlines()]
+    assert all(result.pop('scorer') == 'model' for result in results)
+    assert results == expected['results']
+
+
+def test_stream_reports_invalid_lines_and_scores_the_rest(service):
+    ticks = synthetic_ticks(5)
+    lines = [json.dumps(tick).encode() for tick in ticks]
+    lines[1] = b'{"tourist_id": "t1", "latitude": "north"}'
+    lines.insert(3, b'not json')
+    lines.insert(4, b'')
+    status, messages = asyncio.run(_upload(service.app, '/predict/stream', _ndjson_chunks(lines, 64)))
+    assert status == 200
+    out = [json.loads(line) for line in b''.join(messages).splitlines()]
+    errors = [line for line in out if 'error' in line]
+    assert [error['line'] for error in errors] == [2, 4]
+    assert all(isinstance(error['error'], list) and error['error'] for error in errors)
+    scored = [line['tourist_id'] for line in out if 'error' not in line]
+    assert scored == [ticks[i]['tourist_id'] for i in (0, 2, 3, 4)]
+
+
+def test_stream_waits_for_a_full_queue_instead_of_503(service):
+    gate = threading.Event()
+    lines = [json.dumps(tick).encode() for tick in synthetic_ticks(20)]
+
+    async def main():
+        service.inference_pool.shutdown()
+        service._start_inference('thread', workers=1, max_queue=0, microbatch=False)
+        pool = service.inference_pool
+        busy = asyncio.ensure_future(pool.run(gate.wait, 10))
+        await asyncio.sleep(0.01)
+        status, rejected = await asgi_request(service.app, 'POST', '/predict', json.dumps({'records': [
+            json.loads(lines[0])]}).encode())
+        assert status == 503
+        asyncio.get_running_loop().call_later(0.2, gate.set)
+        result = await _upload(service.app, '/predict/stream', _ndjson_chunks(lines, 200))
+        await busy
+        return result, pool.stats['rejected']
+
+    (status, messages), rejected = asyncio.run(main())
+    assert status == 200
+    out = [json.loads(line) for line in b''.join(messages).splitlines()]
+    assert len(out) == 20 and all('error' not in line for line in out)
+    assert rejected > 1
+
+
+def test_missing_movement_features_count_as_zero_with_tick_state_off(service, monkeypatch):
+    monkeypatch.setattr(service, 'TICK_STATE_ENABLED', False)
+    movement = ('distance_from_itinerary', 'time_since_last_fix', 'avg_speed_last_15min')
+    tick = {key: value for key, value in synthetic_ticks(1)[0].items() if key not in movement}
+    tick.update(area_risk_score=0.3, is_in_restricted_zone=False, sos_flag=False, prior_incidents_count=0)
+
+    status, omitted = _post(service, '/predict', {'records': [tick]})
+    assert status == 200
+    assert omitted['results'][0]['explanations'] == {'factors': ['low_recent_movement'],
+                                                     'summary': 'low_recent_movement'}
+    _, zeros = _post(service, '/predict', {'records': [{**tick, **dict.fromkeys(movement, 0.0)}]})
+    assert omitted['results'] == zeros['results']
+
+
+def test_tick_state_fills_movement_features(service):
+    ticks = [{'tourist_id': 'walker', 'timestamp': f'2025-01-01T10:0{i}:00Z', 'latitude': 12.3,
+              'longitude': 76.6, 'speed_m_s': 1.0} for i in range(3)]
+    status, first = _post(service, '/predict', {'records': ticks[:1]})
+    assert status == 200
+    # First fix: no time since the last one; one tick at 1 m/s; no itinerary
+    assert first['results'][0]['explanations']['factors'] == []
+    cols = service._records_to_columns([service.LocationTick(**tick) for tick in ticks[1:]])
+    np.testing.assert_array_equal(cols['time_since_last_fix'], [60.0, 60.0])
+    np.testing.assert_array_equal(cols['avg_speed_last_15min'], [1.0, 1.0])
+    assert np.isnan(cols['distance_from_itinerary']).all()
@@ -0,0 +1,87 @@
+import numpy as np
+
+from tourist_state import SpeedStats, TickFeatureState
+
+
+def _history(seed=0, n=400):
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(['a', 'b', 'c', 'd'], n).astype(object)
+    speeds = rng.gamma(2.0, 1.5, n)
+    speeds[rng.random(n) < 0.05] = np.nan
+    return ids, speeds
+
+
+def test_speed_std_matches_numpy_per_prefix():
+    ids, speeds = _history()
+    std = SpeedStats(capacity=2).update(ids, speeds)
+    for i in range(len(ids)):
+        seen = speeds[:i + 1][(ids[:i + 1] == ids[i])]
+        seen = seen[~np.isnan(seen)]
+        expected = np.std(seen, ddof=1) if len(seen) >= 2 else 0.0
+        np.testing.assert_allclose(std[i], expected, rtol=1e-9, atol=1e-12)
+
+
+def test_speed_std_is_the_same_in_one_call_or_tick_by_tick():
+    ids, speeds = _history(1)
+    batch = SpeedStats()
+    together = batch.update(ids, speeds)
+    ticked = SpeedStats()
+    apart = np.concatenate([ticked.update(ids[i:i + 7], speeds[i:i + 7]) for i in range(0, len(ids), 7)])
+    np.testing.assert_allclose(together, apart, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(batch.std(['a', 'b', 'zz']), ticked.std(['a', 'b', 'zz']), rtol=1e-12)
+    assert batch.std(['zz'])[0] == 0.0
+
+
+def test_speed_stats_clear():
+    stats = SpeedStats()
+    stats.update(['a', 'a'], [1.0, 3.0])
+    stats.clear()
+    assert len(stats) == 0
+    assert stats.update(['a'], [5.0])[0] == 0.0
+
+
+def test_tick_features_since_fix_and_speed_window():
+    state = TickFeatureState(window_s=900.0)
+    since, avg = state.observe(
+        ['a', 'a', 'b', 'a', 'a'],
+        ['2024-01-01T10:00:00Z', '2024-01-01T10:05:00Z', '2024-01-01T10:05:00Z',
+         '2024-01-01T10:20:00+00:00', '2024-01-01T10:20:30'],
+        np.array([1.0, 3.0, 2.0, 5.0, np.nan]))
+    np.testing.assert_array_equal(since, [0.0, 300.0, 0.0, 900.0, 30.0])
+    # At 10:20 the 10:00 tick has left the 15-minute window, at 10:20:30 the 10:05 one; NaN speed counts as 0
+    np.testing.assert_allclose(avg, [1.0, 2.0, 2.0, (3.0 + 5.0) / 2, (5.0 + 0.0) / 2])
+
+
+def test_stationary_window_stays_exactly_zero():
+    state = TickFeatureState(window_s=60.0)
+    state.observe(['a'], ['2024-01-01T10:00:00Z'], np.array([0.1]))
+    _, avg = state.observe(['a', 'a'], ['2024-01-01T10:02:00Z', '2024-01-01T10:02:10Z'], np.array([0.0, 0.0]))
+    assert avg.tolist() == [0.0, 0.0]
+
+
+def test_bad_timestamp_gets_nan_and_leaves_state_alone():
+    state = TickFeatureState()
+    state.observe(['a'], ['2024-01-01T10:00:00Z'], np.array([1.0]))
+    since, avg = state.observe(['a', 'a'], ['not a time', '2024-01-01T10:01:00Z'], np.array([9.0, 3.0]))
+    assert np.isnan(since[0]) and np.isnan(avg[0])
+    assert since[1] == 60.0 and avg[1] == 2.0
+
+
+def test_least_recently_seen_track_is_dropped():
+    state = TickFeatureState(max_tourists=2)
+    state.observe(['a', 'b', 'a', 'c'], ['2024-01-01T10:00:00Z'] * 4, np.zeros(4))
+    assert len(state) == 2
+    # 'b' was least recently seen when 'c' arrived
+    since, _ = state.observe(['a', 'b'], ['2024-01-01T10:01:00Z'] * 2, np.zeros(2))
+    np.testing.assert_array_equal(since, [60.0, 0.0])
+
+
+def test_itinerary_distance():
+    state = TickFeatureState()
+    state.set_itinerary('a', [(12.0, 76.0), (12.01, 76.0)])
+    distance = state.itinerary_distance(['a', 'b', 'a'], np.array([12.0, 12.0, 12.011]), np.array([76.0] * 3))
+    assert distance[0] == 0.0
+    assert np.isnan(distance[1])
+    np.testing.assert_allclose(distance[2], 111.2, rtol=0.01)
+    state.set_itinerary('a', [])
+    assert np.isnan(state.itinerary_distance(['a'], np.array([12.0]), np.array([76.0]))[0])
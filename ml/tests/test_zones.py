@@ -0,0 +1,96 @@
+import json
+import os
+
+import numpy as np
+
+from zones import ZONE_BITS, ZoneCatalog, ZoneIndex, point_in_polygon
+
+
+def _polygons(n, seed=0):
+    # Star-shaped, 5-12 vertices, over a 0.2-degree square so they overlap
+    rng = np.random.default_rng(seed)
+    polygons = []
+    for _ in range(n):
+        k = int(rng.integers(5, 13))
+        angles = np.sort(rng.uniform(0, 2 * np.pi, k))
+        radii = rng.uniform(0.005, 0.03) * rng.uniform(0.5, 1.0, k)
+        clat, clng = 12.0 + rng.uniform(0, 0.2), 76.0 + rng.uniform(0, 0.2)
+        polygons.append(list(zip((clat + radii * np.sin(angles)).tolist(),
+                                 (clng + radii * np.cos(angles)).tolist())))
+    return polygons
+
+
+def _square(lat, lng, half):
+    return [(lat - half, lng - half), (lat - half, lng + half), (lat + half, lng + half), (lat + half, lng - half)]
+
+
+def _feature(kind, rings):
+    return {'type': 'Feature', 'properties': {'kind': kind},
+            'geometry': {'type': 'Polygon', 'coordinates': [[[lng, lat] for lat, lng in ring] for ring in rings]}}
+
+
+def test_index_matches_the_reference_ray_cast():
+    polygons = _polygons(60)
+    restricted, high_risk = polygons[::2], polygons[1::2]
+    index = ZoneIndex.from_polygons(restricted, high_risk)
+    rng = np.random.default_rng(1)
+    lats = 12.0 + rng.uniform(-0.05, 0.25, 3000)
+    lngs = 76.0 + rng.uniform(-0.05, 0.25, 3000)
+    expected = np.array([
+        (ZONE_BITS['restricted'] if any(point_in_polygon(a, b, p) for p in restricted) else 0)
+        | (ZONE_BITS['high_risk'] if any(point_in_polygon(a, b, p) for p in high_risk) else 0)
+        for a, b in zip(lats, lngs)])
+    assert expected.any()
+    np.testing.assert_array_equal(index.query(lats, lngs), expected)
+    np.testing.assert_array_equal(index.contains(lats, lngs, 'restricted'), expected & ZONE_BITS['restricted'] != 0)
+
+
+def test_holes_follow_the_even_odd_rule():
+    doc = {'type': 'FeatureCollection', 'features': [
+        _feature('restricted', [_square(12.0, 76.0, 0.1), _square(12.0, 76.0, 0.02)])]}
+    index = ZoneIndex.from_geojson_doc(doc)
+    kinds = index.query([12.0, 12.05, 12.5], [76.0, 76.0, 76.0])
+    np.testing.assert_array_equal(kinds, [0, ZONE_BITS['restricted'], 0])
+
+
+def test_empty_index_and_empty_query():
+    index = ZoneIndex.from_polygons([], [])
+    assert len(index) == 0
+    np.testing.assert_array_equal(index.query([12.0], [76.0]), [0])
+    assert len(ZoneIndex.from_polygons(_polygons(3), []).query([], [])) == 0
+
+
+def _write(path, doc):
+    path.write_text(json.dumps(doc))
+    # Distinct signatures even when rewrites land in the same mtime tick
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_catalog_reload_keeps_the_last_good_version(tmp_path, capsys):
+    fallback = ZoneIndex.from_polygons([_square(10.0, 70.0, 0.1)], [])
+    path = tmp_path / 'zones.geojson'
+    catalog = ZoneCatalog(path, fallback)
+    assert not catalog.reload()
+    assert catalog.info['version'] == 'builtin'
+
+    _write(path, {'type': 'FeatureCollection', 'version': 'v1',
+                  'features': [_feature('high_risk', [_square(12.0, 76.0, 0.1)])]})
+    assert catalog.reload()
+    index, info = catalog.snapshot()
+    assert info['version'] == 'v1'
+    np.testing.assert_array_equal(index.query([12.0], [76.0]), [ZONE_BITS['high_risk']])
+    assert not catalog.reload()
+
+    capsys.readouterr()
+    path.write_text('{"type": "FeatureCollection", "features": [{"geometry": {"type": "Polygon", "coordinates": 5}}]}')
+    assert not catalog.reload()
+    assert not catalog.reload()
+    assert capsys.readouterr().out.count('not loaded') == 1
+    assert catalog.info['version'] == 'v1'
+
+    path.unlink()
+    assert catalog.reload()
+    assert catalog.info['version'] == 'builtin'
+    assert catalog.index is fallback
+    assert not catalog.reload()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Per-tourist state kept across requests by the inference service.
+SpeedStats holds a running mean and variance of each tourist's
+avg_speed_last_15min (Welford), so the anomaly feature `speed_variance` is
+read in O(1) per tick instead of re-grouping the whole history.
+TickFeatureState derives the movement features of raw GPS ticks
+(time_since_last_fix, avg_speed_last_15min, distance_from_itinerary) the
+way TouristDataGenerator.calculate_features defines them.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Sequence, Tuple
+
+import numpy as np
+
+from geometry import min_haversine_ragged
+
+
+class SpeedStats:
+    """Running count/mean/M2 of speed per tourist_id, updated tick by tick.
+
+    A batch of ticks is folded in with the parallel form of Welford's update,
+    in row order, so each row sees the statistics of every tick of its tourist
+    up to and including itself; replaying a history in one call or tick by
+    tick gives the same values. NaN speeds are skipped.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._slots: Dict[str, int] = {}
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._mean = np.zeros(capacity, dtype=np.float64)
+        self._m2 = np.zeros(capacity, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _lookup(self, tourist_ids: np.ndarray, create: bool) -> np.ndarray:
+        # One dict lookup per distinct tourist in the batch; -1 marks unknown ids
+        unique, inverse = np.unique(tourist_ids, return_inverse=True)
+        slots = np.empty(len(unique), dtype=np.int64)
+        for i, tid in enumerate(unique.tolist()):
+            slot = self._slots.get(tid, -1)
+            if slot < 0 and create:
+                slot = self._slots[tid] = len(self._slots)
+            slots[i] = slot
+        if len(self._slots) > len(self._count):
+            capacity = max(len(self._slots), 2 * len(self._count))
+            for name in ('_count', '_mean', '_m2'):
+                grown = np.zeros(capacity, dtype=getattr(self, name).dtype)
+                grown[:len(getattr(self, name))] = getattr(self, name)
+                setattr(self, name, grown)
+        return slots[inverse.ravel()]
+
+    def update(self, tourist_ids: Iterable[str], speeds: Iterable[float]) -> np.ndarray:
+        """Fold the ticks in and return each row's running sample std (0 below two ticks)."""
+        tourist_ids = np.asarray(tourist_ids, dtype=object)
+        speeds = np.asarray(speeds, dtype=np.float64)
+        if len(speeds) == 0:
+            return np.zeros(0)
+
+        with self._lock:
+            slots = self._lookup(tourist_ids, create=True)
+            order = np.argsort(slots, kind='stable')
+            slot = slots[order]
+            x = speeds[order]
+            valid = ~np.isnan(x)
+
+            starts = np.flatnonzero(np.r_[True, slot[1:] != slot[:-1]])
+            lengths = np.diff(np.r_[starts, len(slot)])
+
+            # Sums of deviations from the prior mean, per tourist prefix; the
+            # prior ticks contribute 0 and M2 to them
+            count_a, mean_a, m2_a = self._count[slot], self._mean[slot], self._m2[slot]
+            d = np.where(valid, x - mean_a, 0.0)
+
+            def prefix(values):
+                total = np.cumsum(values)
+                return total - np.repeat(total[starts] - values[starts], lengths)
+
+            n = count_a + prefix(valid.astype(np.int64))
+            s1 = prefix(d)
+            s2 = prefix(d * d)
+            safe_n = np.maximum(n, 1)
+            mean = mean_a + s1 / safe_n
+            m2 = np.maximum(m2_a + s2 - s1 * s1 / safe_n, 0.0)
+
+            ends = starts + lengths - 1
+            self._count[slot[ends]] = n[ends]
+            self._mean[slot[ends]] = mean[ends]
+            self._m2[slot[ends]] = m2[ends]
+
+        std = np.zeros(len(slots))
+        std[order] = np.sqrt(m2 / np.maximum(n - 1, 1)) * (n >= 2)
+        return std
+
+    def std(self, tourist_ids: Iterable[str]) -> np.ndarray:
+        """Current sample std per tourist without updating (0 for unknown tourists)."""
+        tourist_ids = np.asarray(tourist_ids, dtype=object)
+        with self._lock:
+            slots = self._lookup(tourist_ids, create=False)
+            known = slots >= 0
+            n = np.where(known, self._count[slots], 0)
+            m2 = np.where(known, self._m2[slots], 0.0)
+        return np.sqrt(m2 / np.maximum(n - 1, 1)) * (n >= 2)
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._count[:] = 0
+            self._mean[:] = 0.0
+            self._m2[:] = 0.0
+
+
+def _epoch_seconds(timestamp: str) -> float:
+    ts = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class _Track:
+    """One tourist's last fix and the (time, speed) ticks of the speed window."""
+
+    __slots__ = ('last_time', 'times', 'speeds', 'speed_sum', 'moving')
+
+    def __init__(self):
+        self.last_time = None
+        self.times = deque()
+        self.speeds = deque()
+        self.speed_sum = 0.0
+        self.moving = 0  # non-zero speeds in the window
+
+
+class TickFeatureState:
+    """Per-tourist movement state that turns raw GPS ticks into model features.
+
+    observe() folds ticks in in arrival order, each in O(1) amortized:
+
+    - time_since_last_fix: seconds since the tourist's previous tick (0 for the first)
+    - avg_speed_last_15min: mean speed_m_s of the ticks in the last `window_s`
+      seconds, this one included
+
+    itinerary_distance() gives distance_from_itinerary, the haversine metres
+    to the nearest cached waypoint (NaN when no itinerary is registered).
+
+    At most `max_tourists` tracks are kept; the least recently seen is dropped.
+    """
+
+    def __init__(self, window_s: float = 900.0, max_tourists: int = 100_000):
+        self.window_s = window_s
+        self.max_tourists = max_tourists
+        self._tracks: "OrderedDict[str, _Track]" = OrderedDict()
+        self._itineraries: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    @property
+    def itineraries(self) -> int:
+        return len(self._itineraries)
+
+    def set_itinerary(self, tourist_id: str, waypoints: Sequence[Tuple[float, float]]):
+        """Cache a tourist's planned (lat, lng) waypoints; an empty list removes them."""
+        with self._lock:
+            if not waypoints:
+                self._itineraries.pop(tourist_id, None)
+                return
+            lat, lng = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2).T.copy()
+            self._itineraries[tourist_id] = (lat, lng)
+
+    def _track(self, tourist_id: str) -> _Track:
+        track = self._tracks.get(tourist_id)
+        if track is None:
+            track = self._tracks[tourist_id] = _Track()
+            if len(self._tracks) > self.max_tourists:
+                self._tracks.popitem(last=False)
+        else:
+            self._tracks.move_to_end(tourist_id)
+        return track
+
+    def itinerary_distance(self, tourist_ids: Sequence[str], lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """Haversine metres from each point to its tourist's nearest waypoint (NaN without an itinerary)."""
+        n = len(tourist_ids)
+        starts = np.zeros(n, dtype=np.int64)
+        counts = np.zeros(n, dtype=np.int64)
+        parts: Dict[str, Tuple[int, int]] = {}
+        wp_lats, wp_lngs = [], []
+        offset = 0
+        with self._lock:
+            # Concatenate each distinct tourist's waypoints once, then one ragged kernel call
+            for i, tid in enumerate(tourist_ids):
+                part = parts.get(tid)
+                if part is None:
+                    itinerary = self._itineraries.get(tid)
+                    if itinerary is None:
+                        continue
+                    part = parts[tid] = (offset, len(itinerary[0]))
+                    wp_lats.append(itinerary[0])
+                    wp_lngs.append(itinerary[1])
+                    offset += part[1]
+                starts[i], counts[i] = part
+        if not offset:
+            return np.full(n, np.nan)
+        distance = min_haversine_ragged(lats, lngs, np.concatenate(wp_lats), np.concatenate(wp_lngs), starts, counts)
+        distance[counts == 0] = np.nan
+        return distance
+
+    def observe(self, tourist_ids: Sequence[str], timestamps: Sequence[str],
+                speeds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Fold ticks in; returns (time_since_last_fix, avg_speed_last_15min) per tick.
+
+        Ticks with an unparseable timestamp get NaN and leave the tourist's
+        state untouched.
+        """
+        n = len(tourist_ids)
+        since_fix = np.full(n, np.nan)
+        avg_speed = np.full(n, np.nan)
+        window = self.window_s
+        with self._lock:
+            for i, (tid, ts, speed) in enumerate(zip(tourist_ids, timestamps, speeds.tolist())):
+                try:
+                    now = _epoch_seconds(ts)
+                except (TypeError, ValueError):
+                    continue
+                track = self._track(tid)
+                since_fix[i] = 0.0 if track.last_time is None else max(0.0, now - track.last_time)
+                track.last_time = now
+
+                speed = 0.0 if speed != speed else speed  # NaN speed counts as stationary
+                track.times.append(now)
+                track.speeds.append(speed)
+                track.speed_sum += speed
+                track.moving += speed != 0
+                while now - track.times[0] > window:
+                    track.times.popleft()
+                    dropped = track.speeds.popleft()
+                    track.speed_sum -= dropped
+                    track.moving -= dropped != 0
+                if len(track.speeds) == 1 or not track.moving:
+                    # Drop accumulated rounding; an all-stationary window stays exactly 0
+                    track.speed_sum = speed if track.moving else 0.0
+                avg_speed[i] = track.speed_sum / len(track.speeds)
+        return since_fix, avg_speed
+
+    def clear(self):
+        with self._lock:
+            self._tracks.clear()
+            self._itineraries.clear()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Spatial index for geofence and area-risk lookups.
+Zone polygons are bucketed into a uniform grid over their bounding boxes;
+a batch of points is resolved by gathering candidate (point, polygon) pairs
+from the grid and running a vectorized ray cast over the candidates' edges.
+ZoneCatalog keeps the live index for a GeoJSON file and hot-swaps it when
+the file changes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Zone kinds understood by the service; query() returns a bitmask over these
+ZONE_KINDS = ('restricted', 'high_risk')
+ZONE_BITS = {kind: 1 << i for i, kind in enumerate(ZONE_KINDS)}
+
+Ring = Sequence[Tuple[float, float]]  # [(lat, lng), ...]
+
+# Upper bound on grid cells, and on (point, edge) pairs tested at once
+_MAX_CELLS = 1 << 22
+_QUERY_CHUNK = 1 << 16
+
+
+def point_in_polygon(lat: float, lng: float, polygon: Ring) -> bool:
+    """Ray cast of one point against one ring; the per-point reference ZoneIndex is checked against."""
+    inside = False
+    n = len(polygon)
+    if n < 3:
+        return False
+    for i in range(n):
+        lat_i, lng_i = polygon[i]
+        lat_j, lng_j = polygon[(i + 1) % n]
+        intersect = ((lng_i > lng) != (lng_j > lng)) and (
+            lat < (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i + 1e-9) + lat_i
+        )
+        if intersect:
+            inside = not inside
+    return inside
+
+
+class ZoneIndex:
+    """Grid-bucketed polygons with batched point-in-polygon queries.
+
+    Each zone is a kind plus one or more rings of (lat, lng) vertices; rings
+    after the first act as holes (even-odd rule), matching the ray cast in
+    point_in_polygon edge for edge.
+    """
+
+    def __init__(self, zones: Iterable[Tuple[str, List[Ring]]], cell_size: float = None):
+        kinds, edges, offsets = [], [], [0]
+        for kind, rings in zones:
+            if kind not in ZONE_BITS:
+                raise ValueError(f"Unknown zone kind: {kind}")
+            zone_edges = []
+            for ring in rings:
+                ring = [tuple(map(float, v)) for v in ring]
+                if len(ring) > 1 and ring[0] == ring[-1]:
+                    ring = ring[:-1]  # GeoJSON rings repeat the first vertex
+                if len(ring) < 3:
+                    continue
+                zone_edges.extend((ring[i], ring[(i + 1) % len(ring)]) for i in range(len(ring)))
+            if not zone_edges:
+                continue
+            kinds.append(ZONE_BITS[kind])
+            edges.extend(zone_edges)
+            offsets.append(len(edges))
+
+        self.kind_bits = np.asarray(kinds, dtype=np.uint8)
+        self.edge_offsets = np.asarray(offsets, dtype=np.int64)
+        e = np.asarray(edges, dtype=np.float64).reshape(-1, 4)
+        self.lat_i, self.lng_i, self.lat_j, self.lng_j = (np.ascontiguousarray(e[:, k]) for k in range(4))
+        self._build_grid(cell_size)
+
+    def __len__(self) -> int:
+        return len(self.kind_bits)
+
+    @classmethod
+    def from_polygons(cls, restricted: List[Ring], high_risk: List[Ring], **kwargs) -> 'ZoneIndex':
+        """Build from plain (lat, lng) vertex lists, one ring per zone."""
+        zones = [('restricted', [p]) for p in restricted] + [('high_risk', [p]) for p in high_risk]
+        return cls(zones, **kwargs)
+
+    @classmethod
+    def from_geojson(cls, path, **kwargs) -> 'ZoneIndex':
+        """Build from a GeoJSON FeatureCollection of Polygon/MultiPolygon features.
+
+        Each feature's ``properties.kind`` must be one of ZONE_KINDS.
+        Coordinates are GeoJSON order ([lng, lat]).
+        """
+        with open(path) as f:
+            return cls.from_geojson_doc(json.load(f), **kwargs)
+
+    @classmethod
+    def from_geojson_doc(cls, doc: dict, **kwargs) -> 'ZoneIndex':
+        return cls(_zones_from_geojson(doc), **kwargs)
+
+    def _build_grid(self, cell_size: float):
+        n = len(self)
+        if n == 0:
+            self.cell_size = 1.0
+            self.origin = (0.0, 0.0)
+            self.n_cols = 1
+            self.cell_keys = np.empty(0, dtype=np.int64)
+            self.cell_starts = np.zeros(1, dtype=np.int64)
+            self.cell_zones = np.empty(0, dtype=np.int64)
+            return
+
+        starts, ends = self.edge_offsets[:-1], self.edge_offsets[1:]
+        lats = np.concatenate([self.lat_i, self.lat_j])
+        lngs = np.concatenate([self.lng_i, self.lng_j])
+        owner = np.tile(np.repeat(np.arange(n), ends - starts), 2)
+        self.min_lat = np.full(n, np.inf)
+        self.max_lat = np.full(n, -np.inf)
+        self.min_lng = np.full(n, np.inf)
+        self.max_lng = np.full(n, -np.inf)
+        np.minimum.at(self.min_lat, owner, lats)
+        np.maximum.at(self.max_lat, owner, lats)
+        np.minimum.at(self.min_lng, owner, lngs)
+        np.maximum.at(self.max_lng, owner, lngs)
+
+        origin_lat, origin_lng = self.min_lat.min(), self.min_lng.min()
+        span_lat = self.max_lat.max() - origin_lat
+        span_lng = self.max_lng.max() - origin_lng
+        if cell_size is None:
+            # Roughly one typical zone per cell
+            extents = np.maximum(self.max_lat - self.min_lat, self.max_lng - self.min_lng)
+            cell_size = float(np.median(extents)) or 1e-3
+        # Keep the grid (and huge zones' cell fan-out) bounded
+        cell_size = max(cell_size, np.sqrt(max(span_lat, 1e-9) * max(span_lng, 1e-9) / _MAX_CELLS))
+        self.cell_size = cell_size
+        self.origin = (origin_lat, origin_lng)
+        self.n_cols = int(span_lng // cell_size) + 1
+
+        r0, r1 = self._cell_coords(self.min_lat, origin_lat), self._cell_coords(self.max_lat, origin_lat)
+        c0, c1 = self._cell_coords(self.min_lng, origin_lng), self._cell_coords(self.max_lng, origin_lng)
+        n_rows, n_cols = r1 - r0 + 1, c1 - c0 + 1
+        counts = n_rows * n_cols
+        zone = np.repeat(np.arange(n), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = r0[zone] + local // n_cols[zone]
+        cols = c0[zone] + local % n_cols[zone]
+        keys = rows * self.n_cols + cols
+
+        order = np.argsort(keys, kind='stable')
+        keys, zone = keys[order], zone[order]
+        self.cell_keys, first = np.unique(keys, return_index=True)
+        self.cell_starts = np.append(first, len(keys)).astype(np.int64)
+        self.cell_zones = zone
+
+    def _cell_coords(self, values: np.ndarray, origin: float) -> np.ndarray:
+        return np.floor((values - origin) / self.cell_size).astype(np.int64)
+
+    def query(self, lats, lngs) -> np.ndarray:
+        """Bitmask (see ZONE_BITS) of the zone kinds containing each point."""
+        lats = np.asarray(lats, dtype=np.float64).ravel()
+        lngs = np.asarray(lngs, dtype=np.float64).ravel()
+        out = np.zeros(len(lats), dtype=np.uint8)
+        if len(self) == 0:
+            return out
+        for start in range(0, len(lats), _QUERY_CHUNK):
+            stop = start + _QUERY_CHUNK
+            out[start:stop] = self._query_chunk(lats[start:stop], lngs[start:stop])
+        return out
+
+    def contains(self, lats, lngs, kind: str) -> np.ndarray:
+        return (self.query(lats, lngs) & ZONE_BITS[kind]) != 0
+
+    def _query_chunk(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        out = np.zeros(len(lats), dtype=np.uint8)
+
+        # Grid cell -> candidate zones
+        rows = self._cell_coords(lats, self.origin[0])
+        cols = self._cell_coords(lngs, self.origin[1])
+        in_grid = (rows >= 0) & (cols >= 0) & (cols < self.n_cols)
+        keys = np.where(in_grid, rows * self.n_cols + cols, -1)
+        slot = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+        hit = in_grid & (self.cell_keys[slot] == keys)
+        points = np.flatnonzero(hit)
+        if len(points) == 0:
+            return out
+        lo, hi = self.cell_starts[slot[points]], self.cell_starts[slot[points] + 1]
+        counts = hi - lo
+        pair_point = np.repeat(points, counts)
+        pair_zone = self.cell_zones[np.repeat(lo, counts) + np.arange(counts.sum())
+                                    - np.repeat(np.cumsum(counts) - counts, counts)]
+
+        # Bounding-box filter
+        plat, plng = lats[pair_point], lngs[pair_point]
+        keep = ((plat >= self.min_lat[pair_zone]) & (plat <= self.max_lat[pair_zone]) &
+                (plng >= self.min_lng[pair_zone]) & (plng <= self.max_lng[pair_zone]))
+        pair_point, pair_zone = pair_point[keep], pair_zone[keep]
+        if len(pair_point) == 0:
+            return out
+
+        # Ray cast over every (pair, edge) of the surviving candidates
+        e_lo = self.edge_offsets[pair_zone]
+        n_edges = self.edge_offsets[pair_zone + 1] - e_lo
+        pair_first = np.cumsum(n_edges) - n_edges
+        edge = np.repeat(e_lo - pair_first, n_edges) + np.arange(n_edges.sum())
+        lat = np.repeat(lats[pair_point], n_edges)
+        lng = np.repeat(lngs[pair_point], n_edges)
+        lat_i, lng_i = self.lat_i[edge], self.lng_i[edge]
+        lat_j, lng_j = self.lat_j[edge], self.lng_j[edge]
+        crosses = ((lng_i > lng) != (lng_j > lng)) & (
+            lat < (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i + 1e-9) + lat_i
+        )
+        inside = (np.add.reduceat(crosses.astype(np.int64), pair_first) & 1).astype(bool)
+        np.bitwise_or.at(out, pair_point[inside], self.kind_bits[pair_zone[inside]])
+        return out
+
+
+def _zones_from_geojson(doc: dict) -> List[Tuple[str, List[Ring]]]:
+    """(kind, rings) per polygon; raises ValueError for a document of the wrong shape."""
+    if not isinstance(doc, dict):
+        raise ValueError(f"Expected a GeoJSON object, got {type(doc).__name__}")
+    features = doc.get('features', []) if doc.get('type') == 'FeatureCollection' else [doc]
+    if not isinstance(features, list):
+        raise ValueError("'features' must be a list")
+    zones = []
+    for i, feature in enumerate(features):
+        if not isinstance(feature, dict):
+            raise ValueError(f"Feature {i} is not an object")
+        kind = (feature.get('properties') or {}).get('kind')
+        geometry = feature.get('geometry') or {}
+        if not isinstance(geometry, dict) or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+            continue
+        coordinates = geometry.get('coordinates')
+        if not isinstance(coordinates, list):
+            raise ValueError(f"Feature {i} has no coordinates")
+        polygons = [coordinates] if geometry['type'] == 'Polygon' else coordinates
+        try:
+            for rings in polygons:
+                zones.append((kind, [[(float(lat), float(lng)) for lng, lat, *_ in ring] for ring in rings]))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Feature {i} has malformed coordinates: {e}") from e
+    return zones
+
+
+class ZoneCatalog:
+    """The live ZoneIndex for a GeoJSON catalog file, reloaded in the background.
+
+    A reload parses the file and builds a complete new index on the watcher
+    thread, then publishes it with a single reference swap; readers take one
+    ``snapshot()`` per request and never see a half-built index. A file that
+    fails to parse is reported once and the previous catalog stays live. If
+    the file is removed, the fallback index goes live again.
+    """
+
+    def __init__(self, path, fallback: ZoneIndex):
+        self.path = Path(path)
+        self._fallback = fallback
+        self._current = (fallback, {'version': 'builtin', 'zones': len(fallback),
+                                    'source': None, 'loaded_at': datetime.now().isoformat()})
+        self._signature = None
+        self._failed_signature = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def index(self) -> ZoneIndex:
+        return self._current[0]
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        return dict(self._current[1])
+
+    def snapshot(self) -> Tuple[ZoneIndex, Dict[str, Any]]:
+        return self._current
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild from the file if it changed; returns True when a new catalog went live."""
+        signature = self._file_signature()
+        if signature is None:
+            return self._use_fallback()
+        if not force and signature in (self._signature, self._failed_signature):
+            return False
+        try:
+            raw = self.path.read_bytes()
+            doc = json.loads(raw)
+            index = ZoneIndex.from_geojson_doc(doc)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self._failed_signature = signature
+            print(f"Zone catalog {self.path} not loaded, keeping version "
+                  f"{self._current[1]['version']}: {e}")
+            return False
+
+        version = doc.get('version') or hashlib.sha256(raw).hexdigest()[:12]
+        self._current = (index, {'version': str(version), 'zones': len(index),
+                                 'source': str(self.path), 'loaded_at': datetime.now().isoformat()})
+        self._signature = signature
+        print(f"Loaded zone catalog {self.path} (version {version}, {len(index)} zones)")
+        return True
+
+    def _use_fallback(self) -> bool:
+        # The file was removed: serve the built-in zones rather than a stale catalog
+        if self._signature is None and self._failed_signature is None:
+            return False
+        self._current = (self._fallback, {'version': 'builtin', 'zones': len(self._fallback),
+                                          'source': None, 'loaded_at': datetime.now().isoformat()})
+        self._signature = self._failed_signature = None
+        print(f"Zone catalog {self.path} removed; using the built-in zones")
+        return True
+
+    def start_watching(self, interval_s: float = 5.0):
+        if self._thread is not None or interval_s <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval_s,),
+                                        name='zone-catalog-watcher', daemon=True)
+        self._thread.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _watch(self, interval_s: float):
+        while not self._stop.wait(interval_s):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Zone catalog reload failed: {e}")